@@ -5,21 +5,39 @@
 WeeWX XTypes extensions that add new types of AQI.
 """
 
+import bisect
+import contextlib
+import cProfile
+import hashlib
+import io
+import json
 import logging
 import math
+import os
+import pstats
+import sqlite3
 import sys
+import threading
 import time
 import types
 
-from collections import ChainMap
+import collections
+import itertools
 
 import weedb
 import weeutil
 import weewx
 import weewx.cheetahgenerator
+import weewx.manager
 from weewx.engine import StdService
 from weewx.units import ValueTuple
-from weeutil.weeutil import to_bool, to_int
+from weeutil.weeutil import to_bool, to_float, to_int
+
+try:
+    import numpy
+except ImportError:
+    # numpy is optional. Without it, the batch calculations fall back to the scalar calculation.
+    numpy = None
 
 VERSION = '2.0.0-rc05'
 
@@ -61,12 +79,58 @@ class AQITypeManager(StdService):
         self._setup(config_dict['aqitype'])
 
         self.logger.loginf("Adding AQI type to the XTypes pipeline.")
-        self.aqi = AQIType(self.logger, SQLExecutor(self.logger), config_dict['aqitype'])
+        query_coalescer = None
+        coalesced_queries = to_int(config_dict['aqitype'].get('coalesced_queries', 16))
+        if coalesced_queries > 0:
+            query_coalescer = QueryCoalescer(coalesced_queries)
+        self.metrics = None
+        if to_bool(config_dict['aqitype'].get('metrics', False)):
+            self.metrics = Metrics()
+            Metrics.instance = self.metrics
+        self.metrics_log_interval = to_int(config_dict['aqitype'].get('metrics_log_interval', 3600))
+        self.metrics_logged = time.time()
+        self.metrics_textfile = config_dict['aqitype'].get('metrics_textfile')
+        self.profiler = None
+        if config_dict['aqitype'].get('profile_directory'):
+            self._setup_profiler(config_dict['aqitype'])
+        self.tracer = None
+        if config_dict['aqitype'].get('trace_file'):
+            self.logger.loginf(f"Tracing the AQI calls to '{config_dict['aqitype']['trace_file']}'.")
+            self.tracer = Tracer(self.logger, config_dict['aqitype']['trace_file'])
+        self.sql_executor = SQLExecutor(self.logger, query_coalescer, self.metrics, self.tracer)
+        self.hourly_buffer = None
+        if to_bool(config_dict['aqitype'].get('hourly_buffer', False)):
+            self.hourly_buffer = HourlyBuffer()
+        self.aqi = AQIType(self.logger, self.sql_executor, config_dict['aqitype'], self.hourly_buffer, self.metrics, self.profiler, self.tracer)
         if to_bool(config_dict['aqitype'].get('prepend', True)):
             weewx.xtypes.xtypes.insert(0, self.aqi)
         else:
             weewx.xtypes.xtypes.append(self.aqi)
 
+        self.db_manager = None
+        self.hourly_inputs = set()
+        if to_bool(config_dict['aqitype'].get('hourly_concentrations', False)):
+            self._setup_hourly_concentrations(config_dict['aqitype'])
+
+        if self.hourly_buffer:
+            self._setup_hourly_buffer(config_dict['aqitype'])
+            self.bind(weewx.NEW_LOOP_PACKET, self.new_loop_packet)
+
+        self.daily_summaries = False
+        if to_bool(config_dict['aqitype'].get('daily_summaries', False)):
+            self._setup_daily_summaries(config_dict['aqitype'])
+
+        self.interval_store = None
+        if self.aqi.interval_cache and 'interval_store' in config_dict['aqitype']:
+            self._setup_interval_store(config_dict['aqitype'])
+
+        if self.aqi.store_nowcast:
+            self._get_db_manager(config_dict['aqitype'])
+
+        if self.hourly_inputs or self.hourly_buffer or self.daily_summaries or self.aqi.result_memo or self.aqi.interval_cache \
+           or self.aqi.store_nowcast or self.metrics or self.profiler:
+            self.bind(weewx.NEW_ARCHIVE_RECORD, self.new_archive_record)
+
     def _setup(self, config_dict):
         unit_group = config_dict.get('unit_group', 'group_aqi')
         unit = config_dict.get('unit', 'aqi')
@@ -81,9 +145,157 @@ class AQITypeManager(StdService):
         for xtype in config_dict.sections:
             weewx.units.obs_group_dict[xtype] = unit_group
 
+    def _setup_profiler(self, config_dict):
+        profile_threshold = config_dict.get('profile_threshold')
+        if profile_threshold is not None:
+            profile_threshold = to_float(profile_threshold)
+        # Without a threshold, the next report cycle is profiled.
+        profile_cycles = to_int(config_dict.get('profile_cycles', 1 if profile_threshold is None else 0))
+        self.logger.loginf(f"Profiling the next {profile_cycles} report cycles, "
+                           f"and the calls slower than {profile_threshold} seconds, to '{config_dict['profile_directory']}'.")
+        self.profiler = Profiler(config_dict['profile_directory'], profile_cycles, profile_threshold)
+
+    def _get_db_manager(self, config_dict):
+        if not self.db_manager:
+            data_binding = config_dict.get('data_binding', 'wx_binding')
+            self.db_manager = self.engine.db_binder.get_manager(data_binding=data_binding, initialize=True)
+
+        return self.db_manager
+
+    def _setup_hourly_concentrations(self, config_dict):
+        db_manager = self._get_db_manager(config_dict)
+        self.hourly_inputs = {field_option['input'] for field_option in self.aqi.aqi_fields.values()
+                              if field_option['algorithm'] == 'NowCast'}
+
+        self.sql_executor.create_hourly_table(db_manager)
+        for dependent_field in self.hourly_inputs:
+            self.logger.loginf(f"Updating the hourly concentrations of '{dependent_field}'.")
+            self.sql_executor.backfill_hourly_concentrations(db_manager, dependent_field)
+
+    def _setup_hourly_buffer(self, config_dict):
+        db_manager = self._get_db_manager(config_dict)
+        dependent_fields = {field_option['input'] for field_option in self.aqi.aqi_fields.values()
+                            if field_option['algorithm'] == 'NowCast'}
+
+        last_timestamp = db_manager.last_timestamp
+        if last_timestamp is None:
+            start = -float('inf')
+        else:
+            start = HourlyBuffer.get_hour(last_timestamp) - (self.hourly_buffer.hours - 1) * 3600
+
+        hourly_sums = {}
+        for dependent_field in dependent_fields:
+            self.logger.loginf(f"Loading the hourly concentrations of '{dependent_field}'.")
+            if last_timestamp is None:
+                hourly_sums[dependent_field] = []
+            else:
+                hourly_sums[dependent_field] = self.sql_executor.get_hourly_sums(db_manager, dependent_field, start)
+
+        self.hourly_buffer.seed(SQLExecutor.get_database_key(db_manager), start, last_timestamp, hourly_sums)
+
+    def _setup_daily_summaries(self, config_dict):
+        db_manager = self._get_db_manager(config_dict)
+        for obs_type in self.aqi.aqi_fields:
+            self.logger.loginf(f"Updating the daily summary of '{obs_type}'.")
+            self.aqi.update_daily_summary(db_manager, obs_type)
+        self.daily_summaries = True
+
+    def _setup_interval_store(self, config_dict):
+        # Either True, for a file next to a SQLite archive, or the path of the file.
+        path = config_dict['interval_store']
+        try:
+            if not to_bool(path):
+                return
+            path = None
+        except ValueError:
+            pass
+
+        db_manager = self._get_db_manager(config_dict)
+        if path is None:
+            if db_manager.connection.dbtype != 'sqlite' or db_manager.connection.file_path == ':memory:':
+                self.logger.logerr("'interval_store' needs the path of the file, when the archive is not a SQLite file.")
+                return
+            path = os.path.join(os.path.dirname(db_manager.connection.file_path), 'aqitype_intervals.sdb')
+
+        self.logger.loginf(f"Keeping the aggregates of closed intervals in '{path}'.")
+        self.interval_store = IntervalStore(path,
+                                            SQLExecutor.get_database_key(db_manager),
+                                            to_int(config_dict.get('interval_store_days', 400)))
+        self.interval_store.trim(time.time())
+        self.aqi.interval_cache.store = self.interval_store
+
+    def _report_metrics(self):
+        now = time.time()
+        if self.metrics_log_interval > 0 and now - self.metrics_logged >= self.metrics_log_interval:
+            self.logger.loginf(self.metrics.format_summary())
+            self.metrics_logged = now
+
+        # The reports of the previous archive record have finished, unless they take longer than an archive interval.
+        if self.metrics_textfile:
+            try:
+                self.metrics.write_textfile(self.metrics_textfile)
+            except OSError as exception:
+                self.logger.logerr(f"Unable to write the metrics to '{self.metrics_textfile}': {exception}")
+
+    def new_loop_packet(self, event):
+        """ Handle the new loop packet event. """
+        self.hourly_buffer.add_loop_packet(event.packet)
+
+    def new_archive_record(self, event):
+        """ Handle the new archive record event. """
+        if self.metrics:
+            self._report_metrics()
+
+        if self.profiler:
+            try:
+                self.profiler.end_cycle()
+            except OSError as exception:
+                self.logger.logerr(f"Unable to write the profile: {exception}")
+
+        if self.aqi.result_memo:
+            stats = self.aqi.result_memo.clear()
+            self.logger.logdbg(f"Remembered results: {stats['hits']} hits, {stats['misses']} misses.")
+
+        if self.aqi.interval_cache:
+            self.aqi.interval_cache.add_record(event.record['dateTime'])
+            if self.interval_store:
+                try:
+                    self.interval_store.trim(event.record['dateTime'])
+                except sqlite3.Error as exception:
+                    self.logger.logerr(f"Unable to trim the kept intervals: {exception}")
+            stats = self.aqi.interval_cache.get_stats()
+            self.logger.logdbg(f"Cached intervals: {stats['entries']} kept, {stats['hits']} hits, {stats['misses']} misses, "
+                               f"{stats['evictions']} evictions, {stats['invalidations']} invalidations.")
+
+        if self.aqi.store_nowcast:
+            try:
+                self.sql_executor.invalidate_nowcast_results(self.db_manager, event.record['dateTime'])
+            except weedb.DatabaseError as exception:
+                self.logger.logerr(f"Unable to remove the stored NowCast values: {exception}")
+
+        if self.hourly_buffer:
+            self.hourly_buffer.add_record(event.record)
+
+        if self.daily_summaries:
+            for obs_type in self.aqi.aqi_fields:
+                try:
+                    self.aqi.update_daily_summary(self.db_manager, obs_type, event.record)
+                except weedb.DatabaseError as exception:
+                    self.logger.logerr(f"Unable to update the daily summary of '{obs_type}': {exception}")
+
+        for dependent_field in self.hourly_inputs:
+            try:
+                self.sql_executor.update_hourly_concentration(self.db_manager, dependent_field, event.record)
+            except weedb.DatabaseError as exception:
+                self.logger.logerr(f"Unable to update the hourly concentration of '{dependent_field}': {exception}")
+
     def shutDown(self):
         """Run when an engine shutdown is requested."""
         weewx.xtypes.xtypes.remove(self.aqi)
+        if self.interval_store:
+            self.interval_store.close()
+        if Metrics.instance is self.metrics:
+            Metrics.instance = None
 
 class SQLExecutor():
     ''' Class to execute SQL statements.
@@ -98,9 +310,9 @@ class SQLExecutor():
         avg({input}) as avgConcentration,
         /* The following is not used in the code, but is convenient when debugging */ 
         datetime(MAX(dateTime) - 3600, 'unixepoch', 'localtime') as startDateTime
-    FROM archive
-    WHERE dateTime > {start}
-        AND dateTime <= {stop}
+    FROM {table_name}
+    WHERE dateTime > ?
+        AND dateTime <= ?
     /* In WeeWX the first recording of an hour is the archival interval of the hour, typically 5 minutes.
     This interval records the values from 0 to 5 minutes
     In other words, assumning an archival interval of 5 minutes, the dateTimes will be
@@ -110,6 +322,87 @@ class SQLExecutor():
     ORDER BY dateTime DESC
     '''
 
+    # The hourly sums and counts of the NowCast inputs.
+    # Each row is the same group as sql_concentration_grouped_str, keyed by the start of the hour.
+    hourly_table_name = 'aqitype_hourly'
+
+    sql_create_hourly_table_str = '''
+    CREATE TABLE IF NOT EXISTS {hourly_table_name} (
+        obs_type VARCHAR(64) NOT NULL,
+        hour INTEGER NOT NULL,
+        maxDateTime INTEGER NOT NULL,
+        sum REAL,
+        count INTEGER NOT NULL,
+        PRIMARY KEY (obs_type, hour)
+    )
+    '''
+
+    sql_backfill_hourly_str = '''
+    {upsert} {hourly_table_name} (obs_type, hour, maxDateTime, sum, count)
+    SELECT
+        ?,
+        ((dateTime - {archive_interval}) / 3600) * 3600,
+        MAX(dateTime),
+        SUM({input}),
+        COUNT({input})
+    FROM {table_name}
+    WHERE dateTime >= ?
+    GROUP BY (dateTime - {archive_interval}) / 3600
+    '''
+
+    sql_hourly_sums_str = '''
+    SELECT
+        ((dateTime - {archive_interval}) / 3600) * 3600,
+        MAX(dateTime),
+        SUM({input}),
+        COUNT({input})
+    FROM {table_name}
+    WHERE dateTime >= ?
+    GROUP BY (dateTime - {archive_interval}) / 3600
+    '''
+
+    sql_hourly_concentration_grouped_str = '''
+    SELECT
+        maxDateTime - 3600 as startTimestamp,
+        CASE WHEN count > 0 THEN sum / count END as avgConcentration
+    FROM {hourly_table_name}
+    WHERE obs_type = ?
+        AND hour >= ?
+        AND hour < ?
+    ORDER BY hour DESC
+    '''
+
+    # The calculated NowCast values, keyed by the AQI field and the hour.
+    nowcast_table_name = 'aqitype_nowcast'
+
+    sql_create_nowcast_table_str = '''
+    CREATE TABLE IF NOT EXISTS {nowcast_table_name} (
+        obs_type VARCHAR(64) NOT NULL,
+        dateTime INTEGER NOT NULL,
+        aqi INTEGER,
+        PRIMARY KEY (obs_type, dateTime)
+    )
+    '''
+
+    # The hours of each AQI field whose NowCast values are all stored, those ending after start up to stop.
+    # With the count and total of the archive records that they are calculated from, see 'sql_nowcast_check_str'.
+    nowcast_coverage_table_name = 'aqitype_nowcast_coverage'
+
+    sql_create_nowcast_coverage_table_str = '''
+    CREATE TABLE IF NOT EXISTS {nowcast_coverage_table_name} (
+        obs_type VARCHAR(64) NOT NULL,
+        start INTEGER NOT NULL,
+        stop INTEGER NOT NULL,
+        archive_count INTEGER,
+        archive_total REAL,
+        PRIMARY KEY (obs_type)
+    )
+    '''
+
+    # The count of the records and the total of the input, to a thousandth so that it is exact.
+    # These change when the records are changed, for example by 'weectl import' or an edit.
+    sql_nowcast_check_str = "SELECT COUNT(*), SUM(ROUND({input} * 1000)) FROM {table_name} WHERE dateTime > ? AND dateTime <= ?"
+
     sql_concentration_str = '''
     SELECT 
         dateTime, 
@@ -121,121 +414,1595 @@ class SQLExecutor():
     WHERE dateTime > ? AND dateTime <= ?
     '''
 
+    sql_concentration_not_null_str = '''
+    SELECT
+        dateTime,
+        {input}
+    FROM
+        {table_name}
+    WHERE dateTime > ? AND dateTime <= ? AND {input} IS NOT NULL
+    ORDER BY dateTime ASC
+    '''
+
+    # The statements that fetch several inputs, {input} is the list of inputs, in one scan of the archive.
+    sql_concentration_not_null_multi_str = '''
+    SELECT
+        dateTime,
+        {input}
+    FROM
+        {table_name}
+    WHERE dateTime > ? AND dateTime <= ? AND ({not_null})
+    ORDER BY dateTime ASC
+    '''
+
+    sql_concentration_grouped_multi_str = '''
+    SELECT
+        MAX(dateTime) - 3600 as startTimestamp,
+        {averages}
+    FROM {table_name}
+    WHERE dateTime > ?
+        AND dateTime <= ?
+    GROUP BY (dateTime - {archive_interval}) / 3600
+    ORDER BY dateTime DESC
+    '''
+
     simple_sql_stmts = {
     'count': "SELECT COUNT(dateTime) FROM {table_name} "
-                "WHERE dateTime > {start} AND dateTime <= {stop} AND {input} IS NOT NULL",
+                "WHERE dateTime > ? AND dateTime <= ? AND {input} IS NOT NULL",
     'firsttime': "SELECT MIN(dateTime) FROM {table_name} "
-            "WHERE dateTime > {start} AND dateTime <= {stop} AND {input} IS NOT NULL "
+            "WHERE dateTime > ? AND dateTime <= ? AND {input} IS NOT NULL "
             "ORDER BY dateTime ASC LIMIT 1;",
     'lasttime': "SELECT MAX(dateTime) FROM {table_name} "
-            "WHERE dateTime > {start} AND dateTime <= {stop} AND {input} IS NOT NULL "
+            "WHERE dateTime > ? AND dateTime <= ? AND {input} IS NOT NULL "
             "ORDER BY dateTime DESC LIMIT 1;",                 
     'maxtime': "SELECT dateTime FROM {table_name} "
-                "WHERE dateTime > {start} AND dateTime <= {stop} AND {input} IS NOT NULL "
+                "WHERE dateTime > ? AND dateTime <= ? AND {input} IS NOT NULL "
                 "ORDER BY {input} DESC LIMIT 1", 
     'mintime': "SELECT dateTime FROM {table_name} "
-                "WHERE dateTime > {start} AND dateTime <= {stop} AND {input} IS NOT NULL "
+                "WHERE dateTime > ? AND dateTime <= ? AND {input} IS NOT NULL "
                 "ORDER BY {input} ASC LIMIT 1",
     'not_null': "SELECT 1 FROM {table_name} "
-                "WHERE dateTime > {start} AND dateTime <= {stop} "
+                "WHERE dateTime > ? AND dateTime <= ? "
                 "AND {input} IS NOT NULL LIMIT 1",                   
     }
 
     aggregate_sql_stmts = {
     'avg': "SELECT {input} FROM {table_name} "
-            "WHERE dateTime > {start} AND dateTime <= {stop} AND {input} IS NOT NULL",
+            "WHERE dateTime > ? AND dateTime <= ? AND {input} IS NOT NULL",
     'sum': "SELECT {input} FROM {table_name} "
-            "WHERE dateTime > {start} AND dateTime <= {stop} AND {input} IS NOT NULL",
+            "WHERE dateTime > ? AND dateTime <= ? AND {input} IS NOT NULL",
     }
 
     basic_sql_stmts = {
     'first': "SELECT {input} FROM {table_name} "
-            "WHERE dateTime > {start} AND dateTime <= {stop} AND {input} IS NOT NULL "
+            "WHERE dateTime > ? AND dateTime <= ? AND {input} IS NOT NULL "
             "ORDER BY dateTime ASC LIMIT 1;",
     'last': "SELECT {input} FROM {table_name} "
-            "WHERE dateTime > {start} AND dateTime <= {stop} AND {input} IS NOT NULL "
+            "WHERE dateTime > ? AND dateTime <= ? AND {input} IS NOT NULL "
             "ORDER BY dateTime DESC LIMIT 1;",
     'min': "SELECT {input} FROM {table_name} "
-            "WHERE dateTime > {start} AND dateTime <= {stop} AND {input} IS NOT NULL "
+            "WHERE dateTime > ? AND dateTime <= ? AND {input} IS NOT NULL "
             "ORDER BY {input} ASC LIMIT 1;",
     'max': "SELECT {input} FROM {table_name} "
-            "WHERE dateTime > {start} AND dateTime <= {stop} AND {input} IS NOT NULL "
+            "WHERE dateTime > ? AND dateTime <= ? AND {input} IS NOT NULL "
             "ORDER BY {input} DESC LIMIT 1;",
     }
 
-    def __init__(self, logger):
+    # The query type and statement of each aggregate.
+    aggregate_query_stmts = {aggregate_type: (query_type, sql_stmt)
+                             for query_type, sql_stmts in (('aggregate', aggregate_sql_stmts),
+                                                           ('simple', simple_sql_stmts),
+                                                           ('basic', basic_sql_stmts))
+                             for aggregate_type, sql_stmt in sql_stmts.items()}
+
+    # The aggregates that can be answered from the WeeWX daily summary of the input.
+    # The timespan is whole days, [start, stop).
+    daily_summary_sql_stmts = {
+    'min': "SELECT min, mintime FROM {table_name}_day_{input} "
+            "WHERE dateTime >= ? AND dateTime < ? AND min IS NOT NULL "
+            "ORDER BY min ASC, mintime ASC LIMIT 1",
+    'max': "SELECT max, maxtime FROM {table_name}_day_{input} "
+            "WHERE dateTime >= ? AND dateTime < ? AND max IS NOT NULL "
+            "ORDER BY max DESC, maxtime ASC LIMIT 1",
+    'count': "SELECT SUM(count) FROM {table_name}_day_{input} "
+            "WHERE dateTime >= ? AND dateTime < ?",
+    }
+
+    extreme_sql_stmts = {
+    'min': "SELECT {input}, dateTime FROM {table_name} "
+            "WHERE dateTime > ? AND dateTime <= ? AND {input} IS NOT NULL "
+            "ORDER BY {input} ASC, dateTime ASC LIMIT 1",
+    'max': "SELECT {input}, dateTime FROM {table_name} "
+            "WHERE dateTime > ? AND dateTime <= ? AND {input} IS NOT NULL "
+            "ORDER BY {input} DESC, dateTime ASC LIMIT 1",
+    }
+
+    # The daily summaries of the AQI fields.
+    # The metadata has the last update of each field.
+    aqi_daily_summary_table_name = 'aqitype_day_{obs_type}'
+    aqi_daily_summary_metadata_table_name = 'aqitype_day__metadata'
+
+    sql_create_aqi_daily_summary_str = '''
+    CREATE TABLE {table_name} (
+        dateTime INTEGER NOT NULL UNIQUE PRIMARY KEY,
+        sum REAL,
+        count INTEGER,
+        min REAL,
+        mintime INTEGER,
+        max REAL,
+        maxtime INTEGER,
+        first REAL,
+        firsttime INTEGER,
+        last REAL,
+        lasttime INTEGER
+    )
+    '''
+
+    sql_create_aqi_daily_summary_metadata_str = '''
+    CREATE TABLE IF NOT EXISTS {table_name} (
+        name VARCHAR(64) NOT NULL UNIQUE PRIMARY KEY,
+        value TEXT
+    )
+    '''
+
+    # Aggregate the AQI values in the database, {aqi} is the SQL expression that calculates the AQI of {input}.
+    sql_aqi_aggregate_str = "SELECT SUM({aqi}), COUNT({aqi}) FROM {table_name} " \
+                            "WHERE dateTime > ? AND dateTime <= ? AND {input} IS NOT NULL"
+    # The bucket is the offset of the start of the (equal length) interval of the record from the first interval.
+    sql_aqi_aggregated_series_str = "SELECT (dateTime - ? - 1) - {remainder} AS bucket, SUM({aqi}), COUNT({aqi}) " \
+                                    "FROM {table_name} WHERE dateTime > ? AND dateTime <= ? AND {input} IS NOT NULL " \
+                                    "GROUP BY bucket ORDER BY bucket"
+    # Truncating toward zero, by type of database.
+    sql_truncate_strs = {
+        'sqlite': 'CAST({value} AS INTEGER)',
+        'mysql': 'TRUNCATE({value}, 0)',
+    }
+    # The remainder of a division of whole numbers, by type of database.
+    # The MySQL cursor of weedb formats the statement with its parameters using '%', so it cannot have a bare '%'.
+    sql_remainder_strs = {
+        'sqlite': '({dividend} % {divisor})',
+        'mysql': 'MOD({dividend}, {divisor})',
+    }
+    # Inserting a row, replacing the row with the same key, by type of database.
+    sql_upsert_strs = {
+        'sqlite': 'INSERT OR REPLACE INTO',
+        'mysql': 'REPLACE INTO',
+    }
+
+    # ToDo: need to get this from the 'console'
+    archive_interval = 300
+
+    def __init__(self, logger, query_coalescer=None, metrics=None, tracer=None):
         self.logger = logger
+        # When set, the queries of the archive are shared through it.
+        self.query_coalescer = query_coalescer
+        # When set, the time and rows of the queries of the archive are added to it.
+        self.metrics = metrics
+        # When set, the queries of the archive are spans of the traced calls.
+        self.tracer = tracer
+        # The inputs that are fetched together
+        self.inputs = ()
+        # The inputs that have hourly concentrations, keyed by the database and table
+        self.hourly_concentrations = {}
+        # The databases that have the NowCast tables
+        self.nowcast_tables = set()
+        # The last hour with stored NowCast values, keyed by the database and table
+        self.nowcast_watermarks = {}
+        # The last update of the fields that have AQI daily summaries, keyed by the database and table
+        self.aqi_daily_summaries = {}
+        # The statements compiled from the templates, keyed by the template, table, input and any other values.
+        self.sql_stmts = {}
+        self.sql_stmt_stats = {'compiled': 0, 'reused': 0}
+
+    def _get_sql_stmt(self, sql_template, db_manager, dependent_field, **interpolation_dict):
+        '''
+        Get the statement of a template for the table and input, compiling it the first time.
+        The values that change, such as the time range, are parameters of the statement.
+        So its text does not change, and the database can reuse the statement it has already parsed.
+        '''
+        key = (sql_template, db_manager.table_name, dependent_field, *interpolation_dict.values())
+        sql_stmt = self.sql_stmts.get(key)
+        if sql_stmt is None:
+            sql_stmt = sql_template.format(table_name=db_manager.table_name,
+                                           input=dependent_field,
+                                           archive_interval=SQLExecutor.archive_interval,
+                                           hourly_table_name=SQLExecutor.hourly_table_name,
+                                           **interpolation_dict)
+            self.sql_stmt_stats['compiled'] += 1
+            self.sql_stmts[key] = sql_stmt
+        else:
+            self.sql_stmt_stats['reused'] += 1
+
+        return sql_stmt
+
+    def set_inputs(self, dependent_fields):
+        '''
+        Set the inputs that are fetched together, in one scan of the archive, when the queries are coalesced.
+        Each field then gets its input from the shared rows.
+        '''
+        self.inputs = tuple(sorted(set(dependent_fields)))
+
+    def _get_input_index(self, dependent_field):
+        # The position of the input in the inputs that are fetched together, None if it is fetched by itself.
+        if self.query_coalescer is None or len(self.inputs) < 2 or dependent_field not in self.inputs:
+            return None
+        return self.inputs.index(dependent_field)
+
+    def _get_multi_input_rows(self, db_manager, sql_template, parameters, **interpolation_dict):
+        # The rows of the inputs fetched together, None if one of the inputs is not in the archive.
+        sql_stmt = self._get_sql_stmt(sql_template, db_manager, ', '.join(self.inputs), **interpolation_dict)
+        try:
+            return self.query_coalescer.get_rows(db_manager, sql_stmt, parameters)
+        except weedb.NoColumnError:
+            return None
+
+    def _get_rows(self, db_manager, sql_stmt, parameters):
+        ''' Get an iterator of the rows of a query of the archive, shared with the same queries when coalescing. '''
+        if self.tracer:
+            return self.tracer.trace_rows(sql_stmt, parameters, self._get_timed_rows, db_manager, sql_stmt, parameters)
+        return self._get_timed_rows(db_manager, sql_stmt, parameters)
+
+    def _get_timed_rows(self, db_manager, sql_stmt, parameters):
+        if self.metrics:
+            return self.metrics.time_rows(self._fetch_rows, db_manager, sql_stmt, parameters)
+        return self._fetch_rows(db_manager, sql_stmt, parameters)
+
+    def _fetch_rows(self, db_manager, sql_stmt, parameters):
+        if self.query_coalescer is None:
+            return db_manager.genSql(sql_stmt, parameters)
+        return iter(self.query_coalescer.get_rows(db_manager, sql_stmt, parameters))
+
+    def _get_row(self, db_manager, sql_stmt, parameters):
+        ''' Get the first row of a query of the archive, None if there is not one. '''
+        if self.query_coalescer is not None:
+            return next(self._get_rows(db_manager, sql_stmt, parameters), None)
+        if not self.metrics and not self.tracer:
+            return db_manager.getSql(sql_stmt, parameters)
+
+        span = self.tracer.add_span('sql', statement=sql_stmt, parameters=parameters) if self.tracer else None
+        start = time.perf_counter()
+        row = db_manager.getSql(sql_stmt, parameters)
+        elapsed = time.perf_counter() - start
+        rows = 0 if row is None else 1
+        if self.metrics:
+            self.metrics.add_sql(elapsed, rows)
+        if span:
+            span['duration'] = elapsed
+            span['attributes']['rows'] = rows
+        return row
+
+    def get_sql_stmt_stats(self):
+        '''
+        The number of statements compiled from their templates, and the number of times one was reused.
+        The time that the database saves by reusing its parsed statement is not measured here.
+        '''
+        return dict(self.sql_stmt_stats)
+
+    @staticmethod
+    def get_upsert(db_manager):
+        ''' The start of the statement that inserts a row, replacing the row with the same key, for the type of database. '''
+        return SQLExecutor.sql_upsert_strs[db_manager.connection.dbtype]
+
+    @staticmethod
+    def get_database_key(db_manager):
+        ''' The database and table of a db manager. '''
+        return (db_manager.connection.database_name, db_manager.table_name)
+
+    def create_hourly_table(self, db_manager):
+        ''' Create the table of hourly concentrations, if it does not exist. '''
+        db_manager.connection.execute(
+            SQLExecutor.sql_create_hourly_table_str.format(hourly_table_name=SQLExecutor.hourly_table_name))
+
+    def backfill_hourly_concentrations(self, db_manager, dependent_field):
+        ''' Add the hours since the last hour in the hourly concentration table.
+            The last hour is recalculated, because it may not have been complete. '''
+        last_hour = db_manager.getSql(f"SELECT MAX(hour) FROM {SQLExecutor.hourly_table_name} WHERE obs_type = ?",
+                                      (dependent_field,))[0]
+        if last_hour is None:
+            last_hour = -SQLExecutor.archive_interval
+
+        with weedb.Transaction(db_manager.connection) as cursor:
+            cursor.execute(self._get_sql_stmt(SQLExecutor.sql_backfill_hourly_str, db_manager, dependent_field,
+                                              upsert=SQLExecutor.get_upsert(db_manager)),
+                           (dependent_field, last_hour + SQLExecutor.archive_interval))
+
+        self.hourly_concentrations.setdefault(self.get_database_key(db_manager), set()).add(dependent_field)
+
+    def update_hourly_concentration(self, db_manager, dependent_field, record):
+        ''' Add a record, that is not yet in the database, to the hourly concentrations. '''
+        hour = (record['dateTime'] - SQLExecutor.archive_interval) // 3600 * 3600
+        concentration = record.get(dependent_field)
+
+        row = db_manager.getSql(f"SELECT maxDateTime, sum, count FROM {SQLExecutor.hourly_table_name} "
+                                "WHERE obs_type = ? AND hour = ?",
+                                (dependent_field, hour))
+        if row:
+            max_date_time, concentration_sum, count = row
+            if record['dateTime'] <= max_date_time:
+                # Already part of the hour.
+                return
+            if concentration is not None:
+                concentration_sum = concentration if concentration_sum is None else concentration_sum + concentration
+                count += 1
+        else:
+            concentration_sum = concentration
+            count = 0 if concentration is None else 1
+
+        with weedb.Transaction(db_manager.connection) as cursor:
+            cursor.execute(f"{SQLExecutor.get_upsert(db_manager)} {SQLExecutor.hourly_table_name} (obs_type, hour, maxDateTime, sum, count) "
+                           "VALUES (?, ?, ?, ?, ?)",
+                           (dependent_field, hour, record['dateTime'], concentration_sum, count))
+
+    def _create_nowcast_table(self, db_manager):
+        database_key = self.get_database_key(db_manager)
+        if database_key not in self.nowcast_tables:
+            db_manager.connection.execute(
+                SQLExecutor.sql_create_nowcast_table_str.format(nowcast_table_name=SQLExecutor.nowcast_table_name))
+            db_manager.connection.execute(SQLExecutor.sql_create_nowcast_coverage_table_str.format(
+                nowcast_coverage_table_name=SQLExecutor.nowcast_coverage_table_name))
+            if 'archive_count' not in db_manager.connection.columnsOf(SQLExecutor.nowcast_coverage_table_name):
+                # Made by an earlier version, so the stored hours cannot be checked, and are calculated again.
+                db_manager.connection.execute(f"DROP TABLE {SQLExecutor.nowcast_coverage_table_name}")
+                db_manager.connection.execute(SQLExecutor.sql_create_nowcast_coverage_table_str.format(
+                    nowcast_coverage_table_name=SQLExecutor.nowcast_coverage_table_name))
+            self.nowcast_tables.add(database_key)
+
+    def _get_nowcast_watermark(self, db_manager):
+        database_key = self.get_database_key(db_manager)
+        if database_key not in self.nowcast_watermarks:
+            self._create_nowcast_table(db_manager)
+            self.nowcast_watermarks[database_key] = \
+                db_manager.getSql(f"SELECT MAX(stop) FROM {SQLExecutor.nowcast_coverage_table_name}")[0]
+        return self.nowcast_watermarks[database_key]
+
+    def get_nowcast_coverage(self, db_manager, obs_type):
+        '''
+        Get the (start, stop) of the hours whose NowCast values are stored, and the (count, total) of the archive records
+        they were calculated from, None if there are none. The count and total are None after a back-fill.
+        '''
+        self._create_nowcast_table(db_manager)
+        return db_manager.getSql(f"SELECT start, stop, archive_count, archive_total FROM {SQLExecutor.nowcast_coverage_table_name} "
+                                 "WHERE obs_type = ?",
+                                 (obs_type,))
+
+    def get_nowcast_check(self, db_manager, dependent_field, start, stop):
+        ''' Get the (count, total) of the archive records after start up to stop, see 'sql_nowcast_check_str'. '''
+        sql_str = self._get_sql_stmt(SQLExecutor.sql_nowcast_check_str, db_manager, dependent_field)
+        return self._get_row(db_manager, sql_str, (start, stop))
+
+    def get_nowcast_results(self, db_manager, obs_type, start, stop):
+        ''' Get the stored NowCast (hour, aqi) values of the hours after start up to stop, oldest first. '''
+        self._create_nowcast_table(db_manager)
+        return list(db_manager.genSql(f"SELECT dateTime, aqi FROM {SQLExecutor.nowcast_table_name} "
+                                      "WHERE obs_type = ? AND dateTime > ? AND dateTime <= ? ORDER BY dateTime ASC",
+                                      (obs_type, start, stop)))
+
+    def save_nowcast_results(self, db_manager, obs_type, results, coverage, previous_coverage):
+        '''
+        Store the NowCast (hour, aqi) values and the coverage, see 'get_nowcast_coverage', of the hours that are now all stored.
+        Only when the coverage is still 'previous_coverage', the one read before the values were calculated.
+        Otherwise, for example when a back-fill removed some of the stored hours since, nothing is stored.
+        Returns whether the values were stored.
+        '''
+        watermark = self._get_nowcast_watermark(db_manager)
+        upsert = SQLExecutor.get_upsert(db_manager)
+        with weedb.Transaction(db_manager.connection) as cursor:
+            cursor.execute(f"SELECT start, stop, archive_count, archive_total FROM {SQLExecutor.nowcast_coverage_table_name} "
+                           "WHERE obs_type = ?",
+                           (obs_type,))
+            if cursor.fetchone() != previous_coverage:
+                return False
+            for timestamp, aqi in results:
+                cursor.execute(f"{upsert} {SQLExecutor.nowcast_table_name} (obs_type, dateTime, aqi) VALUES (?, ?, ?)",
+                               (obs_type, timestamp, aqi))
+            cursor.execute(f"{upsert} {SQLExecutor.nowcast_coverage_table_name} (obs_type, start, stop, archive_count, archive_total) "
+                           "VALUES (?, ?, ?, ?, ?)",
+                           (obs_type, *coverage))
+
+        self.nowcast_watermarks[self.get_database_key(db_manager)] = max(coverage[1], watermark or coverage[1])
+        return True
+
+    def invalidate_nowcast_results(self, db_manager, timestamp):
+        '''
+        A new archive record, if it is a back-fill, the stored NowCast values whose 12 hours include it are removed.
+        The hours from the one of the record are then calculated again.
+        '''
+        # The records are grouped into the hours ending 'offset' seconds after the hour.
+        offset = SQLExecutor.archive_interval - 1
+        watermark = self._get_nowcast_watermark(db_manager)
+        if watermark is None or timestamp > watermark + offset:
+            return
+
+        # The end of the hour before the one of the record.
+        stop = (timestamp - offset - 1) // 3600 * 3600
+        with weedb.Transaction(db_manager.connection) as cursor:
+            # The stored values are keyed by the start of their hour.
+            cursor.execute(f"DELETE FROM {SQLExecutor.nowcast_table_name} WHERE dateTime > ?", (stop + offset - 3600,))
+            # WeeWX added the record, so the remaining stored hours are known to be current, and are not checked until stored again.
+            cursor.execute(f"UPDATE {SQLExecutor.nowcast_coverage_table_name} "
+                           "SET stop = ?, archive_count = NULL, archive_total = NULL WHERE stop > ?",
+                           (stop, stop))
+            cursor.execute(f"DELETE FROM {SQLExecutor.nowcast_coverage_table_name} WHERE stop <= start")
+
+        self.nowcast_watermarks[self.get_database_key(db_manager)] = stop
+
+    def get_hourly_sums(self, db_manager, dependent_field, start):
+        ''' Get the (hour, maxDateTime, sum, count) of each hour, starting with the hour 'start'. '''
+        try:
+            return list(db_manager.genSql(self._get_sql_stmt(SQLExecutor.sql_hourly_sums_str, db_manager, dependent_field),
+                                          (start + SQLExecutor.archive_interval,)))
+        except weedb.NoColumnError:
+            raise weewx.UnknownType(dependent_field) from weedb.NoColumnError
+
+    def _create_aqi_daily_summary_metadata(self, db_manager):
+        db_manager.connection.execute(SQLExecutor.sql_create_aqi_daily_summary_metadata_str.format(
+            table_name=SQLExecutor.aqi_daily_summary_metadata_table_name))
+
+    def create_aqi_daily_summary(self, db_manager, obs_type):
+        ''' Create an empty AQI daily summary of the field, replacing any that exists. '''
+        self._create_aqi_daily_summary_metadata(db_manager)
+        table_name = SQLExecutor.aqi_daily_summary_table_name.format(obs_type=obs_type)
+        with weedb.Transaction(db_manager.connection) as cursor:
+            cursor.execute(f"DROP TABLE IF EXISTS {table_name}")
+            cursor.execute(SQLExecutor.sql_create_aqi_daily_summary_str.format(table_name=table_name))
+            cursor.execute(f"DELETE FROM {SQLExecutor.aqi_daily_summary_metadata_table_name} WHERE name = ?",
+                           (f'lastUpdate_{obs_type}',))
+        self.aqi_daily_summaries.get(self.get_database_key(db_manager), {}).pop(obs_type, None)
+
+    def get_aqi_daily_summary_last_update(self, db_manager, obs_type):
+        ''' Get the last update of the AQI daily summary of the field, None if there is not one. '''
+        self._create_aqi_daily_summary_metadata(db_manager)
+        row = db_manager.getSql(f"SELECT value FROM {SQLExecutor.aqi_daily_summary_metadata_table_name} WHERE name = ?",
+                                (f'lastUpdate_{obs_type}',))
+        if row is None:
+            return None
+
+        last_update = int(row[0])
+        self.aqi_daily_summaries.setdefault(self.get_database_key(db_manager), {})[obs_type] = last_update
+        return last_update
+
+    def save_aqi_daily_summary(self, db_manager, obs_type, day_summaries, last_update):
+        ''' Add the AQIDaySummary of each day to the AQI daily summary of the field. '''
+        table_name = SQLExecutor.aqi_daily_summary_table_name.format(obs_type=obs_type)
+        columns = ', '.join(AQIDaySummary.columns)
+        upsert = SQLExecutor.get_upsert(db_manager)
+        with weedb.Transaction(db_manager.connection) as cursor:
+            for day, day_summary in day_summaries.items():
+                cursor.execute(f"SELECT {columns} FROM {table_name} WHERE dateTime = ?", (day,))
+                row = cursor.fetchone()
+                if row:
+                    day_summary.merge(AQIDaySummary(row))
+                cursor.execute(f"{upsert} {table_name} (dateTime, {columns}) "
+                               f"VALUES (?, {', '.join('?' * len(AQIDaySummary.columns))})",
+                               (day,) + day_summary.to_row())
+            cursor.execute(f"{upsert} {SQLExecutor.aqi_daily_summary_metadata_table_name} (name, value) VALUES (?, ?)",
+                           (f'lastUpdate_{obs_type}', str(int(last_update))))
+
+        self.aqi_daily_summaries.setdefault(self.get_database_key(db_manager), {})[obs_type] = last_update
+
+    def get_aqi_daily_summary_data(self, db_manager, obs_type, days):
+        ''' Get the AQI daily summary rows, dateTime followed by the AQIDaySummary columns, of the days. '''
+        table_name = SQLExecutor.aqi_daily_summary_table_name.format(obs_type=obs_type)
+        return db_manager.genSql(f"SELECT dateTime, {', '.join(AQIDaySummary.columns)} FROM {table_name} "
+                                 "WHERE dateTime >= ? AND dateTime < ? ORDER BY dateTime ASC",
+                                 days)
 
     def get_concentration_data_nowcast(self, db_manager, dependent_field, stop, start):
         ''' Get the necessary concentration data to compute for a given time. 
             The data returned may contain None values for the concentration.
             It also may have missing records (gaps)'''
 
-        # ToDo: need to get this from the 'console'
-        archive_interval = 300
+        # The hourly concentrations can only be used when the groups are whole hours.
+        # Either on the hour, or, the same as the groups, 'offset' seconds after it.
+        offset = SQLExecutor.archive_interval - 1
+        if dependent_field in self.hourly_concentrations.get(self.get_database_key(db_manager), ()):
+            for hour_offset in (0, offset):
+                if (start - hour_offset) % 3600 == 0 and (stop - hour_offset) % 3600 == 0:
+                    sql_str = self._get_sql_stmt(SQLExecutor.sql_hourly_concentration_grouped_str, db_manager, None)
+                    return self._get_rows(db_manager, sql_str, (dependent_field, start - hour_offset, stop - hour_offset))
 
-        interpolation_dict = {
-            'start': start,
-            'stop': stop,
-            'archive_interval': archive_interval,
-            'input': dependent_field
-        }
+        input_index = self._get_input_index(dependent_field)
+        if input_index is not None:
+            rows = self._get_multi_input_rows(db_manager,
+                                              SQLExecutor.sql_concentration_grouped_multi_str,
+                                              (start, stop),
+                                              averages=', '.join(f'avg({input_field})' for input_field in self.inputs))
+            if rows is not None:
+                return ((row[0], row[1 + input_index]) for row in rows)
 
-        sql_str = SQLExecutor.sql_concentration_grouped_str.format(**interpolation_dict)
+        sql_str = self._get_sql_stmt(SQLExecutor.sql_concentration_grouped_str, db_manager, dependent_field)
 
-        return db_manager.genSql(sql_str)
+        return self._get_rows(db_manager, sql_str, (start, stop))
 
     def get_concentration_data(self, dependent_field, timespan, db_manager):
         ''' Get the concentration data necessary to compute AQI. '''
         # dependent_field = self.aqi_fields[dependent_field]['input']
 
-        interpolation_dict = {
-            'table_name': db_manager.table_name,
-            'input': dependent_field
-        }
+        input_index = self._get_input_index(dependent_field)
+        if input_index is not None:
+            rows = self._get_multi_input_rows(db_manager, SQLExecutor.sql_concentration_str, timespan)
+            if rows is not None:
+                return ((row[0], row[1], row[2], row[3 + input_index]) for row in rows)
 
-        sql_str = SQLExecutor.sql_concentration_str.format(**interpolation_dict)
+        sql_str = self._get_sql_stmt(SQLExecutor.sql_concentration_str, db_manager, dependent_field)
 
         try:
-            records_iter = db_manager.genSql(sql_str, timespan)
+            records_iter = self._get_rows(db_manager, sql_str, timespan)
         except weedb.NoColumnError:
             # ToDo: raise specific exception and deal with it in abover layer....
             raise weewx.UnknownType(dependent_field) from weedb.NoColumnError
 
         return records_iter
 
+    def get_concentration_data_not_null(self, dependent_field, timespan, db_manager):
+        ''' Get the (dateTime, concentration) records that have a concentration, ordered by dateTime. '''
+        rows = self._get_multi_input_not_null_rows(db_manager, dependent_field, timespan)
+        if rows is not None:
+            return ((row[0], row[1]) for row in rows)
+
+        sql_str = self._get_sql_stmt(SQLExecutor.sql_concentration_not_null_str, db_manager, dependent_field)
+
+        try:
+            records_iter = self._get_rows(db_manager, sql_str, timespan)
+        except weedb.NoColumnError:
+            raise weewx.UnknownType(dependent_field) from weedb.NoColumnError
+
+        return records_iter
+
+    def _get_multi_input_not_null_rows(self, db_manager, dependent_field, timespan):
+        # The (dateTime, concentration) rows of the input that have a concentration, from the inputs fetched together.
+        input_index = self._get_input_index(dependent_field)
+        if input_index is None:
+            return None
+
+        rows = self._get_multi_input_rows(db_manager,
+                                          SQLExecutor.sql_concentration_not_null_multi_str,
+                                          timespan,
+                                          not_null=' OR '.join(f'{input_field} IS NOT NULL' for input_field in self.inputs))
+        if rows is None:
+            return None
+        return ((row[0], row[1 + input_index]) for row in rows if row[1 + input_index] is not None)
+
+    def get_daily_summary_data(self, dependent_field, timespan, aggregate_type, db_manager):
+        ''' Get the 'min', 'max' (value, time) or 'count' of the whole days of the timespan from the daily summary. '''
+        sql_str = self._get_sql_stmt(SQLExecutor.daily_summary_sql_stmts[aggregate_type], db_manager, dependent_field)
+        return self._get_row(db_manager, sql_str, timespan)
+
+    def get_extreme_concentration_data(self, dependent_field, timespan, aggregate_type, db_manager):
+        ''' Get the 'min' or 'max' (concentration, dateTime) of the timespan. '''
+        sql_str = self._get_sql_stmt(SQLExecutor.extreme_sql_stmts[aggregate_type], db_manager, dependent_field)
+        try:
+            return self._get_row(db_manager, sql_str, timespan)
+        except weedb.NoColumnError:
+            raise weewx.UnknownType(dependent_field) from weedb.NoColumnError
+
+    @staticmethod
+    def register_aqi_function(db_manager, name, function):
+        '''
+        Register a function, that calculates the AQI of a concentration, with a SQLite database.
+        Returns False if the database is not SQLite.
+        '''
+        if db_manager.connection.dbtype != 'sqlite':
+            return False
+
+        connection = db_manager.connection.connection
+        try:
+            connection.create_function(name, 1, function, deterministic=True)
+        except sqlite3.NotSupportedError:
+            # SQLite is older than 3.8.3
+            connection.create_function(name, 1, function)
+        return True
+
+    def get_aqi_aggregate_data(self, db_manager, dependent_field, aqi_expression, timespan):
+        ''' Get the sum and count of the AQI values, calculated by aqi_expression, within the timespan. '''
+        sql_str = self._get_sql_stmt(SQLExecutor.sql_aqi_aggregate_str, db_manager, dependent_field, aqi=aqi_expression)
+        return self._get_row(db_manager, sql_str, timespan)
+
+    def get_aqi_aggregated_series_data(self, db_manager, dependent_field, aqi_expression, timespan, aggregate_interval):
+        '''
+        Get the sum and count of the AQI values, calculated by aqi_expression, of each interval of the timespan.
+        The rows are the offset of the start of the interval from the start of the timespan, the sum, and the count.
+        Intervals without data have no row.
+        '''
+        remainder = SQLExecutor.sql_remainder_strs[db_manager.connection.dbtype].format(dividend='(dateTime - ? - 1)', divisor='?')
+        sql_str = self._get_sql_stmt(SQLExecutor.sql_aqi_aggregated_series_str, db_manager, dependent_field,
+                                     aqi=aqi_expression, remainder=remainder)
+        return self._get_rows(db_manager, sql_str, (timespan.start, timespan.start, aggregate_interval, timespan.start, timespan.stop))
+
+    def get_archive_sql_stmts(self, db_manager, dependent_field, timespan):
+        ''' The (name, statement, parameters) of the statements that query the input in the archive table over the timespan. '''
+        sql_stmts = [
+            ('concentration', SQLExecutor.sql_concentration_str, timespan),
+            ('concentration_not_null', SQLExecutor.sql_concentration_not_null_str, timespan),
+            ('concentration_grouped', SQLExecutor.sql_concentration_grouped_str, timespan),
+            ('hourly_sums', SQLExecutor.sql_hourly_sums_str, (timespan.start,)),
+        ]
+        sql_stmts.extend((aggregate_type, sql_stmt, timespan)
+                         for aggregate_type, (_query_type, sql_stmt) in SQLExecutor.aggregate_query_stmts.items())
+        sql_stmts.extend((f'extreme_{aggregate_type}', sql_stmt, timespan)
+                         for aggregate_type, sql_stmt in SQLExecutor.extreme_sql_stmts.items())
+
+        return [(name, self._get_sql_stmt(sql_template, db_manager, dependent_field), parameters)
+                for name, sql_template, parameters in sql_stmts]
+
     def get_aggregate_concentation_data(self, dependent_field, timespan, aggregate_type, db_manager):
         ''' Get the concentration data to compute aggregated AQI values. '''
         # dependent_field = self.aqi_fields[obs_type]['input']
 
-        sql_stmts = ChainMap(SQLExecutor.aggregate_sql_stmts, SQLExecutor.simple_sql_stmts, SQLExecutor.basic_sql_stmts)
-        if aggregate_type not in sql_stmts:
+        if aggregate_type not in SQLExecutor.aggregate_query_stmts:
             raise weewx.UnknownAggregation(aggregate_type)
 
-        if aggregate_type in SQLExecutor.simple_sql_stmts:
-            query_type = 'simple'
-        elif aggregate_type in SQLExecutor.aggregate_sql_stmts:
-            query_type = 'aggregate'
-        else:
-            query_type = 'basic'
-
-        interpolation_dict = {
-            'start': timespan.start,
-            'stop': timespan.stop,
-            'table_name': db_manager.table_name,
-            'input': dependent_field
-        }
+        query_type, sql_template = SQLExecutor.aggregate_query_stmts[aggregate_type]
+        if query_type == 'aggregate':
+            rows = self._get_multi_input_not_null_rows(db_manager, dependent_field, timespan)
+            if rows is not None:
+                return query_type, ((row[1],) for row in rows)
 
-        sql_stmt = sql_stmts[aggregate_type].format(**interpolation_dict)
+        sql_stmt = self._get_sql_stmt(sql_template, db_manager, dependent_field)
 
         try:
-            records_iter = db_manager.genSql(sql_stmt)
+            records_iter = self._get_rows(db_manager, sql_stmt, timespan)
         except weedb.NoColumnError:
             # ToDo: raise specific exception and deal with it in abover layer....
             raise weewx.UnknownType(dependent_field) from weedb.NoColumnError
 
         return query_type, records_iter
 
+class QueryCoalescer():
+    """
+    Share the rows of a query of the archive between the requests for the same query of the same database,
+    whether they are made at the same time (by different threads) or one after another.
+    For example, by AQI fields that use the same input, or by plots of the same timespan.
+    The rows of the most recent queries are kept, until the database has a new record.
+    """
+    def __init__(self, max_entries=16):
+        self.max_entries = max_entries
+        self.lock = threading.Lock()
+        # The rows, keyed by the database, its last record, the statement and its parameters
+        self.results = collections.OrderedDict()
+        # The queries being run, and the event that is set when they finish
+        self.pending = {}
+        self.stats = {'queries': 0, 'shared': 0}
+
+    def get_rows(self, db_manager, sql_stmt, parameters):
+        ''' Get the list of rows of the query, running it only if the rows are not available from the same query. '''
+        key = (SQLExecutor.get_database_key(db_manager), db_manager.last_timestamp, sql_stmt, tuple(parameters))
+        while True:
+            with self.lock:
+                if key in self.results:
+                    self.results.move_to_end(key)
+                    self.stats['shared'] += 1
+                    return self.results[key]
+                event = self.pending.get(key)
+                if event is None:
+                    event = threading.Event()
+                    self.pending[key] = event
+                    break
+            # Another thread is running the query, when it finishes the rows are available (unless it failed).
+            event.wait()
+
+        try:
+            rows = list(db_manager.genSql(sql_stmt, parameters))
+            with self.lock:
+                self.stats['queries'] += 1
+                self.results[key] = rows
+                while len(self.results) > self.max_entries:
+                    self.results.popitem(last=False)
+        finally:
+            with self.lock:
+                del self.pending[key]
+            event.set()
+
+        return rows
+
+class ResultMemo():
+    """
+    Remember the results of the XType calls for a report cycle.
+    A template often asks for the same value more than once,
+    for example $current.pm2_5_aqi_nowcast.has_data, then .raw and then the formatted value.
+    The results are cleared when a new archive record arrives.
+    Because they are also keyed by the last record of the database, a result is never used after the database has a new record.
+    """
+    def __init__(self, max_entries=256, tracer=None):
+        self.max_entries = max_entries
+        self.tracer = tracer
+        self.lock = threading.Lock()
+        # The results, keyed by the database, its last record, and the call
+        self.results = collections.OrderedDict()
+        # The keys that have been asked about, with 'is_repeated'
+        self.asked = collections.OrderedDict()
+        self.stats = {'hits': 0, 'misses': 0}
+
+    @staticmethod
+    def get_key(db_manager, *args):
+        ''' The key of a call, None if the call cannot be remembered. '''
+        if db_manager is None:
+            key = (None, None, *args)
+        else:
+            key = (SQLExecutor.get_database_key(db_manager), db_manager.last_timestamp, *args)
+        try:
+            hash(key)
+        except TypeError:
+            return None
+        return key
+
+    def get(self, key, function, *args, **kwargs):
+        ''' Get the result of the call, calling the function only if the result is not remembered. '''
+        if key is None:
+            return function(*args, **kwargs)
+
+        with self.lock:
+            found = key in self.results
+            if found:
+                self.results.move_to_end(key)
+                self.stats['hits'] += 1
+                result = self.results[key]
+            else:
+                self.stats['misses'] += 1
+        if self.tracer:
+            self.tracer.set_attribute(f'memo.{key[2]}', 'hit' if found else 'miss')
+        if found:
+            return result
+
+        # Exceptions, like CannotCalculate, are not remembered.
+        result = function(*args, **kwargs)
+        with self.lock:
+            self.results[key] = result
+            while len(self.results) > self.max_entries:
+                self.results.popitem(last=False)
+
+        return result
+
+    def is_repeated(self, key):
+        ''' Whether the result of the key is remembered, or the key was asked about before. '''
+        if key is None:
+            return False
+
+        with self.lock:
+            if key in self.results or key in self.asked:
+                return True
+            self.asked[key] = True
+            while len(self.asked) > self.max_entries:
+                self.asked.popitem(last=False)
+        return False
+
+    def clear(self):
+        ''' Forget the results. Returns the hit and miss counts since the last time. '''
+        with self.lock:
+            self.results.clear()
+            self.asked.clear()
+            stats = self.stats
+            self.stats = {'hits': 0, 'misses': 0}
+        return stats
+
+class IntervalCache():
+    """
+    Keep the aggregates of the intervals that are closed, that end at or before the last record of the database.
+    These do not change, so they are kept from one report cycle to the next,
+    and each report cycle only calculates the intervals after the last record.
+    The watermark of a database is its last record when aggregates were kept.
+    A record added at or before the watermark (a back-fill) removes the aggregates of the intervals that end at or after it.
+    When there is an IntervalStore, the aggregates of its database are also kept in it.
+    """
+    def __init__(self, max_entries=8192, store=None, tracer=None):
+        self.max_entries = max_entries
+        self.store = store
+        self.tracer = tracer
+        self.lock = threading.Lock()
+        # The aggregates, keyed by the database, the interval start and stop, and the call
+        self.results = collections.OrderedDict()
+        self.watermarks = {}
+        self.stats = {'hits': 0, 'misses': 0, 'evictions': 0, 'invalidations': 0, 'stored_hits': 0}
+
+    @staticmethod
+    def is_closed(db_manager, stop):
+        ''' Whether the interval ending at 'stop' is closed. '''
+        return db_manager is not None and db_manager.last_timestamp is not None and stop <= db_manager.last_timestamp
+
+    @staticmethod
+    def get_key(db_manager, start, stop, *args):
+        ''' The key of the aggregate of the interval, None if it cannot be kept. '''
+        key = (SQLExecutor.get_database_key(db_manager), start, stop, *args)
+        try:
+            hash(key)
+        except TypeError:
+            return None
+        return key
+
+    def lookup(self, key):
+        ''' Returns whether the aggregate is kept, and the aggregate. '''
+        if key is None:
+            return False, None
+        with self.lock:
+            if key in self.results:
+                self.results.move_to_end(key)
+                self.stats['hits'] += 1
+                return True, self.results[key]
+
+        if self.store and key[0] == self.store.database_key:
+            found, result = self.store.get(key)
+            if found:
+                with self.lock:
+                    self.stats['stored_hits'] += 1
+                    # The aggregate was kept when the last record was at or after the end of the interval.
+                    self.watermarks[key[0]] = max(self.watermarks.get(key[0], key[2]), key[2])
+                    self._add(key, result)
+                return True, result
+
+        with self.lock:
+            self.stats['misses'] += 1
+        return False, None
+
+    def put(self, db_manager, key, result):
+        ''' Keep the aggregate. '''
+        self.put_many(db_manager, [(key, result)])
+
+    def put_many(self, db_manager, results):
+        ''' Keep the (key, aggregate) pairs of a database. '''
+        results = [(key, result) for key, result in results if key is not None]
+        if not results:
+            return
+        database_key = results[0][0][0]
+        with self.lock:
+            self.watermarks[database_key] = max(self.watermarks.get(database_key, db_manager.last_timestamp),
+                                                db_manager.last_timestamp)
+            for key, result in results:
+                self._add(key, result)
+
+        if self.store and database_key == self.store.database_key:
+            self.store.put_many(results)
+
+    def _add(self, key, result):
+        # The lock is held.
+        self.results[key] = result
+        self.results.move_to_end(key)
+        while len(self.results) > self.max_entries:
+            self.results.popitem(last=False)
+            self.stats['evictions'] += 1
+
+    def get(self, db_manager, key, function, *args, **kwargs):
+        ''' Get the aggregate, calling the function only if it is not kept. '''
+        found, result = self.lookup(key)
+        if self.tracer:
+            self.tracer.set_attribute('interval_cache', 'hit' if found else 'miss')
+        if not found:
+            result = function(*args, **kwargs)
+            self.put(db_manager, key, result)
+        return result
+
+    def add_record(self, timestamp):
+        ''' A new archive record, if it is a back-fill, the aggregates of the intervals that end at or after it are removed. '''
+        with self.lock:
+            for database_key, watermark in self.watermarks.items():
+                if timestamp > watermark:
+                    continue
+                keys = [key for key in self.results if key[0] == database_key and key[2] >= timestamp]
+                for key in keys:
+                    del self.results[key]
+                self.stats['invalidations'] += len(keys)
+
+        if self.store and timestamp <= self.watermarks.get(self.store.database_key, -float('inf')):
+            self.store.invalidate(timestamp)
+
+    def get_stats(self):
+        ''' The counters, the number of aggregates kept and the hit rate. '''
+        with self.lock:
+            stats = dict(self.stats, entries=len(self.results))
+        lookups = stats['hits'] + stats['stored_hits'] + stats['misses']
+        stats['hit_rate'] = (stats['hits'] + stats['stored_hits']) / lookups if lookups else None
+        return stats
+
+class IntervalStore():
+    """
+    Keep the aggregates of the closed intervals of a database in a SQLite file,
+    so that they are available after a restart, and to report processes that use the same database.
+    The file is in WAL mode, so one process can write while others read.
+    The aggregates are keyed by their call, which includes a hash of the algorithm and its breakpoints.
+    Intervals that end more than 'retention_days' before the last record are removed.
+    """
+
+    table_name = 'aqitype_intervals'
+
+    sql_create_str = f'''
+    CREATE TABLE IF NOT EXISTS {table_name} (
+        call TEXT NOT NULL,
+        start INTEGER NOT NULL,
+        stop INTEGER NOT NULL,
+        value TEXT,
+        PRIMARY KEY (call, start, stop))
+    '''
+
+    sql_select_str = f"SELECT value FROM {table_name} WHERE call = ? AND start = ? AND stop = ?"
+
+    sql_insert_str = f"INSERT OR REPLACE INTO {table_name} (call, start, stop, value) VALUES (?, ?, ?, ?)"
+
+    sql_delete_str = f"DELETE FROM {table_name} WHERE stop >= ?"
+
+    sql_trim_str = f"DELETE FROM {table_name} WHERE stop < ?"
+
+    def __init__(self, path, database_key, retention_days=400):
+        self.database_key = database_key
+        self.retention_days = retention_days
+        self.trimmed = None
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(path, timeout=30, isolation_level=None, check_same_thread=False)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+        self.connection.execute(IntervalStore.sql_create_str)
+
+    @staticmethod
+    def _get_call(key):
+        # The key is (database key, start, stop, call...). None if the call has options that cannot be stored.
+        try:
+            return json.dumps(key[3:])
+        except TypeError:
+            return None
+
+    @staticmethod
+    def _encode(value):
+        if isinstance(value, ValueTuple):
+            return json.dumps({'value_tuple': list(value)})
+        return json.dumps({'value': value})
+
+    @staticmethod
+    def _decode(text):
+        value = json.loads(text)
+        if 'value_tuple' in value:
+            return ValueTuple(*value['value_tuple'])
+        return value['value']
+
+    def get(self, key):
+        ''' Returns whether the aggregate is kept, and the aggregate. '''
+        call = self._get_call(key)
+        if call is None:
+            return False, None
+        with self.lock:
+            row = self.connection.execute(IntervalStore.sql_select_str, (call, key[1], key[2])).fetchone()
+        if row is None:
+            return False, None
+        return True, self._decode(row[0])
+
+    def put_many(self, results):
+        ''' Keep the (key, aggregate) pairs, in one transaction. '''
+        rows = []
+        for key, result in results:
+            call = self._get_call(key)
+            if call is None:
+                continue
+            try:
+                rows.append((call, key[1], key[2], self._encode(result)))
+            except TypeError:
+                # An aggregate that cannot be stored
+                continue
+        if not rows:
+            return
+        with self.lock:
+            self.connection.execute("BEGIN")
+            try:
+                self.connection.executemany(IntervalStore.sql_insert_str, rows)
+            except BaseException:
+                self.connection.execute("ROLLBACK")
+                raise
+            self.connection.execute("COMMIT")
+
+    def invalidate(self, timestamp):
+        ''' Remove the aggregates of the intervals that end at or after the timestamp. '''
+        with self.lock:
+            self.connection.execute(IntervalStore.sql_delete_str, (timestamp,))
+
+    def trim(self, timestamp):
+        ''' Remove the intervals older than the retention, at most once a day. '''
+        if self.trimmed is not None and timestamp - self.trimmed < 86400:
+            return
+        with self.lock:
+            self.connection.execute(IntervalStore.sql_trim_str, (timestamp - self.retention_days * 86400,))
+        self.trimmed = timestamp
+
+    def close(self):
+        ''' Close the file. '''
+        with self.lock:
+            self.connection.close()
+
+class Metrics():
+    """
+    Measure the calls of the AQI XType, by field, method and aggregate type:
+    the number of calls, a histogram of their time, the rows fetched from the archive,
+    and how the time is split between the queries of the archive and the calculation.
+    """
+
+    # The upper bounds, in seconds, of the histogram buckets. The last bucket is everything slower.
+    buckets = (0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 10.0)
+
+    # The metrics of the running AQITypeManager, for the $AQIMetrics tag.
+    instance = None
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        # The calls being measured by each thread, the innermost last
+        self.local = threading.local()
+        # Keyed by (field, method, aggregate type)
+        self.calls = {}
+        self.started = time.time()
+
+    @contextlib.contextmanager
+    def measure(self, obs_type, method, aggregate_type=None):
+        ''' Measure a call. The queries made during it are added to it. '''
+        stack = self.local.__dict__.setdefault('stack', [])
+        frame = types.SimpleNamespace(sql_time=0.0, rows=0)
+        stack.append(frame)
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            stack.pop()
+            self._add((obs_type, method, aggregate_type or ''), elapsed, frame)
+
+    def _add(self, key, elapsed, frame):
+        with self.lock:
+            call = self.calls.get(key)
+            if call is None:
+                call = types.SimpleNamespace(count=0, time=0.0, sql_time=0.0, rows=0, histogram=[0] * (len(self.buckets) + 1))
+                self.calls[key] = call
+            call.count += 1
+            call.time += elapsed
+            call.sql_time += frame.sql_time
+            call.rows += frame.rows
+            call.histogram[bisect.bisect_left(self.buckets, elapsed)] += 1
+
+    def add_sql(self, elapsed, rows):
+        ''' Add the time and rows of a query to the call being measured. '''
+        stack = self.local.__dict__.get('stack')
+        if stack:
+            stack[-1].sql_time += elapsed
+            stack[-1].rows += rows
+
+    def time_rows(self, function, *args):
+        ''' Run the query function, and return an iterator of its rows that adds the time to fetch them to the call. '''
+        start = time.perf_counter()
+        rows_iter = iter(function(*args))
+        return self._time_rows(rows_iter, time.perf_counter() - start)
+
+    def _time_rows(self, rows_iter, sql_time):
+        rows = 0
+        try:
+            while True:
+                start = time.perf_counter()
+                try:
+                    row = next(rows_iter)
+                except StopIteration:
+                    break
+                finally:
+                    sql_time += time.perf_counter() - start
+                rows += 1
+                yield row
+        finally:
+            self.add_sql(sql_time, rows)
+
+    def get_summary(self):
+        ''' The metrics of each field, method and aggregate type, the slowest first. '''
+        with self.lock:
+            calls = [(key, types.SimpleNamespace(**vars(call))) for key, call in self.calls.items()]
+
+        summary = []
+        for (obs_type, method, aggregate_type), call in calls:
+            summary.append(types.SimpleNamespace(obs_type=obs_type,
+                                                 method=method,
+                                                 aggregate_type=aggregate_type,
+                                                 count=call.count,
+                                                 time=call.time,
+                                                 average_time=call.time / call.count,
+                                                 sql_time=call.sql_time,
+                                                 calculation_time=max(call.time - call.sql_time, 0.0),
+                                                 rows=call.rows,
+                                                 histogram=list(zip(self.buckets + (float('inf'),), call.histogram))))
+        return sorted(summary, key=lambda metric: metric.time, reverse=True)
+
+    def format_summary(self):
+        ''' A one line summary, for the log. '''
+        summary = self.get_summary()
+        count = sum(metric.count for metric in summary)
+        total_time = sum(metric.time for metric in summary)
+        sql_time = sum(metric.sql_time for metric in summary)
+        rows = sum(metric.rows for metric in summary)
+        line = f"(metrics) {count} calls in {total_time:.3f}s " \
+               f"({sql_time:.3f}s querying, {total_time - sql_time:.3f}s calculating), {rows} rows " \
+               f"since {time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(self.started))}"
+        if summary:
+            slowest = summary[0]
+            name = ' '.join(part for part in (slowest.obs_type, slowest.method, slowest.aggregate_type) if part)
+            line += f", slowest {name} {slowest.count} calls in {slowest.time:.3f}s"
+        return line
+
+    def format_prometheus(self):
+        ''' The metrics in the Prometheus text format. '''
+        lines = ['# HELP aqitype_call_seconds The time of the AQI XType calls.',
+                 '# TYPE aqitype_call_seconds histogram']
+        summary = sorted(self.get_summary(), key=lambda metric: (metric.obs_type, metric.method, metric.aggregate_type))
+        for metric in summary:
+            labels = f'obs_type="{metric.obs_type}",method="{metric.method}",aggregate_type="{metric.aggregate_type}"'
+            cumulative = 0
+            for bound, count in metric.histogram:
+                cumulative += count
+                bound = '+Inf' if bound == float('inf') else repr(bound)
+                lines.append(f'aqitype_call_seconds_bucket{{{labels},le="{bound}"}} {cumulative}')
+            lines.append(f'aqitype_call_seconds_sum{{{labels}}} {metric.time}')
+            lines.append(f'aqitype_call_seconds_count{{{labels}}} {metric.count}')
+        for name, attribute, description in (('aqitype_sql_seconds_total', 'sql_time', 'The time querying the archive.'),
+                                             ('aqitype_calculation_seconds_total', 'calculation_time', 'The time calculating.'),
+                                             ('aqitype_rows_total', 'rows', 'The rows fetched from the archive.')):
+            lines.append(f'# HELP {name} {description}')
+            lines.append(f'# TYPE {name} counter')
+            for metric in summary:
+                labels = f'obs_type="{metric.obs_type}",method="{metric.method}",aggregate_type="{metric.aggregate_type}"'
+                lines.append(f'{name}{{{labels}}} {getattr(metric, attribute)}')
+        return '\n'.join(lines) + '\n'
+
+    def write_textfile(self, path):
+        ''' Write the metrics for the Prometheus node exporter's textfile collector, replacing the file in one step. '''
+        temporary_path = f'{path}.{os.getpid()}.tmp'
+        with open(temporary_path, 'w', encoding='utf-8') as textfile:
+            textfile.write(self.format_prometheus())
+        os.replace(temporary_path, path)
+
+class Tracer():
+    """
+    Trace the calls of the AQI XType as nested spans: the call, the queries of the archive and the calculations made during it.
+    Each span has its name, start, duration and attributes, such as the field, timespan, rows and whether a kept result was used.
+    The spans of a call are appended to the file, one JSON object per line, when the outermost call ends.
+    Queries made outside of a traced call, like those that update the daily summaries, are not traced.
+    """
+    def __init__(self, logger, path):
+        self.logger = logger
+        self.path = path
+        self.lock = threading.Lock()
+        # The spans being traced by each thread, the innermost last, and the ended spans of the trace
+        self.local = threading.local()
+        self.span_ids = itertools.count(1)
+        self.write_error = False
+
+    @contextlib.contextmanager
+    def span(self, name, **attributes):
+        ''' Trace a span, nested in the span being traced. '''
+        stack = self.local.__dict__.setdefault('stack', [])
+        if not stack:
+            self.local.spans = []
+        span = self._new_span(name, attributes, stack[-1] if stack else None)
+        stack.append(span)
+        start = time.perf_counter()
+        try:
+            yield span
+        except Exception as exception:
+            span['error'] = type(exception).__name__
+            raise
+        finally:
+            span['duration'] = time.perf_counter() - start
+            stack.pop()
+            self.local.spans.append(span)
+            if not stack:
+                self._write(self.local.spans)
+                self.local.spans = []
+
+    def _new_span(self, name, attributes, parent):
+        span_id = next(self.span_ids)
+        return {
+            'trace_id': parent['trace_id'] if parent else f'{os.getpid()}-{span_id}',
+            'span_id': span_id,
+            'parent_id': parent['span_id'] if parent else None,
+            'name': name,
+            'start': time.time(),
+            'duration': 0.0,
+            'attributes': attributes,
+        }
+
+    def add_span(self, name, **attributes):
+        ''' Add a span to the span being traced, for the caller to set its duration. None if there is no span being traced. '''
+        stack = self.local.__dict__.get('stack')
+        if not stack:
+            return None
+        span = self._new_span(name, attributes, stack[-1])
+        self.local.spans.append(span)
+        return span
+
+    def set_attribute(self, name, value):
+        ''' Set an attribute of the span being traced. '''
+        stack = self.local.__dict__.get('stack')
+        if stack:
+            stack[-1]['attributes'][name] = value
+
+    def trace_rows(self, sql_stmt, parameters, function, *args):
+        ''' Run the query function, and return an iterator of its rows that adds the time to fetch them, and their count, to its span. '''
+        span = self.add_span('sql', statement=sql_stmt, parameters=parameters)
+        if span is None:
+            return function(*args)
+        start = time.perf_counter()
+        rows_iter = iter(function(*args))
+        span['duration'] = time.perf_counter() - start
+        return self._trace_rows(span, rows_iter)
+
+    @staticmethod
+    def _trace_rows(span, rows_iter):
+        rows = 0
+        try:
+            while True:
+                start = time.perf_counter()
+                try:
+                    row = next(rows_iter)
+                except StopIteration:
+                    break
+                finally:
+                    span['duration'] += time.perf_counter() - start
+                rows += 1
+                yield row
+        finally:
+            span['attributes']['rows'] = rows
+
+    def _write(self, spans):
+        # The spans are in the order that they ended, the outermost last.
+        lines = ''.join(json.dumps(span, default=str) + '\n' for span in sorted(spans, key=lambda span: span['span_id']))
+        try:
+            with self.lock:
+                with open(self.path, 'a', encoding='utf-8') as trace_file:
+                    trace_file.write(lines)
+        except OSError as exception:
+            if not self.write_error:
+                self.logger.logerr(f"Unable to write the trace to '{self.path}': {exception}")
+            self.write_error = True
+
+class Profiler():
+    """
+    Profile the calls of the AQI XType with cProfile, during the next 'cycles' report cycles,
+    and keep the profile of each call that is slower than 'threshold' seconds.
+    Only the outermost call is profiled, and only one call at a time, because cProfile profiles one thread at a time.
+    The profiles are written to 'directory'. Its index lists the field, method, aggregate type and time of each call,
+    and the profile that it is in.
+    """
+
+    index_name = 'index.jsonl'
+
+    def __init__(self, directory, cycles=1, threshold=None):
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.cycles = cycles
+        self.threshold = threshold
+        self.lock = threading.Lock()
+        # Whether a call is being profiled
+        self.active = False
+        self.cycle_start = time.time()
+        self.cycle_stats = None
+        self.cycle_calls = []
+        self.skipped = 0
+        # Numbers the profiles of the slow calls
+        self.calls = 0
+
+    @contextlib.contextmanager
+    def profile(self, obs_type, method, aggregate_type=None):
+        ''' Profile the call, unless another one is being profiled, or there is nothing to profile. '''
+        with self.lock:
+            if self.active or (self.cycles <= 0 and self.threshold is None):
+                if self.active:
+                    self.skipped += 1
+                profiler = None
+            else:
+                self.active = True
+                profiler = cProfile.Profile()
+
+        if profiler is None:
+            yield
+            return
+
+        try:
+            start = time.perf_counter()
+            try:
+                profiler.enable()
+            except ValueError:
+                # Another profiler, not this one, is running.
+                profiler = None
+            try:
+                yield
+            finally:
+                if profiler:
+                    profiler.disable()
+                    self._add(profiler, obs_type, method, aggregate_type or '', time.perf_counter() - start)
+        finally:
+            with self.lock:
+                self.active = False
+
+    def _add(self, profiler, obs_type, method, aggregate_type, elapsed):
+        call = {'obs_type': obs_type, 'method': method, 'aggregate_type': aggregate_type, 'time': elapsed, 'timestamp': time.time()}
+        if self.threshold is not None and elapsed >= self.threshold:
+            with self.lock:
+                self.calls += 1
+                sequence = self.calls
+            file_name = '-'.join(part for part in ('aqitype', f'{int(call["timestamp"])}', f'{sequence}', obs_type, method, aggregate_type)
+                                 if part) + '.prof'
+            profiler.dump_stats(os.path.join(self.directory, file_name))
+            self._write_index([dict(call, file=file_name)])
+
+        with self.lock:
+            if self.cycles > 0:
+                if self.cycle_stats is None:
+                    self.cycle_stats = pstats.Stats(profiler)
+                else:
+                    self.cycle_stats.add(profiler)
+                self.cycle_calls.append(call)
+
+    def end_cycle(self):
+        ''' Write the profile of the report cycle that has ended. '''
+        with self.lock:
+            cycle_start = self.cycle_start
+            stats = self.cycle_stats
+            calls = self.cycle_calls
+            self.cycle_start = time.time()
+            self.cycle_stats = None
+            self.cycle_calls = []
+            if stats is not None:
+                self.cycles -= 1
+
+        if stats is not None:
+            file_name = f'aqitype-cycle-{int(cycle_start)}.prof'
+            stats.dump_stats(os.path.join(self.directory, file_name))
+            self._write_index([dict(call, file=file_name) for call in calls])
+
+    def _write_index(self, calls):
+        with self.lock:
+            with open(os.path.join(self.directory, self.index_name), 'a', encoding='utf-8') as index_file:
+                for call in calls:
+                    index_file.write(json.dumps(call) + '\n')
+
+    @staticmethod
+    def summarize(directory, top=0):
+        ''' Summarize the profiled calls by field, method and aggregate type, and the slowest functions of their profiles. '''
+        groups = {}
+        calls = set()
+        with open(os.path.join(directory, Profiler.index_name), encoding='utf-8') as index_file:
+            for line in index_file:
+                call = json.loads(line)
+                group_key = (call['obs_type'], call['method'], call['aggregate_type'])
+                # A slow call of a profiled cycle is in both profiles.
+                if (group_key, call['timestamp'], call['time']) in calls:
+                    groups[group_key].files.add(call['file'])
+                    continue
+                calls.add((group_key, call['timestamp'], call['time']))
+                group = groups.setdefault(group_key,
+                                          types.SimpleNamespace(count=0, time=0.0, max_time=0.0, files=set()))
+                group.count += 1
+                group.time += call['time']
+                group.max_time = max(group.max_time, call['time'])
+                group.files.add(call['file'])
+
+        lines = [f"{'field':<24} {'method':<14} {'aggregate':<10} {'calls':>6} {'total(s)':>10} {'max(s)':>10}"]
+        for (obs_type, method, aggregate_type), group in sorted(groups.items(), key=lambda item: item[1].time, reverse=True):
+            lines.append(f"{obs_type:<24} {method:<14} {aggregate_type:<10} {group.count:>6} {group.time:>10.3f} {group.max_time:>10.3f}")
+
+        if top:
+            files = sorted({file_name for group in groups.values() for file_name in group.files})
+            output = io.StringIO()
+            stats = pstats.Stats(*[os.path.join(directory, file_name) for file_name in files], stream=output)
+            stats.sort_stats('cumulative').print_stats(top)
+            lines.append(output.getvalue())
+
+        return lines
+
+class IndexAdvisor():
+    """
+    Report how the database runs the statements that query an input in the archive table,
+    and create (or drop) an index on (dateTime, input) so that the plans and timings can be compared.
+    """
+    index_name = 'aqitype_{table_name}_{input}'
+
+    # By type of database.
+    sql_explain_strs = {
+        'sqlite': 'EXPLAIN QUERY PLAN {sql_stmt}',
+        'mysql': 'EXPLAIN {sql_stmt}',
+    }
+    # The statement that lists the indexes of the table, and the column of the index name.
+    sql_index_list_strs = {
+        'sqlite': ('PRAGMA index_list({table_name})', 1),
+        'mysql': ('SHOW INDEX FROM {table_name}', 2),
+    }
+    sql_create_index_str = 'CREATE INDEX {index_name} ON {table_name} (dateTime, {input})'
+    sql_drop_index_strs = {
+        'sqlite': 'DROP INDEX {index_name}',
+        'mysql': 'DROP INDEX {index_name} ON {table_name}',
+    }
+
+    def __init__(self, sql_executor, repeat=3):
+        self.sql_executor = sql_executor
+        self.repeat = repeat
+
+    def get_index_name(self, db_manager, dependent_field):
+        ''' The name of the index of the input. '''
+        return IndexAdvisor.index_name.format(table_name=db_manager.table_name, input=dependent_field)
+
+    def has_index(self, db_manager, dependent_field):
+        ''' Whether the index of the input exists. '''
+        sql_stmt, column = IndexAdvisor.sql_index_list_strs[db_manager.connection.dbtype]
+        index_name = self.get_index_name(db_manager, dependent_field)
+        return any(row[column] == index_name for row in db_manager.genSql(sql_stmt.format(table_name=db_manager.table_name)))
+
+    def create_index(self, db_manager, dependent_field):
+        ''' Create the index of the input, if it does not exist. '''
+        if self.has_index(db_manager, dependent_field):
+            return
+        db_manager.connection.execute(IndexAdvisor.sql_create_index_str.format(index_name=self.get_index_name(db_manager, dependent_field),
+                                                                               table_name=db_manager.table_name,
+                                                                               input=dependent_field))
+
+    def drop_index(self, db_manager, dependent_field):
+        ''' Drop the index of the input, if it exists. '''
+        if not self.has_index(db_manager, dependent_field):
+            return
+        db_manager.connection.execute(
+            IndexAdvisor.sql_drop_index_strs[db_manager.connection.dbtype].format(index_name=self.get_index_name(db_manager, dependent_field),
+                                                                                   table_name=db_manager.table_name))
+
+    def explain(self, db_manager, sql_stmt, parameters):
+        ''' The lines of the plan of the statement. '''
+        dbtype = db_manager.connection.dbtype
+        rows = db_manager.genSql(IndexAdvisor.sql_explain_strs[dbtype].format(sql_stmt=sql_stmt), parameters)
+        if dbtype == 'sqlite':
+            # The last column is the description of the step.
+            return [row[-1] for row in rows]
+        return [' '.join(str(value) for value in row if value is not None) for row in rows]
+
+    def time_statement(self, db_manager, sql_stmt, parameters):
+        ''' The best time, in seconds, to run the statement and fetch its rows. Also returns the rows. '''
+        best_time = None
+        for _i in range(self.repeat):
+            start_time = time.perf_counter()
+            rows = list(db_manager.genSql(sql_stmt, parameters))
+            elapsed_time = time.perf_counter() - start_time
+            if best_time is None or elapsed_time < best_time:
+                best_time = elapsed_time
+
+        return best_time, rows
+
+    def _measure(self, db_manager, dependent_field, timespan):
+        results = {}
+        for name, sql_stmt, parameters in self.sql_executor.get_archive_sql_stmts(db_manager, dependent_field, timespan):
+            elapsed_time, rows = self.time_statement(db_manager, sql_stmt, parameters)
+            results[name] = (self.explain(db_manager, sql_stmt, parameters), elapsed_time, rows)
+        return results
+
+    def advise(self, db_manager, dependent_field, timespan, create=False):
+        '''
+        Measure the plan and time of each statement of the input over the timespan.
+        If 'create' is set and the index does not exist, it is created and the statements are measured again.
+        Returns whether the index existed, and for each statement a namespace of
+        the 'plan' and 'time' before, the 'plan_after' and 'time_after' (None if the index was not created),
+        and whether the statement returned the 'same_rows' after.
+        '''
+        had_index = self.has_index(db_manager, dependent_field)
+        before = self._measure(db_manager, dependent_field, timespan)
+        after = {}
+        if create and not had_index:
+            self.create_index(db_manager, dependent_field)
+            after = self._measure(db_manager, dependent_field, timespan)
+
+        results = {}
+        for name, (plan, elapsed_time, rows) in before.items():
+            plan_after, time_after, rows_after = after.get(name, (None, None, None))
+            results[name] = types.SimpleNamespace(plan=plan,
+                                                  time=elapsed_time,
+                                                  plan_after=plan_after,
+                                                  time_after=time_after,
+                                                  same_rows=rows_after is None or rows_after == rows)
+        return had_index, results
+
+    def format_report(self, db_manager, dependent_field, had_index, results):
+        ''' The lines of a report of the results of 'advise'. '''
+        index_name = self.get_index_name(db_manager, dependent_field)
+        lines = [f"Input '{dependent_field}' of table '{db_manager.table_name}', "
+                 f"index '{index_name}' {'exists' if had_index else 'does not exist'}."]
+        for name, result in results.items():
+            lines.append(f"    {name}: {result.time * 1000:.3f} ms")
+            lines.extend(f"        {step}" for step in result.plan)
+            if result.time_after is not None:
+                lines.append(f"    {name} with index: {result.time_after * 1000:.3f} ms")
+                lines.extend(f"        {step}" for step in result.plan_after)
+                if not result.same_rows:
+                    lines.append("        The results are different with the index.")
+        return lines
+
+class HourlyBuffer():
+    """
+    A rolling, in memory, buffer of the hourly concentration sums of the NowCast inputs.
+    The hours are grouped the same way as the database queries.
+    Archive records are added to the hours. Loop packets are averaged until the next archive record,
+    so that the record being calculated can be included as if it had been archived.
+    """
+    def __init__(self, hours=12):
+        self.hours = hours
+        self.lock = threading.Lock()
+        self.database_key = None
+        # The first hour that the buffer has all of the data for
+        self.start = None
+        self.last_timestamp = None
+        # For each input, [maxDateTime, sum, count] keyed by the hour
+        self.hourly_sums = {}
+        # For each input, the [sum, count] of the loop packets since the last archive record
+        self.loop_sums = {}
+
+    @staticmethod
+    def get_hour(timestamp):
+        ''' The hour an archive record is grouped into. '''
+        return (timestamp - SQLExecutor.archive_interval) // 3600 * 3600
+
+    def seed(self, database_key, start, last_timestamp, hourly_sums):
+        ''' Initialize the buffer with the (hour, maxDateTime, sum, count) rows of each input. '''
+        with self.lock:
+            self.database_key = database_key
+            self.start = start
+            self.last_timestamp = last_timestamp
+            self.hourly_sums = {}
+            self.loop_sums = {}
+            for dependent_field, rows in hourly_sums.items():
+                self.hourly_sums[dependent_field] = collections.OrderedDict(
+                    (row[0], [row[1], row[2], row[3]]) for row in sorted(rows))
+                self.loop_sums[dependent_field] = [0, 0]
+
+    def covers(self, database_key, dependent_field, start):
+        ''' Whether the buffer has the data of the input from the hour 'start'. '''
+        return database_key == self.database_key and dependent_field in self.hourly_sums and start >= self.start
+
+    def add_loop_packet(self, packet):
+        ''' Add the concentrations of a loop packet. '''
+        with self.lock:
+            for dependent_field, loop_sum in self.loop_sums.items():
+                if packet.get(dependent_field) is not None:
+                    loop_sum[0] += packet[dependent_field]
+                    loop_sum[1] += 1
+
+    def add_record(self, record):
+        ''' Add the concentrations of an archive record. '''
+        with self.lock:
+            if self.last_timestamp is not None and record['dateTime'] <= self.last_timestamp:
+                return
+
+            hour = self.get_hour(record['dateTime'])
+            for dependent_field, hourly_sums in self.hourly_sums.items():
+                self._add(hourly_sums, hour, record['dateTime'], record.get(dependent_field))
+                while hourly_sums and next(iter(hourly_sums)) <= hour - self.hours * 3600:
+                    hourly_sums.popitem(last=False)
+                self.loop_sums[dependent_field] = [0, 0]
+
+            self.last_timestamp = record['dateTime']
+            self.start = max(self.start, hour - (self.hours - 1) * 3600)
+
+    @staticmethod
+    def _add(hourly_sums, hour, timestamp, concentration):
+        hourly_sum = hourly_sums.setdefault(hour, [timestamp, None, 0])
+        hourly_sum[0] = max(hourly_sum[0], timestamp)
+        if concentration is not None:
+            hourly_sum[1] = concentration if hourly_sum[1] is None else hourly_sum[1] + concentration
+            hourly_sum[2] += 1
+
+    def get_concentration_data_nowcast(self, dependent_field, stop, start, record=None):
+        '''
+        Get the same data as SQLExecutor.get_concentration_data_nowcast.
+        If the record is newer than the last archive record, its concentration is included.
+        A loop packet's concentration is averaged with the loop packets since the last archive record.
+        '''
+        with self.lock:
+            hourly_sums = collections.OrderedDict((hour, list(hourly_sum))
+                                                  for hour, hourly_sum in self.hourly_sums[dependent_field].items())
+
+            if record is not None and record.get(dependent_field) is not None \
+               and (self.last_timestamp is None or record['dateTime'] > self.last_timestamp):
+                concentration = record[dependent_field]
+                timestamp = record['dateTime']
+                if 'interval' not in record:
+                    loop_sum = self.loop_sums[dependent_field]
+                    concentration = (loop_sum[0] + concentration) / (loop_sum[1] + 1)
+                    # The archive record that the loop packet will be part of
+                    timestamp = -(-timestamp // SQLExecutor.archive_interval) * SQLExecutor.archive_interval
+                self._add(hourly_sums, self.get_hour(timestamp), timestamp, concentration)
+
+        return [(hourly_sum[0] - 3600, hourly_sum[1] / hourly_sum[2] if hourly_sum[2] else None)
+                for hour, hourly_sum in reversed(hourly_sums.items())
+                if start <= hour < stop]
+
 class AbstractCalculator():
     """
     Abstract Calculator class.
@@ -268,6 +2035,12 @@ class NowCast(AbstractCalculator):
 
     readings = {'pm2_5', 'pm10'}
 
+    # The number of records needed before 'calculate_series' vectorizes the calculation.
+    vectorize_min_records = 48
+
+    if numpy is not None:
+        _power = numpy.frompyfunc(pow, 2, 1)
+
     def __init__(self, logger, log_level,  sub_calculator, sub_field_name):
         self.logger = logger
         self.log_level = log_level
@@ -314,8 +2087,9 @@ class NowCast(AbstractCalculator):
                 if concentrations[i] is not None:
                     hours_ago = int((current_hour - timestamps[i]) / 3600 + 1)
                     self._logdbg(f"Hours ago: {hours_ago} pm was: {concentrations[i]}")
-                    numerator += concentrations[i] * (weight_factor ** hours_ago)
-                    denominator += weight_factor ** hours_ago
+                    weight = weight_factor ** hours_ago
+                    numerator += concentrations[i] * weight
+                    denominator += weight
 
             concentration = math.trunc((numerator / denominator) * 10) / 10
             self._logdbg(f"The computed concentration is {concentration}")
@@ -333,114 +2107,172 @@ class NowCast(AbstractCalculator):
             raise CalculationError(error_message) from exception
 
     def calculate(self, aqi_type, inputs):
-        # 02/26/2025 - not used, yet (in development)
+        ''' Calculate the NowCast value of each hour. '''
         self._logdbg(f"The type is '{aqi_type}'")
-        records_iter = inputs
+        records_iter = iter(inputs)
 
-        stats = types.SimpleNamespace(
-            not_null = False,
-            count = 0,
-            sum = 0,
-            avg = None,
-            first = None,
-            firsttime = None,
-            last = None,
-            lasttime = None,
-            min = float('inf'),
-            max = -float('inf'),
-            mintime = None,
-            maxtime = None,
-        )
-        i = 1
-        timestamps = []
-        concentrations = []
-        min_concentration = float('inf')
-        max_concentration = -float('inf')
+        stats = self._new_stats()
+
+        # The records are ordered newest to oldest.
+        # The records that have been read, but are not yet in the window.
+        pending = collections.deque()
         for record in records_iter:
-            timestamps.append(record[0])
-            concentrations.append(record[1])
-            if record[1] is not None and  record[1] < min_concentration:
-                min_concentration = record[1]
-            if record[1] is not None and record[1] > max_concentration:
-                max_concentration = record[1]
-
-            if i >= 12:
+            pending.append((record[0], record[1]))
+            if len(pending) >= 12:
                 break
 
-            i += 1
-
         aqi_vec = []
         start_vec = []
-        start_vec.append(timestamps[0])
-        try:
-            concentration = self.calculate_concentration(timestamps[0],
-                                                        min_concentration,
-                                                        max_concentration,
-                                                        timestamps,
-                                                        concentrations)
-            aqi = self.sub_calculator.calculate(aqi_type, concentration)
+        window = NowCastWindow()
+        while pending or window:
+            # The newest hour of the previous window is not part of this one.
+            if start_vec:
+                window.popleft()
+            if not window:
+                window.append(*pending.popleft())
+
+            # The window is at most 12 hours, starting with the newest hour.
+            current_hour = window.timestamps[0]
+            while pending and len(window) < 12 and pending[0][0] > current_hour - 43200:
+                window.append(*pending.popleft())
+
+            start_vec.append(current_hour)
+            aqi = self._calculate_window(aqi_type, current_hour, window)
             aqi_vec.append(aqi)
-            stats.not_null = True
-            stats.count += 1
-            stats.sum += aqi
-            stats.first = aqi
-            stats.firsttime = timestamps[0]
-            if stats.last is None:
-                stats.last = aqi
-                stats.lasttime = timestamps[0]
-            if aqi <= stats.min:
-                stats.min = aqi
-                stats.mintime = timestamps[0]
-            if aqi >= stats.max:
-                stats.max = aqi
-                stats.maxtime = timestamps[0]
+            if aqi is not None:
+                self._update_stats(stats, current_hour, aqi)
 
-        except weewx.CannotCalculate:
-            aqi_vec.append(None)
+            # Each additional record moves the window back an hour.
+            record = next(records_iter, None)
+            if record is None:
+                break
+            pending.append((record[0], record[1]))
 
-        if i >= 12:
-            for record in records_iter:
-                del timestamps[0]
-                del concentrations[0]
+        start_vec.reverse()
+        stop_vec = start_vec[1:]
+        if start_vec:
+            stop_vec.append(start_vec[-1] + 3600)
+        aqi_vec.reverse()
 
-                timestamps.append(record[0])
-                concentrations.append(record[1])
-                if record[1] < min_concentration:
-                    min_concentration = record[1]
-                if record[1] > max_concentration:
-                    max_concentration = record[1]
+        self._finish_stats(stats)
 
-                start_vec.append(timestamps[0])
-                try:
-                    concentration = self.calculate_concentration(timestamps[0],
-                                                                min_concentration,
-                                                                max_concentration,
-                                                                timestamps,
-                                                                concentrations)
-                    aqi = self.sub_calculator.calculate(aqi_type, concentration)
-                    aqi_vec.append(aqi)
-                    stats.not_null = True
-                    stats. count += 1
-                    stats.sum += aqi
-                    stats.first = aqi
-                    stats.firsttime = timestamps[0]
-                    if stats.last is None:
-                        stats.last = aqi
-                        stats.lasttime = timestamps[0]
-                    if aqi <= stats.min:
-                        stats.min = aqi
-                        stats.mintime = timestamps[0]
-                    if aqi >= stats.max:
-                        stats.max = aqi
-                        stats.maxtime = timestamps[0]
-                except weewx.CannotCalculate:
-                    aqi_vec.append(None)
+        return stats, start_vec, stop_vec, aqi_vec
+
+    def _calculate_window(self, aqi_type, current_hour, window):
+        try:
+            concentration = self.calculate_concentration(current_hour,
+                                                        window.min_concentration,
+                                                        window.max_concentration,
+                                                        list(window.timestamps),
+                                                        list(window.concentrations))
+            return self.sub_calculator.calculate(aqi_type, concentration)
+        except weewx.CannotCalculate:
+            return None
+
+    def calculate_series(self, aqi_type, inputs):
+        '''
+        Calculate the NowCast values for a series of hourly records.
+        The results are the same as 'calculate'.
+        When numpy is installed and there are many records, all of the windows are calculated at once.
+        '''
+        records = [(record[0], record[1]) for record in inputs]
+        if numpy is None or len(records) < self.vectorize_min_records:
+            return self.calculate(aqi_type, records)
+
+        self._logdbg(f"Calculating {len(records)} records for type '{aqi_type}' vectorized.")
+        record_count = len(records)
+        window_count = max(record_count - 11, 1)
+
+        # Pad the records, so that every window has 12 entries.
+        # The padding is never within 12 hours, so it is never part of a window.
+        timestamps = numpy.full(record_count + 11, -numpy.inf)
+        concentrations = numpy.full(record_count + 11, numpy.nan)
+        timestamps[:record_count] = [record[0] for record in records]
+        concentrations[:record_count] = [record[1] for record in records]
+
+        # Row i is the window whose newest (current) hour is record i.
+        window_indices = numpy.arange(window_count)[:, None] + numpy.arange(12)
+        window_timestamps = timestamps[window_indices]
+        window_concentrations = concentrations[window_indices]
+        current_hours = timestamps[:window_count]
+
+        # The same rules as 'calculate' and 'calculate_concentration'.
+        in_window = window_timestamps > current_hours[:, None] - 43200
+        has_value = in_window & ~numpy.isnan(window_concentrations)
+        data_count = in_window.sum(axis=1)
+        first_three_none = (in_window[:, :3] & ~has_value[:, :3]).sum(axis=1)
+        valid = (data_count >= 2) & (window_timestamps[:, 1] > current_hours - 7200) & (first_three_none <= 1)
+
+        data_min = numpy.where(has_value, window_concentrations, numpy.inf).min(axis=1)
+        data_max = numpy.where(has_value, window_concentrations, -numpy.inf).max(axis=1)
+        if numpy.any(valid & (data_max == 0)):
+            # 'calculate' reports this as an error, let it.
+            return self.calculate(aqi_type, records)
+
+        with numpy.errstate(divide='ignore', invalid='ignore'):
+            weight_factors = numpy.maximum(1 - (data_max - data_min) / data_max, .5)
+            hours_ago = numpy.trunc((current_hours[:, None] - window_timestamps) / 3600 + 1)
+            # numpy's power can differ from python's in the last bit, so use python's.
+            weights = numpy.where(has_value & valid[:, None],
+                                  self._power(weight_factors[:, None], numpy.where(has_value, hours_ago, 0)),
+                                  0.0).astype(float)
+
+            # Sum in the same order as 'calculate_concentration'.
+            numerator = numpy.zeros(window_count)
+            denominator = numpy.zeros(window_count)
+            for i in range(12):
+                numerator += numpy.where(has_value[:, i], window_concentrations[:, i], 0.0) * weights[:, i]
+                denominator += weights[:, i]
+
+            nowcast_concentrations = numpy.trunc((numerator / denominator) * 10) / 10
+
+        aqi_values = self.sub_calculator.calculate_many(aqi_type,
+                                                        numpy.where(valid, nowcast_concentrations, numpy.nan))
+
+        stats = self._new_stats()
+        start_vec = [record[0] for record in records[:window_count]]
+        for timestamp, aqi in zip(start_vec, aqi_values):
+            if aqi is not None:
+                self._update_stats(stats, timestamp, aqi)
 
         start_vec.reverse()
         stop_vec = start_vec[1:]
         stop_vec.append(start_vec[-1] + 3600)
-        aqi_vec.reverse()
+        aqi_values.reverse()
+
+        self._finish_stats(stats)
 
+        return stats, start_vec, stop_vec, aqi_values
+
+    def calculate_stats(self, timestamps, aqi_values):
+        ''' Calculate the statistics of AQI values, ordered from oldest to newest, the same as 'calculate'. '''
+        stats = self._new_stats()
+        for timestamp, aqi in zip(reversed(timestamps), reversed(aqi_values)):
+            if aqi is not None:
+                self._update_stats(stats, timestamp, aqi)
+        self._finish_stats(stats)
+
+        return stats
+
+    @staticmethod
+    def _new_stats():
+        return types.SimpleNamespace(
+            not_null = False,
+            count = 0,
+            sum = 0,
+            avg = None,
+            first = None,
+            firsttime = None,
+            last = None,
+            lasttime = None,
+            min = float('inf'),
+            max = -float('inf'),
+            mintime = None,
+            maxtime = None,
+        )
+
+    @staticmethod
+    def _finish_stats(stats):
         if stats.count:
             stats.avg = stats.sum / stats.count
         if stats.mintime is None:
@@ -448,7 +2280,80 @@ class NowCast(AbstractCalculator):
         if stats.maxtime is None:
             stats.max = None
 
-        return stats, start_vec, stop_vec, aqi_vec
+    @staticmethod
+    def _update_stats(stats, timestamp, aqi):
+        # The values are processed from the newest to the oldest.
+        stats.not_null = True
+        stats.count += 1
+        stats.sum += aqi
+        stats.first = aqi
+        stats.firsttime = timestamp
+        if stats.last is None:
+            stats.last = aqi
+            stats.lasttime = timestamp
+        if aqi <= stats.min:
+            stats.min = aqi
+            stats.mintime = timestamp
+        if aqi >= stats.max:
+            stats.max = aqi
+            stats.maxtime = timestamp
+
+class NowCastWindow():
+    """
+    The hourly concentrations used to calculate a NowCast value, ordered from the newest hour to the oldest.
+    Hours are appended at the oldest end and removed from the newest end.
+    The minimum and maximum concentrations are tracked with monotonic deques,
+    so that all operations are amortized O(1).
+    """
+    def __init__(self):
+        self.timestamps = collections.deque()
+        self.concentrations = collections.deque()
+        # (position, concentration) pairs. The first entry is the current minimum/maximum.
+        self._min_candidates = collections.deque()
+        self._max_candidates = collections.deque()
+        self._first_position = 0
+        self._next_position = 0
+
+    def __len__(self):
+        return len(self.timestamps)
+
+    @property
+    def min_concentration(self):
+        """ The minimum concentration in the window, ignoring None values. """
+        if self._min_candidates:
+            return self._min_candidates[0][1]
+        return float('inf')
+
+    @property
+    def max_concentration(self):
+        """ The maximum concentration in the window, ignoring None values. """
+        if self._max_candidates:
+            return self._max_candidates[0][1]
+        return -float('inf')
+
+    def append(self, timestamp, concentration):
+        """ Add an hour that is older than all of the hours in the window. """
+        if concentration is not None:
+            while self._min_candidates and self._min_candidates[-1][1] >= concentration:
+                self._min_candidates.pop()
+            self._min_candidates.append((self._next_position, concentration))
+            while self._max_candidates and self._max_candidates[-1][1] <= concentration:
+                self._max_candidates.pop()
+            self._max_candidates.append((self._next_position, concentration))
+
+        self.timestamps.append(timestamp)
+        self.concentrations.append(concentration)
+        self._next_position += 1
+
+    def popleft(self):
+        """ Remove the newest hour in the window. """
+        if self._min_candidates and self._min_candidates[0][0] == self._first_position:
+            self._min_candidates.popleft()
+        if self._max_candidates and self._max_candidates[0][0] == self._first_position:
+            self._max_candidates.popleft()
+        self._first_position += 1
+
+        return self.timestamps.popleft(), self.concentrations.popleft()
 
 class EPAAQI(AbstractCalculator):
     """
@@ -474,6 +2379,8 @@ class EPAAQI(AbstractCalculator):
     readings = {
         'pm2_5': {
             'prep_data': lambda x: math.trunc(x * 10) / 10,
+            # prep_data truncates to a resolution of 1/prep_scale
+            'prep_scale': 10,
             'breakpoints': [
                 {'min': 0.0, 'max': 9.0},
                 {'min': 9.1, 'max': 35.4},
@@ -485,6 +2392,7 @@ class EPAAQI(AbstractCalculator):
         },
         'pm10': {
             'prep_data': lambda x: math.trunc(x), # pylint: disable=unnecessary-lambda
+            'prep_scale': 1,
             'breakpoints': [
                 {'min': 0.0, 'max': 54},
                 {'min': 55, 'max': 154},
@@ -496,9 +2404,20 @@ class EPAAQI(AbstractCalculator):
         }
     }
 
+    # The compiled lookup tables, keyed by the class name and the type of reading.
+    lookup_tables_cache = {}
+
+    # The aggregates that 'calculate_stats' calculates.
+    stats_aggregates = ('avg', 'sum', 'count', 'not_null',
+                        'min', 'mintime', 'max', 'maxtime', 'first', 'firsttime', 'last', 'lasttime')
+    # The aggregates whose query reads every record of the timespan.
+    scan_aggregates = ('avg', 'sum', 'count', 'not_null')
+
     def __init__(self, logger, log_level, sub_calculator, sub_field_name): # Need to match signature pylint: disable=unused-argument
         self.logger = logger
         self.log_level = log_level
+        self.breakpoint_arrays = {}
+        self.lookup_tables = {}
 
     def  _logdbg(self, msg):
         if self.log_level <= 10:
@@ -525,6 +2444,14 @@ class EPAAQI(AbstractCalculator):
         '''
 
         reading = inputs
+        if aqi_type in self.lookup_tables and reading is not None:
+            prep_scale, lookup_table, _lookup_array = self.lookup_tables[aqi_type]
+            index = math.trunc(reading * prep_scale)
+            if 0 <= index < len(lookup_table):
+                return lookup_table[index]
+            # Outside of the breakpoint range, so calculate it from the truncated reading.
+            reading = self.readings[aqi_type]['prep_data'](reading)
+
         try:
             self._logdbg(f"The input value is {reading}.")
             self._logdbg(f"The type is '{aqi_type}'")
@@ -566,6 +2493,153 @@ class EPAAQI(AbstractCalculator):
             self._logerr(error_message)
             raise CalculationError(error_message) from exception
 
+    def calculate_many(self, aqi_type, inputs):
+        '''
+        Calculate the AQI for each of the concentrations in inputs.
+        A concentration of None (or NaN) results in an AQI of None.
+        When numpy is installed the calculation is vectorized,
+        otherwise each concentration is passed to 'calculate'.
+        The results are the same as calling 'calculate' for each concentration.
+        '''
+        if numpy is None:
+            aqi_values = []
+            for reading in inputs:
+                if reading is None or math.isnan(reading):
+                    aqi_values.append(None)
+                    continue
+                try:
+                    aqi_values.append(self.calculate(aqi_type, reading))
+                except weewx.CannotCalculate:
+                    aqi_values.append(None)
+            return aqi_values
+
+        self._logdbg(f"Calculating {aqi_type} for a batch of readings.")
+
+        readings = numpy.asarray(inputs, dtype=float)
+        valid = ~numpy.isnan(readings)
+
+        if aqi_type in self.lookup_tables:
+            prep_scale, _lookup_table, lookup_array = self.lookup_tables[aqi_type]
+            indices = numpy.trunc(readings * prep_scale)
+            in_table = valid & (indices >= 0) & (indices < len(lookup_array))
+            table_values = lookup_array[numpy.where(in_table, indices, 0).astype(int)]
+            # Readings outside of the breakpoint range are calculated from the truncated reading.
+            aqi_values = numpy.where(in_table, table_values, self._interpolate(aqi_type, indices / prep_scale))
+        else:
+            aqi_values = self._interpolate(aqi_type, readings)
+
+        return [int(aqi) if is_valid else None for aqi, is_valid in zip(aqi_values.tolist(), valid.tolist())]
+
+    def calculate_stats(self, aqi_type, timestamps, concentrations):
+        '''
+        Calculate all of the aggregates of the concentrations, ordered from oldest to newest, in one pass.
+        The results are the same as the aggregate queries.
+        'min', 'max', 'first' and 'last' are the AQI of that concentration, at the earliest time of the concentration.
+        'avg' and 'sum' are of the AQI of each concentration.
+        '''
+        stats = types.SimpleNamespace(**{aggregate_type: None for aggregate_type in self.stats_aggregates})
+        stats.count = len(concentrations)
+        if not concentrations:
+            return stats
+
+        stats.not_null = 1
+        indices = range(len(concentrations))
+        # 'min' and 'max' return the first of equal values, the earliest.
+        for aggregate_type, index in (('min', min(indices, key=concentrations.__getitem__)),
+                                      ('max', max(indices, key=concentrations.__getitem__)),
+                                      ('first', 0),
+                                      ('last', -1)):
+            try:
+                setattr(stats, aggregate_type, self.calculate(aqi_type, concentrations[index]))
+            except weewx.CannotCalculate:
+                pass
+            setattr(stats, f'{aggregate_type}time', timestamps[index])
+
+        aqi_values = [aqi for aqi in self.calculate_many(aqi_type, concentrations) if aqi is not None]
+        if aqi_values:
+            stats.sum = sum(aqi_values)
+            stats.avg = round(stats.sum / len(aqi_values))
+
+        return stats
+
+    def _interpolate(self, aqi_type, readings):
+        reading_bp_min, reading_bp_max, aqi_bp_min, aqi_bp_max = self._get_breakpoint_arrays(aqi_type)
+
+        # Same as 'calculate', the breakpoint is the first one whose max is greater than the reading.
+        # And readings above the last breakpoint use the last breakpoint.
+        index = numpy.minimum(numpy.searchsorted(reading_bp_max, readings, side='right'), len(reading_bp_max) - 1)
+
+        # The order of the operations matches 'calculate', so the results are identical.
+        # numpy.rint rounds half to even, the same as python's round.
+        return numpy.rint((aqi_bp_max[index] - aqi_bp_min[index])/(reading_bp_max[index] - reading_bp_min[index]) \
+                          * (readings - reading_bp_min[index]) + aqi_bp_min[index])
+
+    def compile(self, aqi_type):
+        '''
+        Build a lookup table of the AQI for every truncated concentration in the breakpoint range.
+        After this, concentrations of this type are truncated with 'prep_data' before the AQI is calculated.
+        This makes each calculation a truncation and an index into the table.
+        The tables are shared by all calculators of the same class.
+        '''
+        cache_key = (type(self).__name__, aqi_type)
+        if cache_key not in self.lookup_tables_cache:
+            prep_scale = self.readings[aqi_type]['prep_scale']
+            table_size = math.trunc(self.readings[aqi_type]['breakpoints'][-1]['max'] * prep_scale) + 1
+            # index / prep_scale is the same value as prep_data returns for that index.
+            lookup_table = self.calculate_many(aqi_type, [index / prep_scale for index in range(table_size)])
+            lookup_array = None
+            if numpy is not None:
+                lookup_array = numpy.array(lookup_table, dtype=float)
+            self.lookup_tables_cache[cache_key] = (prep_scale, lookup_table, lookup_array)
+            self._loginf(f"Compiled a {table_size} entry lookup table for '{aqi_type}'.")
+
+        self.lookup_tables[aqi_type] = self.lookup_tables_cache[cache_key]
+
+    def get_sql_expression(self, aqi_type, column, truncate='CAST({value} AS INTEGER)', remainder='({dividend} % {divisor})'):
+        '''
+        Build a SQL expression that calculates the AQI of the concentration in 'column'.
+        'truncate' is the SQL, of the database being used, that truncates {value} toward zero.
+        'remainder' is its SQL for the remainder of {dividend} divided by {divisor}.
+        The results are the same as 'calculate'. SQL's ROUND is not used, because it rounds half away from zero
+        (and SQLite rounds values just below a half up). Instead, the value is rounded half to even, the same as python's round.
+        '''
+        readings = self.readings[aqi_type]
+        reading = column
+        if aqi_type in self.lookup_tables:
+            # Same as the lookup table, the AQI of the truncated concentration.
+            prep_scale = readings['prep_scale']
+            reading = f"({truncate.format(value=f'{column} * {prep_scale}')} / {float(prep_scale)!r})"
+
+        # The breakpoint is the first one whose max is greater than the reading,
+        # readings above the last breakpoint use the last breakpoint.
+        aqi_values = []
+        for reading_bp, aqi_bp in zip(readings['breakpoints'], self.aqi_bp):
+            slope = (aqi_bp['max'] - aqi_bp['min'])/(reading_bp['max'] - reading_bp['min'])
+            aqi_values.append((reading_bp['max'], f"{slope!r} * ({reading} - {float(reading_bp['min'])!r}) + {aqi_bp['min']}"))
+        aqi = 'CASE ' + ' '.join(f"WHEN {reading} < {float(bp_max)!r} THEN {value}" for bp_max, value in aqi_values[:-1])
+        aqi += f" ELSE {aqi_values[-1][1]} END"
+
+        # The whole part, and the fraction (which subtracting the whole part calculates exactly).
+        whole = truncate.format(value=f'({aqi})')
+        fraction = f"(({aqi}) - {whole})"
+        # 1 when the whole part is odd.
+        remainder = f"ABS({remainder.format(dividend=whole, divisor=2)})"
+        return f"(CASE WHEN {fraction} > 0.5 THEN {whole} + 1 WHEN {fraction} < -0.5 THEN {whole} - 1 " \
+               f"WHEN {fraction} = 0.5 THEN {whole} + {remainder} WHEN {fraction} = -0.5 THEN {whole} - {remainder} " \
+               f"ELSE {whole} END)"
+
+    def _get_breakpoint_arrays(self, aqi_type):
+        if aqi_type not in self.breakpoint_arrays:
+            breakpoints = self.readings[aqi_type]['breakpoints']
+            self.breakpoint_arrays[aqi_type] = (
+                numpy.array([reading_bp['min'] for reading_bp in breakpoints], dtype=float),
+                numpy.array([reading_bp['max'] for reading_bp in breakpoints], dtype=float),
+                numpy.array([aqi_bp['min'] for aqi_bp in self.aqi_bp[:len(breakpoints)]], dtype=float),
+                numpy.array([aqi_bp['max'] for aqi_bp in self.aqi_bp[:len(breakpoints)]], dtype=float),
+            )
+
+        return self.breakpoint_arrays[aqi_type]
+
 class EPAAQIDeprecatedV0(EPAAQI):
     """
     Class for calculating the EPA'S AQI.
@@ -587,6 +2661,8 @@ class EPAAQIDeprecatedV0(EPAAQI):
     readings = {
         'pm2_5': {
             'prep_data': lambda x: math.trunc(x * 10) / 10,
+            # prep_data truncates to a resolution of 1/prep_scale
+            'prep_scale': 10,
             'breakpoints': [
                 {'min': 0.0, 'max': 12.0},
                 {'min': 12.1, 'max': 35.4},
@@ -599,6 +2675,7 @@ class EPAAQIDeprecatedV0(EPAAQI):
         },
         'pm10': {
             'prep_data': lambda x: math.trunc(x), # pylint: disable=unnecessary-lambda
+            'prep_scale': 1,
             'breakpoints': [
                 {'min': 0.0, 'max': 54},
                 {'min': 55, 'max': 154},
@@ -617,13 +2694,50 @@ class AQIType(weewx.xtypes.XType):
     the pm2_5 value.
     """
 
-    def __init__(self, logger, sql_executor, config_dict):
+    # The aggregates that the daily summaries can answer, because the AQI increases with the concentration.
+    # And the daily summary aggregate used.
+    daily_summary_aggregates = {
+        'min': 'min',
+        'mintime': 'min',
+        'max': 'max',
+        'maxtime': 'max',
+        'count': 'count',
+        'not_null': 'count',
+    }
+
+    def __init__(self, logger, sql_executor, config_dict, hourly_buffer=None, metrics=None, profiler=None, tracer=None):
         self.logger = logger
         self.sql_executor = sql_executor
+        self.hourly_buffer = hourly_buffer
+        self.metrics = metrics
+        self.profiler = profiler
+        self.tracer = tracer
         self.aqi_fields = {}
         for field in config_dict.sections:
             self.aqi_fields[field] = config_dict[field]
         default_log_level = config_dict.get('log_level', 20)
+        self.sql_executor.set_inputs(field_option['input'] for field_option in self.aqi_fields.values())
+        self.store_nowcast = to_bool(config_dict.get('store_nowcast', False))
+        self.result_memo = None
+        memoized_results = to_int(config_dict.get('memoized_results', 256))
+        if memoized_results > 0:
+            self.result_memo = ResultMemo(memoized_results, tracer=tracer)
+        self.interval_cache = None
+        cached_intervals = to_int(config_dict.get('cached_intervals', 8192))
+        if cached_intervals > 0:
+            self.interval_cache = IntervalCache(cached_intervals, tracer=tracer)
+        # 'True' calculates EPAAQI averages and sums in the database with a SQLite function, or a SQL expression for other databases.
+        # 'expression' always uses the SQL expression.
+        pushdown = str(config_dict.get('pushdown', False)).lower()
+        if pushdown == 'expression':
+            self.pushdown = 'expression'
+        elif to_bool(pushdown):
+            self.pushdown = 'function'
+        else:
+            self.pushdown = None
+        # 'True' answers the EPAAQI min, max and count aggregates of whole days from the WeeWX daily summaries of the input.
+        # With loop_hilo, the WeeWX default, their min and max include the loop packets, so they are not the archive's.
+        self.weewx_daily_summaries = to_bool(config_dict.get('weewx_daily_summaries', False))
 
         for field, field_option in self.aqi_fields.items():
             sub_calculator = None
@@ -651,6 +2765,42 @@ class AQIType(weewx.xtypes.XType):
             field_option['calculator']  = \
                   getattr(sys.modules[__name__], field_option['algorithm'])(self.logger, log_level, sub_calculator, sub_field_name)
 
+            if to_bool(field_option.get('compiled', False)):
+                if sub_calculator:
+                    sub_calculator.compile(field_option['type'])
+                else:
+                    field_option['calculator'].compile(field_option['type'])
+
+            field_option['version'] = self._get_version(field_option, sub_calculator or field_option['calculator'])
+
+    @staticmethod
+    def _get_version(field_option, epa_calculator):
+        ''' A hash of the algorithm and its breakpoints, so that kept values of a different calculation are not used. '''
+        version = (field_option['algorithm'],
+                   field_option['type'],
+                   to_bool(field_option.get('compiled', False)),
+                   epa_calculator.readings[field_option['type']]['breakpoints'],
+                   epa_calculator.aqi_bp)
+        return hashlib.sha1(json.dumps(version, sort_keys=True).encode('utf-8')).hexdigest()[:16]
+
+    def _measure(self, obs_type, method, aggregate_type=None, **attributes):
+        if not self.metrics and not self.profiler and not self.tracer:
+            return contextlib.nullcontext()
+
+        measure = contextlib.ExitStack()
+        if self.tracer:
+            measure.enter_context(self.tracer.span(f'AQIType.{method}', obs_type=obs_type, aggregate_type=aggregate_type, **attributes))
+        if self.metrics:
+            measure.enter_context(self.metrics.measure(obs_type, method, aggregate_type))
+        if self.profiler:
+            measure.enter_context(self.profiler.profile(obs_type, method, aggregate_type))
+        return measure
+
+    def _trace(self, name, **attributes):
+        if self.tracer:
+            return self.tracer.span(name, **attributes)
+        return contextlib.nullcontext()
+
     def _logdbg(self, msg):
         self.logger.logdbg(f"(XTYPE) {msg}")
 
@@ -673,11 +2823,14 @@ class AQIType(weewx.xtypes.XType):
         if record[dependent_field] is None:
             raise weewx.CannotCalculate(obs_type)
 
-        start_timestamp = time.time()
-        aqi = self.aqi_fields[obs_type]['get_scalar'](obs_type, db_manager, record['dateTime'], record[dependent_field])
-        end_timestamp = time.time()
-        running_timestamp = end_timestamp - start_timestamp
-        #self._loginf(f"(performance) {running_timestamp:0.10f} scalar for {obs_type}")
+        with self._measure(obs_type, 'get_scalar', dateTime=record['dateTime']):
+            # The NowCast of a loop packet also depends on the loop packets before it, so only archive records are remembered.
+            if self.result_memo and 'interval' in record:
+                aqi = self.result_memo.get(self.result_memo.get_key(db_manager, 'scalar', obs_type, record['dateTime'], record[dependent_field]),
+                                           self.aqi_fields[obs_type]['get_scalar'],
+                                           obs_type, db_manager, record['dateTime'], record[dependent_field], record)
+            else:
+                aqi = self.aqi_fields[obs_type]['get_scalar'](obs_type, db_manager, record['dateTime'], record[dependent_field], record)
 
         unit_type, group = weewx.units.getStandardUnitType(record['usUnits'], obs_type)
         return weewx.units.ValueTuple(aqi, unit_type, group)
@@ -687,11 +2840,15 @@ class AQIType(weewx.xtypes.XType):
         if obs_type not in self.aqi_fields:
             raise weewx.UnknownType(obs_type)
 
-        start_timestamp = time.time()
-        return_value = self.aqi_fields[obs_type]['get_series'](obs_type, timespan, db_manager, aggregate_type, aggregate_interval, **option_dict)
-        end_timestamp = time.time()
-        running_timestamp = end_timestamp - start_timestamp
-        #self._loginf(f"(performance) {running_timestamp:0.10f} series {aggregate_type} {aggregate_interval} for {obs_type} {timespan}")
+        with self._measure(obs_type, 'get_series', aggregate_type, timespan=timespan, aggregate_interval=aggregate_interval):
+            if self.result_memo:
+                return_value = self.result_memo.get(self.result_memo.get_key(db_manager, 'series', obs_type, timespan,
+                                                                             aggregate_type, aggregate_interval,
+                                                                             tuple(sorted(option_dict.items()))),
+                                                    self.aqi_fields[obs_type]['get_series'],
+                                                    obs_type, timespan, db_manager, aggregate_type, aggregate_interval, **option_dict)
+            else:
+                return_value = self.aqi_fields[obs_type]['get_series'](obs_type, timespan, db_manager, aggregate_type, aggregate_interval, **option_dict)
 
         return return_value
 
@@ -700,15 +2857,38 @@ class AQIType(weewx.xtypes.XType):
         if obs_type not in self.aqi_fields:
             raise weewx.UnknownType(obs_type)
 
-        start_timestamp = time.time()
-        return_value = self.aqi_fields[obs_type]['get_aggregate'](obs_type, timespan, aggregate_type, db_manager, **option_dict)
-        end_timestamp = time.time()
-        running_timestamp = end_timestamp - start_timestamp
-        #self._loginf(f"(performance) {running_timestamp:0.10f} aggregate {aggregate_type} for {obs_type} {timespan}")
+        with self._measure(obs_type, 'get_aggregate', aggregate_type, timespan=timespan):
+            # The aggregate of a closed interval does not change, so it is kept from one report cycle to the next.
+            if self.interval_cache and self.interval_cache.is_closed(db_manager, self._get_data_stop(obs_type, timespan.stop)):
+                return_value = self.interval_cache.get(db_manager,
+                                                       self.interval_cache.get_key(db_manager, timespan.start, timespan.stop,
+                                                                                   'aggregate', obs_type, self.aqi_fields[obs_type]['version'],
+                                                                                   aggregate_type,
+                                                                                   tuple(sorted(option_dict.items()))),
+                                                       self.aqi_fields[obs_type]['get_aggregate'],
+                                                       obs_type, timespan, aggregate_type, db_manager, **option_dict)
+            elif self.result_memo:
+                return_value = self.result_memo.get(self.result_memo.get_key(db_manager, 'aggregate', obs_type, timespan, aggregate_type,
+                                                                             tuple(sorted(option_dict.items()))),
+                                                    self.aqi_fields[obs_type]['get_aggregate'],
+                                                    obs_type, timespan, aggregate_type, db_manager, **option_dict)
+            else:
+                return_value = self.aqi_fields[obs_type]['get_aggregate'](obs_type, timespan, aggregate_type, db_manager, **option_dict)
 
         return return_value
 
-    def _get_scalar_nowcast(self, obs_type, db_manager, timestamp, _concentration):
+    def _get_data_stop(self, obs_type, stop):
+        '''
+        The end of the data that the aggregate of the interval ending at 'stop' is calculated from.
+        A NowCast reads the whole group of the last hour, but not past the current hour, see '_get_nowcast_hourly'.
+        '''
+        if self.aqi_fields[obs_type]['algorithm'] != 'NowCast':
+            return stop
+        if stop > weeutil.weeutil.startOfInterval(time.time(), 3600):
+            return float('inf')
+        return (stop - 1) // 3600 * 3600 + 3600 + SQLExecutor.archive_interval - 1
+
+    def _get_scalar_nowcast(self, obs_type, db_manager, timestamp, _concentration, record):
         aqi_type = self.aqi_fields[obs_type]['type']
         dependent_field = self.aqi_fields[obs_type]["input"]
 
@@ -719,14 +2899,17 @@ class AQIType(weewx.xtypes.XType):
         stop = timestamp_interval_start + 3600
         start = stop - 43200
 
-        records_iter = self.sql_executor.get_concentration_data_nowcast(db_manager, dependent_field, stop, start)
+        if self.hourly_buffer and self.hourly_buffer.covers(SQLExecutor.get_database_key(db_manager), dependent_field, start):
+            records_iter = self.hourly_buffer.get_concentration_data_nowcast(dependent_field, stop, start, record)
+        else:
+            records_iter = self.sql_executor.get_concentration_data_nowcast(db_manager, dependent_field, stop, start)
         _stats, _start_list, _stop_list, aqi_list = self.aqi_fields[obs_type]['calculator'].calculate(aqi_type, records_iter)
-        if aqi_list[0] is None:
+        if not aqi_list or aqi_list[0] is None:
             raise weewx.CannotCalculate(obs_type)
 
         return aqi_list[0]
 
-    def _get_scalar_epaaqi(self, obs_type, _db_manager, _timestamp, concentration):
+    def _get_scalar_epaaqi(self, obs_type, _db_manager, _timestamp, concentration, _record):
         aqi_type = self.aqi_fields[obs_type]['type']
 
         try:
@@ -752,6 +2935,15 @@ class AQIType(weewx.xtypes.XType):
             stop_list = []
             aqi_list = []
 
+            calculator = self.aqi_fields[obs_type]['calculator']
+            if aggregate_type not in vars(calculator.calculate_stats([], [])):
+                # Because XTypeTable will also try, 'None' is returned.
+                self._logerr(f"Agregate type '{aggregate_type}' is not supported.")
+
+            # Calculate the hourly values of the whole timespan once and aggregate them into the intervals.
+            hour_start_vec, hour_aqi_vec, hours = self._get_nowcast_hourly(obs_type, db_manager, timespan.start, timespan.stop)
+
+            index = 0
             startstamp, stopstamp = timespan
             for stamp in weeutil.weeutil.intervalgen(startstamp, stopstamp, aggregate_interval):
                 if db_manager.first_timestamp is None or stamp.stop <= db_manager.first_timestamp:
@@ -759,29 +2951,26 @@ class AQIType(weewx.xtypes.XType):
                 if db_manager.last_timestamp is None or stamp.start >= db_manager.last_timestamp:
                     break
 
-                try:
-                    agg_vt = self.get_aggregate(obs_type, stamp, aggregate_type, db_manager, **option_dict)
-                except weewx.CannotCalculate:
-                    agg_vt = ValueTuple(None, unit, unit_group)
+                while index < len(hours) and hours[index] < stamp.start:
+                    index += 1
+                first_index = index
+                while index < len(hours) and hours[index] < stamp.stop:
+                    index += 1
 
-                if unit:
-                    if agg_vt[1] is not None and (unit != agg_vt[1] or unit_group != agg_vt[2]):
-                        raise weewx.UnsupportedFeature("Cannot change units within a series.")
+                if stamp.stop - stamp.start < 3600:
+                    aggregate_value = None
                 else:
-                    unit, unit_group = agg_vt[1], agg_vt[2]
+                    stats = calculator.calculate_stats(hour_start_vec[first_index:index], hour_aqi_vec[first_index:index])
+                    aggregate_value = vars(stats).get(aggregate_type)
 
                 start_list.append(stamp.start)
                 stop_list.append(stamp.stop)
-                aqi_list.append(agg_vt[0])
+                aqi_list.append(aggregate_value)
         else:
-            aqi_type = self.aqi_fields[obs_type]['type']
-            dependent_field = self.aqi_fields[obs_type]["input"]
-            stop = min(weeutil.weeutil.startOfInterval(time.time(), 3600), timespan.stop)
-            # 'Need' 11 hours of data after current hour to compute nowcast qai
-            start_time = timespan.start - 43200 + 3600
-            records_iter = self.sql_executor.get_concentration_data_nowcast(db_manager, dependent_field, stop , start_time)
-
-            _stats, start_list, stop_list, aqi_list = self.aqi_fields[obs_type]['calculator'].calculate(aqi_type, records_iter)
+            start_list, aqi_list, _hours = self._get_nowcast_hourly(obs_type, db_manager, timespan.start, timespan.stop)
+            stop_list = start_list[1:]
+            if start_list:
+                stop_list.append(start_list[-1] + 3600)
 
         return (ValueTuple(start_list, 'unix_epoch', 'group_time'),
                 ValueTuple(stop_list, 'unix_epoch', 'group_time'),
@@ -798,33 +2987,28 @@ class AQIType(weewx.xtypes.XType):
         unit_group = None
 
         if aggregate_type:
+            stamps = []
             startstamp, stopstamp = timespan
             for stamp in weeutil.weeutil.intervalgen(startstamp, stopstamp, aggregate_interval):
                 if db_manager.first_timestamp is None or stamp.stop <= db_manager.first_timestamp:
                     continue
                 if db_manager.last_timestamp is None or stamp.start >= db_manager.last_timestamp:
                     break
+                stamps.append(stamp)
 
-                try:
-                    agg_vt = self.get_aggregate(obs_type, stamp, aggregate_type, db_manager, **option_dict)
-                except weewx.CannotCalculate:
-                    agg_vt = ValueTuple(None, unit, unit_group)
-
-                if unit:
-                    if agg_vt[1] is not None and (unit != agg_vt[1] or unit_group != agg_vt[2]):
-                        raise weewx.UnsupportedFeature("Cannot change units within a series.")
-                else:
-                    unit, unit_group = agg_vt[1], agg_vt[2]
-
-                start_vec.append(stamp.start)
-                stop_vec.append(stamp.stop)
-                data_vec.append(agg_vt[0])
+            if self.interval_cache:
+                data_vec = self._get_cached_aggregated_series_epaaqi(obs_type, stamps, db_manager, aggregate_type)
+            else:
+                data_vec = self._get_aggregated_series_epaaqi(obs_type, stamps, db_manager, aggregate_type)
+            start_vec = [stamp.start for stamp in stamps]
+            stop_vec = [stamp.stop for stamp in stamps]
+            unit, unit_group = weewx.units.getStandardUnitType(db_manager.std_unit_system, obs_type, aggregate_type)
         else:
             std_unit_system = None
             records_iter = self.sql_executor.get_concentration_data(dependent_field, timespan, db_manager)
 
+            input_values = []
             for record in records_iter:
-                aqi = None
                 timestamp, unit_system, interval, input_value = record
                 if std_unit_system:
                     if std_unit_system != unit_system:
@@ -832,14 +3016,12 @@ class AQIType(weewx.xtypes.XType):
                 else:
                     std_unit_system = unit_system
 
-                try:
-                    aqi = self.aqi_fields[obs_type]['calculator'].calculate(aqi_type, (input_value))
-                except weewx.CannotCalculate:
-                    aqi = None
-
                 start_vec.append(timestamp - interval * 60)
                 stop_vec.append(timestamp)
-                data_vec.append(aqi)
+                input_values.append(input_value)
+
+            with self._trace('calculate', records=len(input_values)):
+                data_vec = self.aqi_fields[obs_type]['calculator'].calculate_many(aqi_type, input_values)
 
             unit, unit_group = weewx.units.getStandardUnitType(std_unit_system, obs_type, aggregate_type)
 
@@ -847,6 +3029,280 @@ class AQIType(weewx.xtypes.XType):
                 ValueTuple(stop_vec, 'unix_epoch', 'group_time'),
                 ValueTuple(data_vec, unit, unit_group))
 
+    def _calculate_nowcast(self, obs_type, db_manager, start, stop, calculate):
+        '''
+        Calculate the NowCast values of the hours of the records after 'start' up to 'stop'.
+        When they are stored, the stored hours are read from the store. Only the first 12 hours, whose values are
+        missing the data before 'start', and the hours after the stored ones are calculated from the archive.
+        '''
+        aqi_type = self.aqi_fields[obs_type]['type']
+        dependent_field = self.aqi_fields[obs_type]['input']
+        # The records are grouped into the hours ending 'offset' seconds after the hour, see 'sql_concentration_grouped_str'.
+        # The stored hours are those hours, and the queries of the archive end at the end of one.
+        offset = SQLExecutor.archive_interval - 1
+        # The values of the hours ending by then are missing some of the data before 'start'.
+        head_stop = (start - offset + 3599) // 3600 * 3600 + 43200
+        if not self.store_nowcast or head_stop + offset >= stop or db_manager.last_timestamp is None:
+            records_iter = self.sql_executor.get_concentration_data_nowcast(db_manager, dependent_field, stop, start)
+            with self._trace('calculate'):
+                return calculate(aqi_type, records_iter)
+
+        previous_coverage = self.sql_executor.get_nowcast_coverage(db_manager, obs_type)
+        coverage = previous_coverage
+        # The archive can be changed without WeeWX adding the records, for example by 'weectl import' or an edit.
+        # So the stored hours are only used when the archive records they are calculated from have not changed.
+        if coverage and coverage[2] is not None \
+           and tuple(coverage[2:]) != tuple(self._get_nowcast_check(obs_type, db_manager, coverage[0], coverage[1])):
+            self._loginf(f"The archive has changed, the stored NowCast values of {obs_type} are calculated again.")
+            coverage = None
+        # Only the hours that have ended, the last record is at or after their end, are stored.
+        closed_stop = (min(stop, db_manager.last_timestamp) - offset) // 3600 * 3600
+        with self._trace('calculate') as span:
+            results = None
+            if coverage and coverage[0] <= head_stop < coverage[1]:
+                results = self._calculate_nowcast_stored(obs_type, db_manager, start, stop, head_stop, coverage[1], calculate)
+            if results:
+                start_vec, aqi_vec, stored_count, new_results, calculated_start = results
+                new_coverage = (coverage[0], max(coverage[1], closed_stop))
+            else:
+                stored_count = 0
+                _stats, start_vec, _stop_vec, aqi_vec = calculate(
+                    aqi_type, self.sql_executor.get_concentration_data_nowcast(db_manager, dependent_field, stop, start))
+                new_results = list(zip(start_vec, aqi_vec))
+                # The first records only have a value when there are less than 12, so the stored hours start after them.
+                calculated_start = max(head_stop, (start_vec[0] - offset + 3599) // 3600 * 3600) if start_vec else head_stop
+                if coverage and coverage[0] <= closed_stop and coverage[1] >= calculated_start:
+                    new_coverage = (min(coverage[0], calculated_start), max(coverage[1], closed_stop))
+                else:
+                    new_coverage = (calculated_start, closed_stop)
+
+            # The values are keyed by the start of their hour.
+            new_results = [(hour, aqi) for hour, aqi in new_results
+                           if calculated_start + offset - 3600 < hour <= closed_stop + offset - 3600]
+            if span:
+                span['attributes']['stored_results'] = stored_count
+                span['attributes']['new_results'] = len(new_results)
+
+        if new_results:
+            self._logdbg(f"Storing {len(new_results)} NowCast values of {obs_type}.")
+            new_coverage += tuple(self._get_nowcast_check(obs_type, db_manager, *new_coverage))
+            if not self.sql_executor.save_nowcast_results(db_manager, obs_type, new_results, new_coverage, previous_coverage):
+                self._logdbg(f"The stored NowCast values of {obs_type} were changed while calculating, so they are not stored.")
+
+        stop_vec = start_vec[1:]
+        if start_vec:
+            stop_vec.append(start_vec[-1] + 3600)
+        return self.aqi_fields[obs_type]['calculator'].calculate_stats(start_vec, aqi_vec), start_vec, stop_vec, aqi_vec
+
+    def _get_nowcast_check(self, obs_type, db_manager, start, stop):
+        '''
+        The (count, total) of the archive records that the stored hours after 'start' up to 'stop' are calculated from.
+        The 12 hours before them, and up to 'offset' seconds after them, see 'sql_concentration_grouped_str'.
+        '''
+        offset = SQLExecutor.archive_interval - 1
+        args = (db_manager, self.aqi_fields[obs_type]['input'], start - 43200 + offset, stop + offset)
+        if self.result_memo:
+            return self.result_memo.get(self.result_memo.get_key(db_manager, 'nowcast_check', obs_type, start, stop),
+                                        self.sql_executor.get_nowcast_check, *args)
+        return self.sql_executor.get_nowcast_check(*args)
+
+    def _calculate_nowcast_stored(self, obs_type, db_manager, start, stop, head_stop, coverage_stop, calculate):
+        '''
+        Calculate the NowCast values of the first 12 hours and of the hours after the stored ones, and read the others.
+        Returns the start timestamps, the AQI values, the number that were stored, the (hour, aqi) values that were
+        calculated after the stored ones and the end of the stored hours.
+        None when the store cannot be used, because a gap in the data means the results would not be the same.
+        '''
+        aqi_type = self.aqi_fields[obs_type]['type']
+        dependent_field = self.aqi_fields[obs_type]['input']
+        offset = SQLExecutor.archive_interval - 1
+        stored_stop = min((stop - offset) // 3600 * 3600, coverage_stop)
+
+        # As when all of the records are calculated at once, the first 11 records only are the data of the later hours.
+        # So they must be before the stored hours.
+        head_records = list(self.sql_executor.get_concentration_data_nowcast(db_manager, dependent_field, head_stop + offset, start))
+        if len(head_records) < 12:
+            return None
+
+        tail_records = []
+        if stored_stop + offset < stop:
+            # The hours after the stored ones, and the 11 hours before them.
+            tail_records = list(self.sql_executor.get_concentration_data_nowcast(db_manager, dependent_field,
+                                                                                 stop, stored_stop - 43200 + offset))
+            if sum(1 for record in tail_records if record[0] <= stored_stop + offset - 3600) < 11:
+                return None
+
+        _stats, start_vec, _stop_vec, aqi_vec = calculate(aqi_type, head_records)
+        # The values are keyed by the start of their hour.
+        stored_results = self.sql_executor.get_nowcast_results(db_manager, obs_type,
+                                                               head_stop + offset - 3600, stored_stop + offset - 3600)
+        start_vec += [result[0] for result in stored_results]
+        aqi_vec += [result[1] for result in stored_results]
+
+        new_results = []
+        if tail_records:
+            _stats, tail_start_vec, _stop_vec, tail_aqi_vec = calculate(aqi_type, tail_records)
+            new_results = [(hour, aqi) for hour, aqi in zip(tail_start_vec, tail_aqi_vec) if hour > stored_stop + offset - 3600]
+            start_vec += [result[0] for result in new_results]
+            aqi_vec += [result[1] for result in new_results]
+
+        return start_vec, aqi_vec, len(stored_results), new_results, stored_stop
+
+    def _get_cached_aggregated_series_epaaqi(self, obs_type, stamps, db_manager, aggregate_type):
+        '''
+        Get the aggregate of each interval, the closed intervals from the interval cache.
+        Only the intervals from the first one that is not kept are calculated.
+        '''
+        version = self.aqi_fields[obs_type]['version']
+        data_vec = []
+        for stamp in stamps:
+            if not self.interval_cache.is_closed(db_manager, stamp.stop):
+                break
+            found, aggregate_value = self.interval_cache.lookup(
+                self.interval_cache.get_key(db_manager, stamp.start, stamp.stop, 'series', obs_type, version, aggregate_type))
+            if not found:
+                break
+            data_vec.append(aggregate_value)
+
+        new_stamps = stamps[len(data_vec):]
+        if self.tracer:
+            self.tracer.set_attribute('cached_intervals', len(data_vec))
+        new_data_vec = self._get_aggregated_series_epaaqi(obs_type, new_stamps, db_manager, aggregate_type)
+        self.interval_cache.put_many(db_manager,
+                                     [(self.interval_cache.get_key(db_manager, stamp.start, stamp.stop, 'series', obs_type, version, aggregate_type),
+                                       aggregate_value)
+                                      for stamp, aggregate_value in zip(new_stamps, new_data_vec)
+                                      if self.interval_cache.is_closed(db_manager, stamp.stop)])
+
+        return data_vec + new_data_vec
+
+    def _get_aggregated_series_epaaqi(self, obs_type, stamps, db_manager, aggregate_type):
+        ''' Calculate the aggregate of each interval from one query of the records. '''
+        aqi_type = self.aqi_fields[obs_type]['type']
+        dependent_field = self.aqi_fields[obs_type]['input']
+        calculator = self.aqi_fields[obs_type]['calculator']
+
+        if aggregate_type not in SQLExecutor.simple_sql_stmts \
+           and aggregate_type not in SQLExecutor.aggregate_sql_stmts \
+           and aggregate_type not in SQLExecutor.basic_sql_stmts:
+            raise weewx.UnknownAggregation(aggregate_type)
+
+        if not stamps:
+            return []
+
+        if aggregate_type in SQLExecutor.aggregate_sql_stmts:
+            aqi_expression = self._get_aqi_sql_expression(obs_type, db_manager)
+            aggregate_interval = stamps[0].stop - stamps[0].start
+            # The database can only group the records into intervals of the same length.
+            if aqi_expression and all(stamp.stop - stamp.start == aggregate_interval for stamp in stamps):
+                data_vec = [None] * len(stamps)
+                for bucket, aqi_sum, aqi_count in \
+                    self.sql_executor.get_aqi_aggregated_series_data(db_manager,
+                                                                     dependent_field,
+                                                                     aqi_expression,
+                                                                     weeutil.weeutil.TimeSpan(stamps[0].start, stamps[-1].stop),
+                                                                     aggregate_interval):
+                    data_vec[bucket // aggregate_interval] = self._aggregate_aqi_sum(aggregate_type, aqi_sum, aqi_count)
+                return data_vec
+
+        buckets = [types.SimpleNamespace(count=0, aqi_sum=0, aqi_count=0,
+                                         first=None, firsttime=None, last=None, lasttime=None,
+                                         min=None, mintime=None, max=None, maxtime=None)
+                   for _stamp in stamps]
+
+        records_iter = self.sql_executor.get_concentration_data_not_null(dependent_field,
+                                                                         weeutil.weeutil.TimeSpan(stamps[0].start, stamps[-1].stop),
+                                                                         db_manager)
+        with self._trace('calculate', intervals=len(stamps)):
+            index = 0
+            while index < len(stamps):
+                # The AQI of each record is only needed for 'avg' and 'sum'; calculate it a chunk of records at a time.
+                records = list(itertools.islice(records_iter, 1000))
+                if not records:
+                    break
+                if aggregate_type in SQLExecutor.aggregate_sql_stmts:
+                    aqi_values = calculator.calculate_many(aqi_type, [record[1] for record in records])
+                else:
+                    aqi_values = itertools.repeat(None)
+
+                for (timestamp, concentration), aqi in zip(records, aqi_values):
+                    while index < len(stamps) and timestamp > stamps[index].stop:
+                        index += 1
+                    if index == len(stamps):
+                        break
+                    if timestamp <= stamps[index].start:
+                        continue
+
+                    bucket = buckets[index]
+                    bucket.count += 1
+                    if bucket.firsttime is None:
+                        bucket.first = concentration
+                        bucket.firsttime = timestamp
+                    bucket.last = concentration
+                    bucket.lasttime = timestamp
+                    if bucket.min is None or concentration < bucket.min:
+                        bucket.min = concentration
+                        bucket.mintime = timestamp
+                    if bucket.max is None or concentration > bucket.max:
+                        bucket.max = concentration
+                        bucket.maxtime = timestamp
+                    if aqi is not None:
+                        bucket.aqi_sum += aqi
+                        bucket.aqi_count += 1
+
+        data_vec = []
+        for bucket in buckets:
+            if aggregate_type == 'count':
+                data_vec.append(bucket.count)
+            elif aggregate_type == 'not_null':
+                data_vec.append(1 if bucket.count else None)
+            elif aggregate_type in SQLExecutor.simple_sql_stmts:
+                data_vec.append(getattr(bucket, aggregate_type))
+            elif aggregate_type in SQLExecutor.aggregate_sql_stmts:
+                data_vec.append(self._aggregate_aqi_sum(aggregate_type, bucket.aqi_sum, bucket.aqi_count))
+            else:
+                try:
+                    data_vec.append(calculator.calculate(aqi_type, getattr(bucket, aggregate_type)))
+                except weewx.CannotCalculate:
+                    data_vec.append(None)
+
+        return data_vec
+
+    def _get_nowcast_hourly(self, obs_type, db_manager, start, stop):
+        '''
+        Calculate the hourly NowCast values of the hours from 'start', up to the current hour.
+        Returns the start timestamps, the AQI values and the hour that the data of each is grouped into.
+        The start timestamp is earlier than the hour when the last record of the hour is missing.
+        The values are the same as when they are calculated from the first record of the archive.
+        '''
+        stop = min(weeutil.weeutil.startOfInterval(time.time(), 3600), stop)
+        # The records are grouped into the hours ending 'offset' seconds after the hour, see 'sql_concentration_grouped_str'.
+        # The archive is read in whole groups, from the first hour, to the end of the last hour before 'stop'.
+        offset = SQLExecutor.archive_interval - 1
+        first_hour = -(-start // 3600) * 3600
+        query_stop = (stop - 1) // 3600 * 3600 + 3600 + offset
+        # The value of an hour only uses the 12 hours ending with it, but the first 11 hours read have no value.
+        # So, when there are gaps before 'start', more is read, until an hour before 'start' has a value.
+        lookback = 43200
+        while True:
+            query_start = first_hour - lookback + offset
+            _stats, start_vec, _stop_vec, aqi_vec = self._calculate_nowcast(obs_type, db_manager, query_start, query_stop,
+                                                                            self.aqi_fields[obs_type]['calculator'].calculate_series)
+            hours = [HourlyBuffer.get_hour(timestamp + 3600) for timestamp in start_vec]
+            if not hours or hours[0] < start or db_manager.first_timestamp is None:
+                break
+            if query_start < db_manager.first_timestamp:
+                # With less than 12 records, 'calculate' has a value for the newest one.
+                # But it is one of the first 11 records of the archive, which have no value.
+                if len(hours) == 1 and len(list(self.sql_executor.get_concentration_data_nowcast(
+                        db_manager, self.aqi_fields[obs_type]['input'], query_stop, query_start))) < 12:
+                    return [], [], []
+                break
+            lookback *= 2
+
+        first_index = bisect.bisect_left(hours, start)
+        return start_vec[first_index:], aqi_vec[first_index:], hours[first_index:]
+
     def _get_aggregate_nowcast(self, obs_type, timespan, aggregate_type, db_manager, **_option_dict):
         # Because XTypeTable will also try, 'None' is returned.
         if timespan.stop - timespan.start < 3600:
@@ -854,14 +3310,13 @@ class AQIType(weewx.xtypes.XType):
             aggregate_value = None
             #raise weewx.UnknownAggregation
         else:
-            aqi_type = self.aqi_fields[obs_type]['type']
-            dependent_field = self.aqi_fields[obs_type]['input']
-            stop = min(weeutil.weeutil.startOfInterval(time.time(), 3600), timespan.stop)
-            # 'Need' 11 hours of data after current hour to compute nowcast qai
-            start_time = timespan.start - 43200 + 3600
-
-            records_iter = self.sql_executor.get_concentration_data_nowcast(db_manager, dependent_field, stop , start_time)
-            stats, _start_vec, _stop_vec, _data_vec = self.aqi_fields[obs_type]['calculator'].calculate(aqi_type, records_iter)
+            days = self._get_summarized_days(obs_type, timespan, db_manager)
+            if days:
+                stats = self._get_nowcast_stats_daily_summary(obs_type, timespan, days, db_manager)
+            else:
+                # The values of the hours of the timespan, the same as the aggregated series.
+                start_vec, aqi_vec, _hours = self._get_nowcast_hourly(obs_type, db_manager, timespan.start, timespan.stop)
+                stats = self.aqi_fields[obs_type]['calculator'].calculate_stats(start_vec, aqi_vec)
             stats_dict = vars(stats)
             try:
                 aggregate_value = stats_dict[aggregate_type]
@@ -878,19 +3333,46 @@ class AQIType(weewx.xtypes.XType):
         aqi_type = self.aqi_fields[obs_type]['type']
         dependent_field = self.aqi_fields[obs_type]['input']
 
+        if aggregate_type in SQLExecutor.aggregate_sql_stmts:
+            days = self._get_summarized_days(obs_type, timespan, db_manager)
+            if days:
+                aggregate_value = self._get_aggregate_aqi_daily_summary_epaaqi(obs_type, timespan, days, aggregate_type, db_manager)
+                unit_type, group = weewx.units.getStandardUnitType(db_manager.std_unit_system, obs_type, aggregate_type)
+                return weewx.units.ValueTuple(aggregate_value, unit_type, group)
+
+            aqi_expression = self._get_aqi_sql_expression(obs_type, db_manager)
+            if aqi_expression:
+                aqi_sum, aqi_count = self.sql_executor.get_aqi_aggregate_data(db_manager, dependent_field, aqi_expression, timespan)
+                aggregate_value = self._aggregate_aqi_sum(aggregate_type, aqi_sum, aqi_count)
+                unit_type, group = weewx.units.getStandardUnitType(db_manager.std_unit_system, obs_type, aggregate_type)
+                return weewx.units.ValueTuple(aggregate_value, unit_type, group)
+
+        if self.weewx_daily_summaries and aggregate_type in self.daily_summary_aggregates \
+           and isinstance(db_manager, weewx.manager.DaySummaryManager) and dependent_field in (db_manager.daykeys or ()):
+            days = self._get_whole_days(timespan)
+            if days:
+                aggregate_value = self._get_aggregate_daily_summary_epaaqi(obs_type, timespan, days, aggregate_type, db_manager)
+                unit_type, group = weewx.units.getStandardUnitType(db_manager.std_unit_system, obs_type, aggregate_type)
+                return weewx.units.ValueTuple(aggregate_value, unit_type, group)
+
+        # The aggregates of a timespan are usually asked for together, $day.pm2_5_aqi.max, .maxtime, .min and so on.
+        # So, when the results are remembered, they are all calculated from one query.
+        # That query reads every record of the timespan, so it is only used for an aggregate whose own query does,
+        # or for the second aggregate of the timespan. A lone 'first' or 'max' keeps its query of one record.
+        stats_key = self.result_memo.get_key(db_manager, 'stats', obs_type, timespan) if self.result_memo else None
+        if stats_key and aggregate_type in EPAAQI.stats_aggregates \
+           and (aggregate_type in EPAAQI.scan_aggregates or self.result_memo.is_repeated(stats_key)):
+            stats = self.result_memo.get(stats_key, self._get_stats_epaaqi, obs_type, timespan, db_manager)
+            unit_type, group = weewx.units.getStandardUnitType(db_manager.std_unit_system, obs_type, aggregate_type)
+            return weewx.units.ValueTuple(getattr(stats, aggregate_type), unit_type, group)
+
         query_type, records_iter = self.sql_executor.get_aggregate_concentation_data(dependent_field, timespan, aggregate_type, db_manager)
 
         if query_type == 'aggregate':
-            input_values = []
             aggregate_value = None
-            for row in records_iter:
-                try:
-                    input_value = self.aqi_fields[obs_type]['calculator'].calculate(aqi_type, (row[0]))
-                except weewx.CannotCalculate:
-                    input_value = None
-
-                if input_value is not None:
-                    input_values.append(input_value)
+            with self._trace('calculate'):
+                aqi_values = self.aqi_fields[obs_type]['calculator'].calculate_many(aqi_type, [row[0] for row in records_iter])
+            input_values = [aqi for aqi in aqi_values if aqi is not None]
 
             if input_values:
                 aggregate_value = sum(input_values)
@@ -919,6 +3401,270 @@ class AQIType(weewx.xtypes.XType):
         unit_type, group = weewx.units.getStandardUnitType(db_manager.std_unit_system, obs_type, aggregate_type)
         return weewx.units.ValueTuple(aggregate_value, unit_type, group)
 
+    def _get_stats_epaaqi(self, obs_type, timespan, db_manager):
+        ''' All of the aggregates of the field over the timespan, from one query of its concentrations. '''
+        records = list(self.sql_executor.get_concentration_data_not_null(self.aqi_fields[obs_type]['input'], timespan, db_manager))
+        with self._trace('calculate', records=len(records)):
+            return self.aqi_fields[obs_type]['calculator'].calculate_stats(self.aqi_fields[obs_type]['type'],
+                                                                           [record[0] for record in records],
+                                                                           [record[1] for record in records])
+
+    @staticmethod
+    def _aggregate_aqi_sum(aggregate_type, aqi_sum, aqi_count):
+        ''' The 'avg' or 'sum' aggregate from the sum and count of the AQI values. '''
+        if not aqi_count:
+            return None
+        if aggregate_type == 'avg':
+            return round(aqi_sum / aqi_count)
+        # The sum of whole numbers, even when the database sums them as real numbers.
+        return int(aqi_sum)
+
+    def _get_aqi_sql_expression(self, obs_type, db_manager):
+        '''
+        The SQL expression that calculates the AQI of the field in the database.
+        None if the calculation is not pushed down to the database.
+        '''
+        if not self.pushdown:
+            return None
+
+        field_option = self.aqi_fields[obs_type]
+        aqi_type = field_option['type']
+        calculator = field_option['calculator']
+        if self.pushdown == 'function':
+            def aqi_function(concentration):
+                try:
+                    return calculator.calculate(aqi_type, concentration)
+                except weewx.CannotCalculate:
+                    return None
+
+            function_name = f'aqitype_{obs_type}'
+            if self.sql_executor.register_aqi_function(db_manager, function_name, aqi_function):
+                return f"{function_name}({field_option['input']})"
+
+        truncate = SQLExecutor.sql_truncate_strs.get(db_manager.connection.dbtype)
+        remainder = SQLExecutor.sql_remainder_strs.get(db_manager.connection.dbtype)
+        if truncate is None or remainder is None:
+            return None
+        return calculator.get_sql_expression(aqi_type, field_option['input'], truncate, remainder)
+
+    @staticmethod
+    def _get_whole_days(timespan):
+        ''' The whole (local time) days within the timespan, or None if there are none. '''
+        if weeutil.weeutil.isStartOfDay(timespan.start):
+            start = timespan.start
+        else:
+            start = weeutil.weeutil.archiveDaySpan(timespan.start).stop
+        if weeutil.weeutil.isStartOfDay(timespan.stop):
+            stop = timespan.stop
+        else:
+            stop = weeutil.weeutil.archiveDaySpan(timespan.stop).start
+
+        if start >= stop:
+            return None
+        return weeutil.weeutil.TimeSpan(start, stop)
+
+    def _get_aggregate_daily_summary_epaaqi(self, obs_type, timespan, days, aggregate_type, db_manager):
+        ''' Combine the daily summary of the whole days with the archive records of the partial days. '''
+        aqi_type = self.aqi_fields[obs_type]['type']
+        dependent_field = self.aqi_fields[obs_type]['input']
+        partial_days = self._get_partial_days(timespan, days)
+
+        if aggregate_type in ('count', 'not_null'):
+            count = self.sql_executor.get_daily_summary_data(dependent_field, days, 'count', db_manager)[0] or 0
+            for span in partial_days:
+                _query_type, records_iter = self.sql_executor.get_aggregate_concentation_data(dependent_field, span, 'count', db_manager)
+                count += list(records_iter)[0][0]
+            if aggregate_type == 'count':
+                return count
+            return 1 if count else None
+
+        extreme = self.daily_summary_aggregates[aggregate_type]
+        candidates = [self.sql_executor.get_daily_summary_data(dependent_field, days, extreme, db_manager)]
+        for span in partial_days:
+            candidates.append(self.sql_executor.get_extreme_concentration_data(dependent_field, span, extreme, db_manager))
+        candidates = [candidate for candidate in candidates if candidate]
+        if not candidates:
+            return None
+
+        # The earliest time breaks a tie.
+        if extreme == 'min':
+            concentration, timestamp = min(candidates, key=lambda candidate: (candidate[0], candidate[1]))
+        else:
+            concentration, timestamp = min(candidates, key=lambda candidate: (-candidate[0], candidate[1]))
+
+        if aggregate_type in ('mintime', 'maxtime'):
+            return timestamp
+
+        try:
+            return self.aqi_fields[obs_type]['calculator'].calculate(aqi_type, concentration)
+        except weewx.CannotCalculate:
+            return None
+
+    def _get_summarized_days(self, obs_type, timespan, db_manager):
+        ''' The whole days within the timespan that are in the AQI daily summary of the field, or None. '''
+        last_update = self.sql_executor.aqi_daily_summaries.get(SQLExecutor.get_database_key(db_manager), {}).get(obs_type)
+        if last_update is None:
+            return None
+
+        return self._get_whole_days(weeutil.weeutil.TimeSpan(timespan.start, min(timespan.stop, last_update)))
+
+    def _get_partial_days(self, timespan, days):
+        return [span for span in (weeutil.weeutil.TimeSpan(timespan.start, days.start),
+                                  weeutil.weeutil.TimeSpan(days.stop, timespan.stop))
+                if span.start < span.stop]
+
+    def _get_aggregate_aqi_daily_summary_epaaqi(self, obs_type, timespan, days, aggregate_type, db_manager):
+        ''' Combine the AQI daily summary of the whole days with the archive records of the partial days. '''
+        aqi_type = self.aqi_fields[obs_type]['type']
+        dependent_field = self.aqi_fields[obs_type]['input']
+
+        day_summary = AQIDaySummary()
+        for row in self.sql_executor.get_aqi_daily_summary_data(db_manager, obs_type, days):
+            day_summary.merge(AQIDaySummary(row[1:]))
+        for span in self._get_partial_days(timespan, days):
+            _query_type, records_iter = self.sql_executor.get_aggregate_concentation_data(dependent_field, span, 'sum', db_manager)
+            for aqi in self.aqi_fields[obs_type]['calculator'].calculate_many(aqi_type, [row[0] for row in records_iter]):
+                if aqi is not None:
+                    day_summary.sum += aqi
+                    day_summary.count += 1
+
+        return self._aggregate_aqi_sum(aggregate_type, day_summary.sum, day_summary.count)
+
+    def _get_nowcast_stats_daily_summary(self, obs_type, timespan, days, db_manager):
+        ''' Combine the AQI daily summary of the whole days with the hourly values of the partial days. '''
+        calculator = self.aqi_fields[obs_type]['calculator']
+
+        day_summary = AQIDaySummary()
+        for row in self.sql_executor.get_aqi_daily_summary_data(db_manager, obs_type, days):
+            day_summary.merge(AQIDaySummary(row[1:]))
+        for span in self._get_partial_days(timespan, days):
+            start_vec, aqi_vec, hours = self._get_nowcast_hourly(obs_type, db_manager, span.start, span.stop)
+            for timestamp, aqi, hour in zip(start_vec, aqi_vec, hours):
+                if aqi is not None and span.start <= hour < span.stop:
+                    day_summary.add(timestamp, aqi)
+
+        stats = calculator.calculate_stats([], [])
+        if day_summary.count:
+            for name in AQIDaySummary.columns:
+                setattr(stats, name, getattr(day_summary, name))
+            stats.not_null = True
+            stats.avg = day_summary.sum / day_summary.count
+
+        return stats
+
+    def _get_new_aqi_values(self, obs_type, db_manager, last_update, record=None):
+        '''
+        Get the (day, timestamp, aqi) values that are not in the AQI daily summary, and the new last update.
+        For EPAAQI, these are the records after last_update, or the new record.
+        For NowCast, these are the hours from last_update up to the hour of the new record (or of the last record),
+        the earlier hours are complete.
+        '''
+        aqi_type = self.aqi_fields[obs_type]['type']
+        dependent_field = self.aqi_fields[obs_type]['input']
+        calculator = self.aqi_fields[obs_type]['calculator']
+
+        timestamp = record['dateTime'] if record else db_manager.last_timestamp
+        if timestamp is None:
+            return [], last_update
+
+        if self.aqi_fields[obs_type]['algorithm'] == 'NowCast':
+            stop = HourlyBuffer.get_hour(timestamp)
+            if last_update is None:
+                last_update = HourlyBuffer.get_hour(db_manager.first_timestamp)
+            if stop <= last_update:
+                return [], last_update
+
+            start_vec, aqi_vec, hours = self._get_nowcast_hourly(obs_type, db_manager, last_update, stop)
+            return [(weeutil.weeutil.startOfDay(hour), start_timestamp, aqi)
+                    for start_timestamp, aqi, hour in zip(start_vec, aqi_vec, hours)
+                    if aqi is not None and last_update <= hour < stop], stop
+
+        if last_update is None:
+            last_update = 0
+        if timestamp <= last_update:
+            return [], last_update
+
+        if record:
+            records = [(record['dateTime'], record.get(dependent_field))]
+        else:
+            records = list(self.sql_executor.get_concentration_data_not_null(dependent_field,
+                                                                             weeutil.weeutil.TimeSpan(last_update, timestamp),
+                                                                             db_manager))
+        aqi_values = calculator.calculate_many(aqi_type, [record[1] for record in records])
+        return [(weeutil.weeutil.startOfArchiveDay(record[0]), record[0], aqi)
+                for record, aqi in zip(records, aqi_values)
+                if aqi is not None], timestamp
+
+    def update_daily_summary(self, db_manager, obs_type, record=None):
+        ''' Add the values that are not yet in the AQI daily summary of the field. '''
+        database_key = SQLExecutor.get_database_key(db_manager)
+        last_update = self.sql_executor.aqi_daily_summaries.get(database_key, {}).get(obs_type)
+        if last_update is None:
+            last_update = self.sql_executor.get_aqi_daily_summary_last_update(db_manager, obs_type)
+            if last_update is None:
+                self.rebuild_daily_summary(db_manager, obs_type)
+                return
+
+        aqi_values, last_update = self._get_new_aqi_values(obs_type, db_manager, last_update, record)
+        self._save_daily_summary(db_manager, obs_type, aqi_values, last_update)
+
+    def rebuild_daily_summary(self, db_manager, obs_type):
+        ''' Rebuild the AQI daily summary of the field from all of the data. '''
+        self._loginf(f"Rebuilding the daily summary of {obs_type}.")
+        self.sql_executor.create_aqi_daily_summary(db_manager, obs_type)
+        aqi_values, last_update = self._get_new_aqi_values(obs_type, db_manager, None)
+        self._save_daily_summary(db_manager, obs_type, aqi_values, last_update)
+
+    def _save_daily_summary(self, db_manager, obs_type, aqi_values, last_update):
+        day_summaries = {}
+        for day, timestamp, aqi in aqi_values:
+            day_summaries.setdefault(day, AQIDaySummary()).add(timestamp, aqi)
+
+        self.sql_executor.save_aqi_daily_summary(db_manager, obs_type, day_summaries, last_update)
+
+class AQIDaySummary():
+    """
+    The statistics of the AQI values of a day, or of several days when merged.
+    Ties are broken by the earliest time.
+    """
+    columns = ('sum', 'count', 'min', 'mintime', 'max', 'maxtime', 'first', 'firsttime', 'last', 'lasttime')
+
+    def __init__(self, row=None):
+        if row is None:
+            row = (0, 0, None, None, None, None, None, None, None, None)
+        (self.sum, self.count,
+         self.min, self.mintime,
+         self.max, self.maxtime,
+         self.first, self.firsttime,
+         self.last, self.lasttime) = row
+
+    def to_row(self):
+        """ The values, in the order of the columns. """
+        return (self.sum, self.count,
+                self.min, self.mintime,
+                self.max, self.maxtime,
+                self.first, self.firsttime,
+                self.last, self.lasttime)
+
+    def add(self, timestamp, aqi):
+        """ Add an AQI value. """
+        self.merge(AQIDaySummary((aqi, 1, aqi, timestamp, aqi, timestamp, aqi, timestamp, aqi, timestamp)))
+
+    def merge(self, other):
+        """ Add the values of another summary. """
+        if not other.count:
+            return
+        self.sum += other.sum
+        self.count += other.count
+        if self.min is None or (other.min, other.mintime) < (self.min, self.mintime):
+            self.min, self.mintime = other.min, other.mintime
+        if self.max is None or (-other.max, other.maxtime) < (-self.max, self.maxtime):
+            self.max, self.maxtime = other.max, other.maxtime
+        if self.firsttime is None or other.firsttime < self.firsttime:
+            self.first, self.firsttime = other.first, other.firsttime
+        if self.lasttime is None or other.lasttime > self.lasttime:
+            self.last, self.lasttime = other.last, other.lasttime
+
 class AQISearchList(weewx.cheetahgenerator.SearchList):
     """ Implement tags used by templates in the skin. """
     def __init__(self, generator):
@@ -934,6 +3680,8 @@ class AQISearchList(weewx.cheetahgenerator.SearchList):
                                  'loginf': self._loginf,
                                  'logerr': self._logerr,
                                  'version': VERSION,
+                                 # When metrics are not enabled, there are none.
+                                 'AQIMetrics': Metrics.instance or Metrics(),
                                 }
 
         return [search_list_extension]
@@ -973,3 +3721,58 @@ class AQISearchList(weewx.cheetahgenerator.SearchList):
             index =  len(breakpoints) - 1
 
         return index
+
+def main():
+    '''
+    Report the plans and timings of the statements that query the AQI inputs, and create or drop their indexes.
+    Or summarize the profiles of the AQI calls, or rebuild the AQI daily summaries.
+    '''
+    import argparse  # pylint: disable=import-outside-toplevel
+    import weecfg  # pylint: disable=import-outside-toplevel
+
+    parser = argparse.ArgumentParser(description=main.__doc__)
+    parser.add_argument('--profiles', metavar='DIRECTORY',
+                        help="Summarize the profiles in the directory, by field and aggregate type (see 'profile_directory').")
+    parser.add_argument('--top', type=int, default=0, help='With --profiles, also list this many of the slowest functions.')
+    parser.add_argument('--config', help='The WeeWX configuration file.')
+    parser.add_argument('--binding', default=None,
+                        help="The data binding, the default is the [aqitype] 'data_binding' or 'wx_binding'.")
+    parser.add_argument('--days', type=int, default=365, help='The number of days, up to the last record, to query.')
+    parser.add_argument('--create-indexes', action='store_true', help='Create the indexes and report the statements again.')
+    parser.add_argument('--drop-indexes', action='store_true', help='Drop the indexes.')
+    parser.add_argument('--rebuild-daily-summary', action='store_true',
+                        help="Rebuild the AQI daily summaries (see 'daily_summaries'), after the archive is changed.")
+    options = parser.parse_args()
+
+    if options.profiles:
+        print('\n'.join(Profiler.summarize(options.profiles, options.top)))
+        return
+
+    _config_path, config_dict = weecfg.read_config(options.config)
+    aqitype_dict = config_dict.get('aqitype', {})
+    binding = options.binding or aqitype_dict.get('data_binding', 'wx_binding')
+    dependent_fields = sorted({aqitype_dict[field]['input'] for field in aqitype_dict.sections})
+
+    if options.rebuild_daily_summary:
+        logger = Logger()
+        aqi_type = AQIType(logger, SQLExecutor(logger), aqitype_dict)
+        with weewx.manager.open_manager_with_config(config_dict, binding) as db_manager:
+            for obs_type in aqi_type.aqi_fields:
+                aqi_type.rebuild_daily_summary(db_manager, obs_type)
+                print(f"Rebuilt the daily summary of '{obs_type}'.")
+        return
+
+    advisor = IndexAdvisor(SQLExecutor(Logger()))
+    with weewx.manager.open_manager_with_config(config_dict, binding) as db_manager:
+        for dependent_field in dependent_fields:
+            if options.drop_indexes:
+                advisor.drop_index(db_manager, dependent_field)
+                print(f"Dropped the index of '{dependent_field}'.")
+                continue
+            stop = db_manager.last_timestamp or time.time()
+            timespan = weeutil.weeutil.TimeSpan(int(stop - options.days * 86400), int(stop))
+            had_index, results = advisor.advise(db_manager, dependent_field, timespan, options.create_indexes)
+            print('\n'.join(advisor.format_report(db_manager, dependent_field, had_index, results)))
+
+if __name__ == '__main__':
+    main()
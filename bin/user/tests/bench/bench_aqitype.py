@@ -0,0 +1,322 @@
+#
+#    Copyright (c) 2025 Rich Bell <bellrichm@gmail.com>
+#
+#    See the file LICENSE.txt for your full rights.
+#
+
+'''
+Micro-benchmarks of the calculators, the search list and the SQLExecutor statements.
+The SQL benchmarks run against generated databases of 'days' of data, see utils.database.get_scaled_db_manager.
+The results can be saved as JSON and compared with the results of an earlier run.
+'''
+
+# pylint: disable=wrong-import-order
+
+import argparse
+import configobj
+import datetime
+import json
+import os
+import platform
+import statistics
+import sys
+import timeit
+import types
+
+import weeutil.weeutil
+import weewx
+
+import user.aqitype
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+# pylint: disable=import-error, wrong-import-position
+from utils import data
+import utils.database
+# pylint: enable=import-error, wrong-import-position
+
+INPUT_FIELD = 'pm2_5'
+EPAAQI_FIELD = 'pm2_5_aqi'
+NOWCAST_FIELD = 'pm2_5_aqi_nowcast'
+
+# The benchmarks, (name, whether it runs against each database, setup function).
+# The setup function returns the function that is timed.
+benchmarks = []
+
+def benchmark(name, sized=False):
+    ''' Add a benchmark. '''
+    def decorator(function):
+        benchmarks.append((name, sized, function))
+        return function
+    return decorator
+
+def get_concentrations():
+    ''' The concentrations of the test data, scaled to cover all of the AQI categories. '''
+    values = data.db_20250219_pm2_5_values + data.db_20250220_pm2_5_values + data.db_20250221_pm2_5_values
+    return [value * factor for factor in (1, 10, 100) for value in values]
+
+@benchmark('EPAAQI.calculate')
+def bench_epaaqi_calculate(context):
+    concentrations = get_concentrations()
+    calculator = context.epaaqi
+    return lambda: [calculator.calculate('pm2_5', concentration) for concentration in concentrations]
+
+@benchmark('EPAAQI.calculate (compiled)')
+def bench_epaaqi_calculate_compiled(context):
+    concentrations = get_concentrations()
+    calculator = user.aqitype.EPAAQI(context.logger, 20, None, None)
+    calculator.compile('pm2_5')
+    return lambda: [calculator.calculate('pm2_5', concentration) for concentration in concentrations]
+
+@benchmark('EPAAQI.calculate_many')
+def bench_epaaqi_calculate_many(context):
+    concentrations = get_concentrations()
+    return lambda: context.epaaqi.calculate_many('pm2_5', concentrations)
+
+@benchmark('EPAAQI.calculate_stats')
+def bench_epaaqi_calculate_stats(context):
+    concentrations = get_concentrations()
+    timestamps = list(range(0, len(concentrations) * 300, 300))
+    return lambda: context.epaaqi.calculate_stats('pm2_5', timestamps, concentrations)
+
+@benchmark('NowCast.calculate_concentration')
+def bench_nowcast_calculate_concentration(context):
+    current_hour = utils.database.timespan.stop
+    timestamps = [current_hour - hour * 3600 for hour in range(12)]
+    concentrations = get_concentrations()[:12]
+    return lambda: context.nowcast.calculate_concentration(current_hour, min(concentrations), max(concentrations), timestamps, concentrations)
+
+@benchmark('AQISearchList.get_aqi_color')
+def bench_get_aqi_color(context):
+    return lambda: [context.search_list.get_aqi_color(value, 'EPAAQI') for value in range(501)]
+
+@benchmark('AQISearchList.get_aqi_description')
+def bench_get_aqi_description(context):
+    return lambda: [context.search_list.get_aqi_description(value, 'EPAAQI') for value in range(501)]
+
+@benchmark('AQISearchList.get_extension_list')
+def bench_get_extension_list(context):
+    return lambda: context.search_list.get_extension_list(None, None)
+
+@benchmark('NowCast.calculate', sized=True)
+def bench_nowcast_calculate(context):
+    records = list(context.sql_executor.get_concentration_data_nowcast(context.db_manager, INPUT_FIELD,
+                                                                       context.timespan.stop, context.timespan.start))
+    return lambda: context.nowcast.calculate('pm2_5', records)
+
+@benchmark('NowCast.calculate_series', sized=True)
+def bench_nowcast_calculate_series(context):
+    records = list(context.sql_executor.get_concentration_data_nowcast(context.db_manager, INPUT_FIELD,
+                                                                       context.timespan.stop, context.timespan.start))
+    return lambda: context.nowcast.calculate_series('pm2_5', records)
+
+@benchmark('SQLExecutor.get_concentration_data', sized=True)
+def bench_get_concentration_data(context):
+    return lambda: list(context.sql_executor.get_concentration_data(INPUT_FIELD, context.timespan, context.db_manager))
+
+@benchmark('SQLExecutor.get_concentration_data_not_null', sized=True)
+def bench_get_concentration_data_not_null(context):
+    return lambda: list(context.sql_executor.get_concentration_data_not_null(INPUT_FIELD, context.timespan, context.db_manager))
+
+@benchmark('SQLExecutor.get_concentration_data_nowcast', sized=True)
+def bench_get_concentration_data_nowcast(context):
+    return lambda: list(context.sql_executor.get_concentration_data_nowcast(context.db_manager, INPUT_FIELD,
+                                                                            context.timespan.stop, context.timespan.start))
+
+@benchmark('SQLExecutor.get_concentration_data_nowcast (hourly)', sized=True)
+def bench_get_concentration_data_nowcast_hourly(context):
+    sql_executor = user.aqitype.SQLExecutor(context.logger)
+    sql_executor.create_hourly_table(context.db_manager)
+    sql_executor.backfill_hourly_concentrations(context.db_manager, INPUT_FIELD)
+    return lambda: list(sql_executor.get_concentration_data_nowcast(context.db_manager, INPUT_FIELD,
+                                                                    context.timespan.stop, context.timespan.start))
+
+@benchmark('SQLExecutor.get_hourly_sums', sized=True)
+def bench_get_hourly_sums(context):
+    return lambda: context.sql_executor.get_hourly_sums(context.db_manager, INPUT_FIELD, context.timespan.start)
+
+def _add_aggregate_benchmarks():
+    for aggregate_type in user.aqitype.SQLExecutor.aggregate_query_stmts:
+        @benchmark(f'SQLExecutor.get_aggregate_concentation_data ({aggregate_type})', sized=True)
+        def bench_get_aggregate_concentation_data(context, aggregate_type=aggregate_type):
+            def run():
+                _query_type, records_iter = context.sql_executor.get_aggregate_concentation_data(INPUT_FIELD, context.timespan,
+                                                                                                 aggregate_type, context.db_manager)
+                return list(records_iter)
+            return run
+
+    for aggregate_type in user.aqitype.SQLExecutor.extreme_sql_stmts:
+        @benchmark(f'SQLExecutor.get_extreme_concentration_data ({aggregate_type})', sized=True)
+        def bench_get_extreme_concentration_data(context, aggregate_type=aggregate_type):
+            return lambda: context.sql_executor.get_extreme_concentration_data(INPUT_FIELD, context.timespan,
+                                                                               aggregate_type, context.db_manager)
+
+    for aggregate_type in user.aqitype.SQLExecutor.daily_summary_sql_stmts:
+        @benchmark(f'SQLExecutor.get_daily_summary_data ({aggregate_type})', sized=True)
+        def bench_get_daily_summary_data(context, aggregate_type=aggregate_type):
+            return lambda: context.sql_executor.get_daily_summary_data(INPUT_FIELD, context.days_timespan,
+                                                                       aggregate_type, context.db_manager)
+
+_add_aggregate_benchmarks()
+
+@benchmark('SQLExecutor.get_aqi_aggregate_data (expression)', sized=True)
+def bench_get_aqi_aggregate_data_expression(context):
+    aqi_expression = context.epaaqi.get_sql_expression('pm2_5', INPUT_FIELD)
+    return lambda: context.sql_executor.get_aqi_aggregate_data(context.db_manager, INPUT_FIELD, aqi_expression, context.timespan)
+
+@benchmark('SQLExecutor.get_aqi_aggregate_data (function)', sized=True)
+def bench_get_aqi_aggregate_data_function(context):
+    def aqi_function(concentration):
+        try:
+            return context.epaaqi.calculate('pm2_5', concentration)
+        except weewx.CannotCalculate:
+            return None
+    user.aqitype.SQLExecutor.register_aqi_function(context.db_manager, 'aqitype_bench', aqi_function)
+    return lambda: context.sql_executor.get_aqi_aggregate_data(context.db_manager, INPUT_FIELD, f'aqitype_bench({INPUT_FIELD})',
+                                                               context.timespan)
+
+@benchmark('SQLExecutor.get_aqi_aggregated_series_data (day)', sized=True)
+def bench_get_aqi_aggregated_series_data(context):
+    aqi_expression = context.epaaqi.get_sql_expression('pm2_5', INPUT_FIELD)
+    return lambda: list(context.sql_executor.get_aqi_aggregated_series_data(context.db_manager, INPUT_FIELD, aqi_expression,
+                                                                            context.timespan, 86400))
+
+@benchmark('SQLExecutor.get_aqi_daily_summary_data', sized=True)
+def bench_get_aqi_daily_summary_data(context):
+    config = configobj.ConfigObj({EPAAQI_FIELD: {'input': INPUT_FIELD, 'algorithm': 'EPAAQI', 'type': 'pm2_5'}})
+    aqi_type = user.aqitype.AQIType(context.logger, user.aqitype.SQLExecutor(context.logger), config)
+    aqi_type.rebuild_daily_summary(context.db_manager, EPAAQI_FIELD)
+    return lambda: list(context.sql_executor.get_aqi_daily_summary_data(context.db_manager, EPAAQI_FIELD, context.days_timespan))
+
+@benchmark('SQLExecutor.get_nowcast_results', sized=True)
+def bench_get_nowcast_results(context):
+    context.sql_executor.save_nowcast_results(context.db_manager, NOWCAST_FIELD,
+                                              [(hour, 51) for hour in range(context.timespan.start, context.timespan.stop, 3600)],
+                                              (context.timespan.start, context.timespan.stop, None, None), None)
+    return lambda: context.sql_executor.get_nowcast_results(context.db_manager, NOWCAST_FIELD,
+                                                            context.timespan.start, context.timespan.stop)
+
+def time_function(function, repeat):
+    ''' Time the function, returning the number of calls of each run and the time per call of each run. '''
+    timer = timeit.Timer(function)
+    number, _time_taken = timer.autorange()
+    return number, [run_time / number for run_time in timer.repeat(repeat, number)]
+
+def get_context(logger, db_manager=None, days=None):
+    ''' What the benchmarks use. '''
+    epaaqi = user.aqitype.EPAAQI(logger, 20, None, None)
+    context = types.SimpleNamespace(
+        logger=logger,
+        epaaqi=epaaqi,
+        nowcast=user.aqitype.NowCast(logger, 20, user.aqitype.EPAAQI(logger, 20, None, None), INPUT_FIELD),
+        search_list=user.aqitype.AQISearchList({}),
+        sql_executor=user.aqitype.SQLExecutor(logger),
+        db_manager=db_manager,
+        timespan=None,
+        days_timespan=None,
+    )
+    if db_manager:
+        context.timespan = weeutil.weeutil.TimeSpan(utils.database.timespan.stop - days * 86400, utils.database.timespan.stop)
+        # The whole days, as the daily summaries have them
+        context.days_timespan = weeutil.weeutil.TimeSpan(weeutil.weeutil.startOfDay(context.timespan.start + 86400),
+                                                         weeutil.weeutil.startOfDay(context.timespan.stop))
+    return context
+
+def run_benchmark(name, setup, context, repeat, days=None, interval=None):
+    ''' Run a benchmark and print its result. '''
+    number, run_times = time_function(setup(context), repeat)
+    result = {
+        'name': name,
+        'days': days,
+        'interval': interval,
+        'number': number,
+        'best': min(run_times),
+        'median': statistics.median(run_times),
+        'mean': statistics.mean(run_times),
+    }
+    print(format_result(result))
+    return result
+
+def format_result(result, baseline=None):
+    ''' A line of the result, and its change from the baseline. '''
+    size = f"{result['days']}d/{result['interval']}m" if result['days'] else ''
+    line = f"{result['name']:<64} {size:>10} {result['best'] * 1000:>12.4f} ms {result['median'] * 1000:>12.4f} ms"
+    if baseline:
+        line += f" {result['best'] / baseline['best']:>8.2f}x"
+    return line
+
+def get_database_name(directory, days, interval, seed):
+    ''' The file of the generated database, or an in memory database. '''
+    if not directory:
+        return ':memory:'
+    os.makedirs(directory, exist_ok=True)
+    return os.path.join(directory, f'aqitype-bench-{days}d-{interval}m-{seed}.sdb')
+
+def run(options):
+    ''' Run the benchmarks that match the filter. '''
+    logger = user.aqitype.Logger()
+    selected = [(name, sized, setup) for name, sized, setup in benchmarks
+                if not options.filter or any(text in name for text in options.filter)]
+
+    results = []
+    context = get_context(logger)
+    for name, _sized, setup in [benchmark for benchmark in selected if not benchmark[1]]:
+        results.append(run_benchmark(name, setup, context, options.repeat))
+
+    sized_benchmarks = [benchmark for benchmark in selected if benchmark[1]]
+    for days in options.days if sized_benchmarks else ():
+        database_name = get_database_name(options.database_directory, days, options.interval, options.seed)
+        print(f"Using {days} days of {options.interval} minute data in '{database_name}'.")
+        db_manager = utils.database.get_scaled_db_manager(INPUT_FIELD, days, options.interval, database_name, options.seed)
+        try:
+            context = get_context(logger, db_manager, days)
+            for name, _sized, setup in sized_benchmarks:
+                results.append(run_benchmark(name, setup, context, options.repeat, days, options.interval))
+        finally:
+            db_manager.close()
+
+    return results
+
+def compare(results, baseline_results):
+    ''' Print the results with the ratio of their time to the time of the same benchmark in the baseline. '''
+    baselines = {(result['name'], result['days'], result['interval']): result for result in baseline_results}
+    for result in results:
+        print(format_result(result, baselines.get((result['name'], result['days'], result['interval']))))
+
+def main():
+    ''' Run the benchmarks. '''
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--days', type=int, nargs='+', default=[1, 30, 365],
+                        help='The days of data of the databases that the SQL benchmarks run against. Default is 1 30 365.')
+    parser.add_argument('--interval', type=int, choices=[1, 5], default=5, help='The minutes between records. Default is 5.')
+    parser.add_argument('--seed', type=int, default=0, help='The seed of the generated data.')
+    parser.add_argument('--repeat', type=int, default=5, help='The number of times each benchmark is timed. Default is 5.')
+    parser.add_argument('--filter', nargs='+', help='Only run the benchmarks with one of these in their name.')
+    parser.add_argument('--database-directory',
+                        help='Keep the generated databases in this directory, so they are only generated once. Default is in memory.')
+    parser.add_argument('--output', help='Save the results to this JSON file.')
+    parser.add_argument('--compare', metavar='JSON', help='Compare the results to the results saved in this JSON file.')
+    options = parser.parse_args()
+
+    results = run(options)
+
+    if options.output:
+        with open(options.output, 'w', encoding='utf-8') as output_file:
+            json.dump({
+                'created': datetime.datetime.now().isoformat(timespec='seconds'),
+                'version': user.aqitype.VERSION,
+                'weewx': weewx.__version__,
+                'python': platform.python_version(),
+                'platform': platform.platform(),
+                'options': {'days': options.days, 'interval': options.interval, 'seed': options.seed, 'repeat': options.repeat},
+                'results': results,
+            }, output_file, indent=2)
+        print(f"Saved the results to '{options.output}'.")
+
+    if options.compare:
+        with open(options.compare, encoding='utf-8') as baseline_file:
+            baseline = json.load(baseline_file)
+        print(f"\nCompared to {baseline['created']} ({baseline['version']}, Python {baseline['python']}):")
+        compare(results, baseline['results'])
+
+if __name__ == '__main__':
+    main()
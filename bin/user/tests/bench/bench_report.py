@@ -0,0 +1,289 @@
+#
+#    Copyright (c) 2025 Rich Bell <bellrichm@gmail.com>
+#
+#    See the file LICENSE.txt for your full rights.
+#
+
+'''
+Time the report cycles of the aqitype skin, its CheetahGenerator and ImageGenerator,
+against a generated archive of 'days' of data in a temporary directory.
+For each generator, it reports the wall time, the peak RSS of the process,
+the number of AQIType calls and the number of SQL statements.
+Each cycle adds the next archive record, as WeeWX would, before running the generators.
+'''
+
+# pylint: disable=wrong-import-order
+
+import argparse
+import configobj
+import contextlib
+import datetime
+import importlib.util
+import json
+import os
+import platform
+import resource
+import shutil
+import sys
+import tempfile
+import time
+
+import weedb.sqlite
+import weeutil.weeutil
+import weewx
+import weewx.cheetahgenerator
+import weewx.imagegenerator
+import weewx.manager
+import weewx.reportengine
+import weewx.station
+
+import user.aqitype
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+# pylint: disable=import-error, wrong-import-position
+import utils.database
+# pylint: enable=import-error, wrong-import-position
+
+REPO_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..', '..', '..'))
+INPUT_FIELD = 'pm2_5'
+ARCHIVE_INTERVAL = 300
+
+GENERATORS = [
+    ('CheetahGenerator', weewx.cheetahgenerator.CheetahGenerator),
+    ('ImageGenerator', weewx.imagegenerator.ImageGenerator),
+]
+
+class Engine():
+    ''' What AQITypeManager uses of the WeeWX engine. '''
+    def __init__(self, config_dict):
+        self.db_binder = weewx.manager.DBBinder(config_dict)
+        self.callbacks = {}
+
+    def bind(self, event_type, callback):
+        ''' Bind the callback to the event. '''
+        self.callbacks.setdefault(event_type, []).append(callback)
+
+    def dispatch_event(self, event):
+        ''' Call the callbacks of the event. '''
+        for callback in self.callbacks.get(event.event_type, []):
+            callback(event)
+
+class StatementCounter():
+    ''' Count the SQL statements run against the SQLite databases. '''
+    def __init__(self):
+        self.count = 0
+
+    @contextlib.contextmanager
+    def counting(self):
+        ''' Count the statements run in the context. '''
+        execute = weedb.sqlite.Cursor.execute
+
+        def counted_execute(cursor, *args, **kwargs):
+            self.count += 1
+            return execute(cursor, *args, **kwargs)
+
+        weedb.sqlite.Cursor.execute = counted_execute
+        try:
+            yield self
+        finally:
+            weedb.sqlite.Cursor.execute = execute
+
+def get_extension_dict():
+    ''' The configuration that the installer adds to weewx.conf. '''
+    spec = importlib.util.spec_from_file_location('aqitype_install', os.path.join(REPO_ROOT, 'install.py'))
+    install = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(install)
+    return install.EXTENSION_DICT
+
+def get_config_dict(weewx_root, aqitype_options):
+    ''' A weewx.conf, with the aqitype skin and the installer's configuration, in the temporary directory. '''
+    config_dict = configobj.ConfigObj({
+        'WEEWX_ROOT': weewx_root,
+        'debug': 0,
+        'Station': {
+            'location': 'Benchmark',
+            'latitude': '42.0',
+            'longitude': '-83.0',
+            'altitude': ['0', 'meter'],
+            'station_type': 'Simulator',
+        },
+        'StdReport': {
+            'SKIN_ROOT': os.path.join(REPO_ROOT, 'skins'),
+            'HTML_ROOT': 'public_html',
+            'AQIReport': {
+                'skin': 'aqitype',
+                'enable': 'true',
+            },
+        },
+        'DataBindings': {
+            'wx_binding': {
+                'database': 'archive_sqlite',
+                'table_name': 'archive',
+                'manager': 'weewx.manager.DaySummaryManager',
+                'schema': 'schemas.wview_extended.schema',
+            },
+        },
+        'Databases': {
+            'archive_sqlite': {
+                'database_name': 'weewx.sdb',
+                'database_type': 'SQLite',
+            },
+        },
+        'DatabaseTypes': {
+            'SQLite': {
+                'driver': 'weedb.sqlite',
+                'SQLITE_ROOT': weewx_root,
+            },
+        },
+    })
+    config_dict.merge(get_extension_dict())
+    # The metrics count the AQIType calls.
+    config_dict['aqitype']['metrics'] = 'true'
+    config_dict['aqitype']['metrics_log_interval'] = '0'
+    for option in aqitype_options:
+        name, _separator, value = option.partition('=')
+        config_dict['aqitype'][name.strip()] = value.strip()
+    return config_dict
+
+def create_archive(weewx_root, days, interval, database_directory):
+    ''' Create the archive, copying the one kept in the database directory when there is one. '''
+    database_name = os.path.join(weewx_root, 'weewx.sdb')
+    if database_directory:
+        os.makedirs(database_directory, exist_ok=True)
+        kept_database_name = os.path.join(database_directory, f'aqitype-report-{days}d-{interval}m.sdb')
+        utils.database.get_scaled_db_manager(INPUT_FIELD, days, interval, kept_database_name).close()
+        shutil.copyfile(kept_database_name, database_name)
+    else:
+        utils.database.get_scaled_db_manager(INPUT_FIELD, days, interval, database_name).close()
+
+def get_totals(metrics):
+    ''' The AQIType calls, and their time querying the archive and rows, so far. '''
+    summary = metrics.get_summary()
+    return (sum(metric.count for metric in summary),
+            sum(metric.sql_time for metric in summary),
+            sum(metric.rows for metric in summary))
+
+def get_peak_rss():
+    ''' The peak resident set size of the process, in MB. '''
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports KB, macOS bytes.
+    return peak_rss / (1024 * 1024) if sys.platform == 'darwin' else peak_rss / 1024
+
+def run_generator(generator_class, config_dict, skin_dict, record, first_run, metrics):
+    ''' Run a generator, returning its measurements. '''
+    counter = StatementCounter()
+    calls, sql_time, rows = get_totals(metrics)
+    start = time.perf_counter()
+    with counter.counting():
+        generator = generator_class(config_dict, skin_dict, record['dateTime'], first_run,
+                                    weewx.station.StationInfo(**config_dict['Station']), record)
+        generator.start()
+    elapsed = time.perf_counter() - start
+    end_calls, end_sql_time, end_rows = get_totals(metrics)
+
+    return {
+        'time': elapsed,
+        'peak_rss_mb': get_peak_rss(),
+        'aqitype_calls': end_calls - calls,
+        'aqitype_sql_time': end_sql_time - sql_time,
+        'aqitype_rows': end_rows - rows,
+        'sql_statements': counter.count,
+    }
+
+def get_next_record(db_manager, interval):
+    ''' The next archive record, with the concentration of the record a day earlier. '''
+    date_time = db_manager.last_timestamp + interval * 60
+    record = db_manager.getRecord(date_time - 86400) or {}
+    return {
+        'dateTime': date_time,
+        'usUnits': utils.database.US_UNITS,
+        'interval': interval,
+        INPUT_FIELD: record.get(INPUT_FIELD),
+    }
+
+def run(options, weewx_root):
+    ''' Run the report cycles. '''
+    print(f"Creating {options.days} days of {options.interval} minute data.")
+    start = time.perf_counter()
+    create_archive(weewx_root, options.days, options.interval, options.database_directory)
+    print(f"Created the archive in {time.perf_counter() - start:.1f} seconds.")
+
+    config_dict = get_config_dict(weewx_root, options.aqitype_option or [])
+    engine = Engine(config_dict)
+    manager = user.aqitype.AQITypeManager(engine, config_dict)
+    html_root = os.path.join(weewx_root, config_dict['StdReport']['HTML_ROOT'])
+    results = []
+    try:
+        skin_dict = weewx.reportengine.build_skin_dict(config_dict, 'AQIReport')
+        db_manager = engine.db_binder.get_manager('wx_binding')
+        for cycle in range(options.cycles):
+            record = get_next_record(db_manager, options.interval)
+            db_manager.addRecord(record)
+            engine.dispatch_event(weewx.Event(weewx.NEW_ARCHIVE_RECORD, record=record, origin='hardware'))
+            if not options.incremental:
+                # Otherwise the images that are up to date are skipped.
+                shutil.rmtree(html_root, ignore_errors=True)
+
+            cycle_result = {'cycle': cycle + 1, 'dateTime': record['dateTime'], 'generators': {}}
+            for name, generator_class in GENERATORS:
+                cycle_result['generators'][name] = run_generator(generator_class, config_dict, skin_dict, record, cycle == 0,
+                                                                 manager.metrics)
+            cycle_result['time'] = sum(result['time'] for result in cycle_result['generators'].values())
+            print_cycle(cycle_result)
+            results.append(cycle_result)
+    finally:
+        manager.shutDown()
+        engine.db_binder.close()
+
+    return results
+
+def print_cycle(cycle_result):
+    ''' Print the measurements of a cycle. '''
+    print(f"Cycle {cycle_result['cycle']} ({weeutil.weeutil.timestamp_to_string(cycle_result['dateTime'])}): "
+          f"{cycle_result['time']:.2f} seconds, {cycle_result['time'] / ARCHIVE_INTERVAL:.1%} of a {ARCHIVE_INTERVAL} second archive interval")
+    print(f"    {'generator':<18} {'time(s)':>9} {'peak RSS(MB)':>13} {'AQI calls':>10} {'AQI SQL(s)':>11} {'AQI rows':>10} {'SQL stmts':>10}")
+    for name, result in cycle_result['generators'].items():
+        print(f"    {name:<18} {result['time']:>9.2f} {result['peak_rss_mb']:>13.1f} {result['aqitype_calls']:>10} "
+              f"{result['aqitype_sql_time']:>11.2f} {result['aqitype_rows']:>10} {result['sql_statements']:>10}")
+
+def main():
+    ''' Run the report benchmark. '''
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--days', type=int, default=730, help='The days of data in the archive. Default is 730.')
+    parser.add_argument('--interval', type=int, choices=[1, 5], default=5, help='The minutes between records. Default is 5.')
+    parser.add_argument('--cycles', type=int, default=3, help='The number of report cycles. Default is 3.')
+    parser.add_argument('--incremental', action='store_true',
+                        help='Keep the generated files between cycles, so that images that are up to date are skipped, as WeeWX does.')
+    parser.add_argument('--aqitype-option', action='append', metavar='NAME=VALUE',
+                        help="Set an [aqitype] option, for example --aqitype-option daily_summaries=true. Can be repeated.")
+    parser.add_argument('--database-directory',
+                        help='Keep the generated archive in this directory, so it is only generated once. '
+                             'Each run uses a copy of it.')
+    parser.add_argument('--keep', action='store_true', help='Keep the temporary directory, with the generated report.')
+    parser.add_argument('--output', help='Save the results to this JSON file.')
+    options = parser.parse_args()
+
+    weewx_root = tempfile.mkdtemp(prefix='aqitype-report-')
+    try:
+        results = run(options, weewx_root)
+    finally:
+        if options.keep:
+            print(f"The report is in '{weewx_root}'.")
+        else:
+            shutil.rmtree(weewx_root, ignore_errors=True)
+
+    if options.output:
+        with open(options.output, 'w', encoding='utf-8') as output_file:
+            json.dump({
+                'created': datetime.datetime.now().isoformat(timespec='seconds'),
+                'version': user.aqitype.VERSION,
+                'weewx': weewx.__version__,
+                'python': platform.python_version(),
+                'platform': platform.platform(),
+                'options': vars(options),
+                'cycles': results,
+            }, output_file, indent=2)
+        print(f"Saved the results to '{options.output}'.")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,168 @@
+#    Copyright (c) 2025 Rich Bell <bellrichm@gmail.com>
+#
+#    See the file LICENSE.txt for your full rights.
+#
+
+# pylint: disable=wrong-import-order
+# pylint: disable=missing-docstring
+# pylint: disable=invalid-name
+
+import unittest
+import mock
+
+import configobj
+import os
+import random
+import string
+import sys
+
+import weeutil.weeutil
+
+import user.aqitype
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+# pylint: disable=import-error, wrong-import-position
+import utils.database
+# pylint: enable=import-error, wrong-import-position
+
+def random_string(length=32):
+    return ''.join([random.choice(string.ascii_letters + string.digits) for n in range(length)]) # pylint: disable=unused-variable
+
+def setup_config(calculated_field, input_field, algorithm, aqi_type):
+    config_dict = {
+        calculated_field: {
+            'input': input_field,
+            'algorithm': algorithm,
+            'type': aqi_type,
+        }
+    }
+    return config_dict
+
+timespans = [
+    # Whole days
+    weeutil.weeutil.TimeSpan(utils.database.timespan.start - 2 * 86400, utils.database.timespan.stop),
+    # Partial days at both ends
+    weeutil.weeutil.TimeSpan(utils.database.timespan.start - 2 * 86400 + 1500, utils.database.timespan.stop - 900),
+    # Partial day at the start
+    weeutil.weeutil.TimeSpan(utils.database.timespan.start - 86400 + 7200, utils.database.timespan.stop),
+]
+
+class TestAQIDailySummary(unittest.TestCase):
+    def setUp(self):
+        self.mock_logger = mock.Mock(spec=user.aqitype.Logger)
+        self.input_field = utils.database.PM2_5_INPUT_FIELD
+        self.db_manager = utils.database.get_db_manager(self.input_field)
+
+    def tearDown(self):
+        self.db_manager.close()
+        self.db_manager = None
+
+    def get_aqi_type(self, calculated_field, algorithm):
+        config = configobj.ConfigObj(setup_config(calculated_field, self.input_field, algorithm, 'pm2_5'))
+        return user.aqitype.AQIType(self.mock_logger, user.aqitype.SQLExecutor(self.mock_logger), config)
+
+    def check_aggregates(self, calculated_field, algorithm, aggregate_types):
+        expected_aqi_type = self.get_aqi_type(calculated_field, algorithm)
+        SUT = self.get_aqi_type(calculated_field, algorithm)
+        SUT.rebuild_daily_summary(self.db_manager, calculated_field)
+
+        for timespan in timespans:
+            for aggregate_type in aggregate_types:
+                expected_value_tuple = expected_aqi_type.get_aggregate(calculated_field, timespan, aggregate_type, self.db_manager)
+
+                with mock.patch.object(user.aqitype.SQLExecutor,
+                                       'get_aqi_daily_summary_data',
+                                       wraps=SUT.sql_executor.get_aqi_daily_summary_data) as mock_get_aqi_daily_summary_data:
+                    value_tuple = SUT.get_aggregate(calculated_field, timespan, aggregate_type, self.db_manager)
+
+                    mock_get_aqi_daily_summary_data.assert_called_once()
+                    self.assertEqual(value_tuple, expected_value_tuple)
+
+    def check_incremental_update(self, calculated_field, algorithm):
+        expected_aqi_type = self.get_aqi_type(calculated_field, algorithm)
+        expected_aqi_type.rebuild_daily_summary(self.db_manager, calculated_field)
+        table_name = user.aqitype.SQLExecutor.aqi_daily_summary_table_name.format(obs_type=calculated_field)
+        expected_rows = list(self.db_manager.genSql(f"SELECT * FROM {table_name} ORDER BY dateTime"))
+
+        # Start with the first day of data and add the rest of the records one at a time.
+        cutoff = self.db_manager.first_timestamp + 86400
+        records = list(self.db_manager.genBatchRecords(cutoff))
+        self.db_manager.getSql(f"DELETE FROM {self.db_manager.table_name} WHERE dateTime > ?", (cutoff,))
+        self.db_manager.last_timestamp = cutoff
+
+        SUT = self.get_aqi_type(calculated_field, algorithm)
+        SUT.update_daily_summary(self.db_manager, calculated_field)
+        for record in records:
+            SUT.update_daily_summary(self.db_manager, calculated_field, record)
+            self.db_manager.addRecord(record)
+        SUT.update_daily_summary(self.db_manager, calculated_field)
+
+        self.assertEqual(list(self.db_manager.genSql(f"SELECT * FROM {table_name} ORDER BY dateTime")), expected_rows)
+
+    def test_epaaqi_get_aggregate(self):
+        self.check_aggregates(random_string(), 'EPAAQI', ['avg', 'sum'])
+
+    def test_nowcast_get_aggregate(self):
+        self.check_aggregates(random_string(),
+                              'NowCast',
+                              ['avg', 'sum', 'count', 'not_null', 'min', 'mintime', 'max', 'maxtime',
+                               'first', 'firsttime', 'last', 'lasttime'])
+
+    def test_epaaqi_incremental_update(self):
+        self.check_incremental_update(random_string(), 'EPAAQI')
+
+    def test_nowcast_incremental_update(self):
+        self.check_incremental_update(random_string(), 'NowCast')
+
+class TestAQIDailySummaryGappedData(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.input_field = utils.database.PM2_5_INPUT_FIELD
+        # Some days of the data have gaps of up to 12 hours.
+        cls.db_manager = utils.database.get_scaled_db_manager(cls.input_field, 40)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.db_manager.close()
+        cls.db_manager = None
+
+    def setUp(self):
+        self.mock_logger = mock.Mock(spec=user.aqitype.Logger)
+
+    def get_aqi_type(self, calculated_field, algorithm):
+        config_dict = setup_config(calculated_field, self.input_field, algorithm, 'pm2_5')
+        config_dict['memoized_results'] = 0
+        config_dict['cached_intervals'] = 0
+        return user.aqitype.AQIType(self.mock_logger, user.aqitype.SQLExecutor(self.mock_logger), configobj.ConfigObj(config_dict))
+
+    def test_nowcast_get_aggregate(self):
+        calculated_field = random_string()
+        expected_aqi_type = self.get_aqi_type(calculated_field, 'NowCast')
+        SUT = self.get_aqi_type(calculated_field, 'NowCast')
+        SUT.rebuild_daily_summary(self.db_manager, calculated_field)
+
+        stop = utils.database.timespan.stop
+        gapped_timespans = [
+            # All of the data
+            weeutil.weeutil.TimeSpan(stop - 41 * 86400, stop + 86400),
+            # Partial days at both ends, with the hours before the start of each in a gap
+            weeutil.weeutil.TimeSpan(stop - 38 * 86400 + 1500, stop - 900),
+        ]
+        gapped_timespans.extend(weeutil.weeutil.TimeSpan(stop - days * 86400 + hours * 3600, stop - hours * 3600)
+                                for days in range(3, 40, 3) for hours in (1, 5, 11))
+        for timespan in gapped_timespans:
+            for aggregate_type in ['avg', 'sum', 'count', 'min', 'mintime', 'max', 'maxtime',
+                                   'first', 'firsttime', 'last', 'lasttime']:
+                expected_value_tuple = expected_aqi_type.get_aggregate(calculated_field, timespan, aggregate_type, self.db_manager)
+
+                with self.subTest(timespan=str(timespan), aggregate_type=aggregate_type), \
+                     mock.patch.object(user.aqitype.SQLExecutor,
+                                       'get_aqi_daily_summary_data',
+                                       wraps=SUT.sql_executor.get_aqi_daily_summary_data) as mock_get_aqi_daily_summary_data:
+                    value_tuple = SUT.get_aggregate(calculated_field, timespan, aggregate_type, self.db_manager)
+
+                    mock_get_aqi_daily_summary_data.assert_called_once()
+                    self.assertEqual(value_tuple, expected_value_tuple)
+
+if __name__ == '__main__':
+    unittest.main(exit=False)
@@ -11,10 +11,15 @@ import unittest
 import mock
 
 import configobj
+import json
 import os
 import random
 import string
 import sys
+import tempfile
+
+import weeutil.weeutil
+import weewx.manager
 
 import user.aqitype
 
@@ -200,6 +205,467 @@ class TestEPAGetAggregate(unittest.TestCase):
         self.assertEqual(value_tuple[1], None)
         self.assertEqual(value_tuple[2], None)
 
+class TestEPAGetAggregateDailySummary(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.input_field = utils.database.PM2_5_INPUT_FIELD
+        cls.db_manager = utils.database.get_db_manager(cls.input_field)
+        cls.day_summary_db_manager = utils.database.get_db_manager(cls.input_field, weewx.manager.DaySummaryManager)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.db_manager.close()
+        cls.db_manager = None
+        cls.day_summary_db_manager.close()
+        cls.day_summary_db_manager = None
+
+    def setUp(self):
+        self.mock_logger = mock.Mock(spec=user.aqitype.Logger)
+
+    def test_get_aggregate(self):
+        algorithm = 'EPAAQI'
+        aqi_type = 'pm2_5'
+
+        calculated_field = random_string()
+        input_field = utils.database.PM2_5_INPUT_FIELD
+
+        config_dict = setup_config(calculated_field, input_field, algorithm, aqi_type)
+        # Both databases are in memory, so their results cannot be told apart by the result memo or the interval cache.
+        config_dict['memoized_results'] = 0
+        config_dict['cached_intervals'] = 0
+        config_dict['weewx_daily_summaries'] = True
+        config = configobj.ConfigObj(config_dict)
+
+        SUT = user.aqitype.AQIType(self.mock_logger, user.aqitype.SQLExecutor(self.mock_logger), config)
+
+        timespans = [
+            # Whole days
+            weeutil.weeutil.TimeSpan(utils.database.timespan.start - 86400, utils.database.timespan.stop),
+            # Partial days at both ends
+            weeutil.weeutil.TimeSpan(utils.database.timespan.start - 2 * 86400 + 1500, utils.database.timespan.stop - 900),
+        ]
+
+        for timespan in timespans:
+            for aggregate_type in ['min', 'max', 'mintime', 'maxtime', 'count', 'not_null']:
+                expected_value_tuple = SUT.get_aggregate(calculated_field, timespan, aggregate_type, TestEPAGetAggregateDailySummary.db_manager)
+
+                with mock.patch.object(user.aqitype.SQLExecutor,
+                                       'get_daily_summary_data',
+                                       wraps=SUT.sql_executor.get_daily_summary_data) as mock_get_daily_summary_data:
+                    value_tuple = SUT.get_aggregate(calculated_field,
+                                                    timespan,
+                                                    aggregate_type,
+                                                    TestEPAGetAggregateDailySummary.day_summary_db_manager)
+
+                    mock_get_daily_summary_data.assert_called_once()
+                    self.assertEqual(value_tuple, expected_value_tuple)
+
+    def test_get_aggregate_not_enabled(self):
+        algorithm = 'EPAAQI'
+        aqi_type = 'pm2_5'
+
+        calculated_field = random_string()
+        input_field = utils.database.PM2_5_INPUT_FIELD
+
+        config_dict = setup_config(calculated_field, input_field, algorithm, aqi_type)
+        config = configobj.ConfigObj(config_dict)
+
+        SUT = user.aqitype.AQIType(self.mock_logger, user.aqitype.SQLExecutor(self.mock_logger), config)
+
+        timespan = weeutil.weeutil.TimeSpan(utils.database.timespan.start - 86400, utils.database.timespan.stop)
+        with mock.patch.object(user.aqitype.SQLExecutor, 'get_daily_summary_data') as mock_get_daily_summary_data:
+            SUT.get_aggregate(calculated_field, timespan, 'max', TestEPAGetAggregateDailySummary.day_summary_db_manager)
+
+            mock_get_daily_summary_data.assert_not_called()
+
+    def test_get_aggregate_partial_day(self):
+        algorithm = 'EPAAQI'
+        aqi_type = 'pm2_5'
+
+        calculated_field = random_string()
+        input_field = utils.database.PM2_5_INPUT_FIELD
+
+        config_dict = setup_config(calculated_field, input_field, algorithm, aqi_type)
+        config_dict['weewx_daily_summaries'] = True
+        config = configobj.ConfigObj(config_dict)
+
+        SUT = user.aqitype.AQIType(self.mock_logger, user.aqitype.SQLExecutor(self.mock_logger), config)
+
+        timespan = weeutil.weeutil.TimeSpan(utils.database.timespan.start + 3600, utils.database.timespan.stop - 3600)
+        with mock.patch.object(user.aqitype.SQLExecutor, 'get_daily_summary_data') as mock_get_daily_summary_data:
+            value_tuple = SUT.get_aggregate(calculated_field, timespan, 'max', TestEPAGetAggregateDailySummary.day_summary_db_manager)
+
+            mock_get_daily_summary_data.assert_not_called()
+            self.assertEqual(value_tuple,
+                             SUT.get_aggregate(calculated_field, timespan, 'max', TestEPAGetAggregateDailySummary.db_manager))
+
+class TestEPAPushdown(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.input_field = utils.database.PM2_5_INPUT_FIELD
+        cls.db_manager = utils.database.get_db_manager(cls.input_field)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.db_manager.close()
+        cls.db_manager = None
+
+    def setUp(self):
+        self.mock_logger = mock.Mock(spec=user.aqitype.Logger)
+
+    def get_aqi_type(self, calculated_field, pushdown, compiled):
+        config_dict = setup_config(calculated_field, self.input_field, 'EPAAQI', 'pm2_5')
+        config_dict[calculated_field]['compiled'] = compiled
+        config_dict['pushdown'] = pushdown
+        return user.aqitype.AQIType(self.mock_logger, user.aqitype.SQLExecutor(self.mock_logger), configobj.ConfigObj(config_dict))
+
+    def test_get_aggregate(self):
+        calculated_field = random_string()
+        timespan = weeutil.weeutil.TimeSpan(utils.database.timespan.start - 2 * 86400 + 1500, utils.database.timespan.stop)
+
+        for compiled in [False, True]:
+            expected_aqi_type = self.get_aqi_type(calculated_field, False, compiled)
+            for pushdown in [True, 'expression']:
+                SUT = self.get_aqi_type(calculated_field, pushdown, compiled)
+                for aggregate_type in ['avg', 'sum']:
+                    with self.subTest(compiled=compiled, pushdown=pushdown, aggregate_type=aggregate_type):
+                        expected_value_tuple = expected_aqi_type.get_aggregate(calculated_field, timespan, aggregate_type,
+                                                                               TestEPAPushdown.db_manager)
+
+                        with mock.patch.object(user.aqitype.SQLExecutor, 'get_aggregate_concentation_data') \
+                             as mock_get_aggregate_concentation_data:
+                            value_tuple = SUT.get_aggregate(calculated_field, timespan, aggregate_type, TestEPAPushdown.db_manager)
+
+                            mock_get_aggregate_concentation_data.assert_not_called()
+                            self.assertEqual(value_tuple, expected_value_tuple)
+
+    def test_get_aggregated_series(self):
+        calculated_field = random_string()
+        timespan = weeutil.weeutil.TimeSpan(utils.database.timespan.start - 2 * 86400, utils.database.timespan.stop)
+
+        for compiled in [False, True]:
+            expected_aqi_type = self.get_aqi_type(calculated_field, False, compiled)
+            for pushdown in [True, 'expression']:
+                SUT = self.get_aqi_type(calculated_field, pushdown, compiled)
+                for aggregate_type in ['avg', 'sum']:
+                    with self.subTest(compiled=compiled, pushdown=pushdown, aggregate_type=aggregate_type):
+                        expected_vectors = expected_aqi_type.get_series(calculated_field, timespan, TestEPAPushdown.db_manager,
+                                                                        aggregate_type=aggregate_type, aggregate_interval=10800)
+
+                        with mock.patch.object(user.aqitype.SQLExecutor, 'get_concentration_data_not_null') \
+                             as mock_get_concentration_data_not_null:
+                            vectors = SUT.get_series(calculated_field, timespan, TestEPAPushdown.db_manager,
+                                                     aggregate_type=aggregate_type, aggregate_interval=10800)
+
+                            mock_get_concentration_data_not_null.assert_not_called()
+                            self.assertEqual(vectors, expected_vectors)
+
+class TestEPACoalescedQueries(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.input_field = utils.database.PM2_5_INPUT_FIELD
+        cls.db_manager = utils.database.get_db_manager(cls.input_field)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.db_manager.close()
+        cls.db_manager = None
+
+    def setUp(self):
+        self.mock_logger = mock.Mock(spec=user.aqitype.Logger)
+
+    def test_fields_with_same_input(self):
+        calculated_fields = [random_string(), random_string()]
+        config_dict = setup_config(calculated_fields[0], self.input_field, 'EPAAQI', 'pm2_5')
+        config_dict.update(setup_config(calculated_fields[1], self.input_field, 'EPAAQIDeprecatedV0', 'pm2_5'))
+
+        expected_aqi_type = user.aqitype.AQIType(self.mock_logger,
+                                                 user.aqitype.SQLExecutor(self.mock_logger),
+                                                 configobj.ConfigObj(config_dict))
+        query_coalescer = user.aqitype.QueryCoalescer()
+        SUT = user.aqitype.AQIType(self.mock_logger,
+                                   user.aqitype.SQLExecutor(self.mock_logger, query_coalescer),
+                                   configobj.ConfigObj(config_dict))
+
+        for calculated_field in calculated_fields:
+            self.assertEqual(SUT.get_series(calculated_field, utils.database.timespan, TestEPACoalescedQueries.db_manager),
+                             expected_aqi_type.get_series(calculated_field, utils.database.timespan, TestEPACoalescedQueries.db_manager))
+            for aggregate_type in ['avg', 'max']:
+                self.assertEqual(SUT.get_aggregate(calculated_field, utils.database.timespan, aggregate_type,
+                                                   TestEPACoalescedQueries.db_manager),
+                                 expected_aqi_type.get_aggregate(calculated_field, utils.database.timespan, aggregate_type,
+                                                                 TestEPACoalescedQueries.db_manager))
+
+        # The second field uses the rows of the first. And 'avg' and 'max' are calculated from the same query.
+        self.assertEqual(query_coalescer.stats, {'queries': 2, 'shared': 2})
+
+class TestEPAStatsBundle(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.input_field = utils.database.PM2_5_INPUT_FIELD
+        cls.db_manager = utils.database.get_db_manager(cls.input_field)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.db_manager.close()
+        cls.db_manager = None
+
+    def setUp(self):
+        self.mock_logger = mock.Mock(spec=user.aqitype.Logger)
+
+    def test_get_aggregate(self):
+        calculated_field = random_string()
+        config_dict = setup_config(calculated_field, self.input_field, 'EPAAQI', 'pm2_5')
+
+        expected_config_dict = dict(config_dict, memoized_results=0)
+        expected_aqi_type = user.aqitype.AQIType(self.mock_logger,
+                                                 user.aqitype.SQLExecutor(self.mock_logger),
+                                                 configobj.ConfigObj(expected_config_dict))
+        sql_executor = user.aqitype.SQLExecutor(self.mock_logger)
+        SUT = user.aqitype.AQIType(self.mock_logger, sql_executor, configobj.ConfigObj(config_dict))
+
+        timespans = [
+            utils.database.timespan,
+            weeutil.weeutil.TimeSpan(utils.database.timespan.start - 2 * 86400 + 1500, utils.database.timespan.stop - 900),
+            # No data
+            weeutil.weeutil.TimeSpan(utils.database.timespan.stop + 86400, utils.database.timespan.stop + 2 * 86400),
+        ]
+        for timespan in timespans:
+            with mock.patch.object(user.aqitype.SQLExecutor,
+                                   'get_concentration_data_not_null',
+                                   wraps=sql_executor.get_concentration_data_not_null) as mock_get_concentration_data_not_null:
+                for aggregate_type in user.aqitype.EPAAQI.stats_aggregates:
+                    with self.subTest(timespan=timespan, aggregate_type=aggregate_type):
+                        self.assertEqual(SUT.get_aggregate(calculated_field, timespan, aggregate_type, self.db_manager),
+                                         expected_aqi_type.get_aggregate(calculated_field, timespan, aggregate_type, self.db_manager))
+
+                # All of the aggregates of the timespan are calculated from one query.
+                mock_get_concentration_data_not_null.assert_called_once()
+
+    def test_get_aggregate_one_record(self):
+        calculated_field = random_string()
+        config_dict = setup_config(calculated_field, self.input_field, 'EPAAQI', 'pm2_5')
+
+        expected_config_dict = dict(config_dict, memoized_results=0)
+        expected_aqi_type = user.aqitype.AQIType(self.mock_logger,
+                                                 user.aqitype.SQLExecutor(self.mock_logger),
+                                                 configobj.ConfigObj(expected_config_dict))
+        sql_executor = user.aqitype.SQLExecutor(self.mock_logger)
+        SUT = user.aqitype.AQIType(self.mock_logger, sql_executor, configobj.ConfigObj(config_dict))
+
+        timespan = weeutil.weeutil.TimeSpan(utils.database.timespan.start - 2 * 86400 + 1500, utils.database.timespan.stop - 900)
+        with mock.patch.object(user.aqitype.SQLExecutor,
+                               'get_concentration_data_not_null',
+                               wraps=sql_executor.get_concentration_data_not_null) as mock_get_concentration_data_not_null:
+            # A lone 'last' keeps its query of one record.
+            self.assertEqual(SUT.get_aggregate(calculated_field, timespan, 'last', self.db_manager),
+                             expected_aqi_type.get_aggregate(calculated_field, timespan, 'last', self.db_manager))
+            mock_get_concentration_data_not_null.assert_not_called()
+
+            # The second aggregate of the timespan calculates all of them.
+            for aggregate_type in ['first', 'lasttime', 'max', 'maxtime']:
+                with self.subTest(aggregate_type=aggregate_type):
+                    self.assertEqual(SUT.get_aggregate(calculated_field, timespan, aggregate_type, self.db_manager),
+                                     expected_aqi_type.get_aggregate(calculated_field, timespan, aggregate_type, self.db_manager))
+            mock_get_concentration_data_not_null.assert_called_once()
+
+class TestEPAIntervalCache(unittest.TestCase):
+    def setUp(self):
+        self.mock_logger = mock.Mock(spec=user.aqitype.Logger)
+        self.input_field = utils.database.PM2_5_INPUT_FIELD
+        self.db_manager = utils.database.get_db_manager(self.input_field)
+
+    def tearDown(self):
+        self.db_manager.close()
+        self.db_manager = None
+
+    def test_get_series(self):
+        calculated_field = random_string()
+        config_dict = setup_config(calculated_field, self.input_field, 'EPAAQI', 'pm2_5')
+        timespan = weeutil.weeutil.TimeSpan(utils.database.timespan.start - 2 * 86400, utils.database.timespan.stop)
+
+        # The previous report cycle was 3 hours ago
+        cutoff = self.db_manager.last_timestamp - 3 * 3600
+        records = list(self.db_manager.genBatchRecords(cutoff))
+        self.db_manager.getSql(f"DELETE FROM {self.db_manager.table_name} WHERE dateTime > ?", (cutoff,))
+        self.db_manager.last_timestamp = cutoff
+
+        SUT = user.aqitype.AQIType(self.mock_logger,
+                                   user.aqitype.SQLExecutor(self.mock_logger),
+                                   configobj.ConfigObj(config_dict))
+        SUT.get_series(calculated_field, timespan, self.db_manager, 'avg', 3600)
+
+        for record in records:
+            self.db_manager.addRecord(record)
+
+        expected_aqi_type = user.aqitype.AQIType(self.mock_logger,
+                                                 user.aqitype.SQLExecutor(self.mock_logger),
+                                                 configobj.ConfigObj(dict(config_dict, cached_intervals=0)))
+        expected_series = expected_aqi_type.get_series(calculated_field, timespan, self.db_manager, 'avg', 3600)
+
+        with mock.patch.object(user.aqitype.AQIType,
+                               '_get_aggregated_series_epaaqi',
+                               wraps=SUT._get_aggregated_series_epaaqi) as mock_get_aggregated_series_epaaqi:
+            self.assertEqual(SUT.get_series(calculated_field, timespan, self.db_manager, 'avg', 3600), expected_series)
+
+            # Only the intervals after the previous report cycle are calculated.
+            stamps = mock_get_aggregated_series_epaaqi.call_args.args[1]
+            self.assertEqual([stamp.stop for stamp in stamps], list(range(cutoff + 3600, self.db_manager.last_timestamp + 1, 3600)))
+
+            # A back-fill
+            SUT.result_memo.clear()
+            SUT.interval_cache.add_record(cutoff)
+            self.assertEqual(SUT.get_series(calculated_field, timespan, self.db_manager, 'avg', 3600), expected_series)
+            stamps = mock_get_aggregated_series_epaaqi.call_args.args[1]
+            self.assertEqual(stamps[0].stop, cutoff)
+
+    def test_get_series_stored(self):
+        calculated_field = random_string()
+        config_dict = setup_config(calculated_field, self.input_field, 'EPAAQI', 'pm2_5')
+        timespan = weeutil.weeutil.TimeSpan(utils.database.timespan.start - 2 * 86400, utils.database.timespan.stop)
+
+        with tempfile.TemporaryDirectory() as directory:
+            store = user.aqitype.IntervalStore(os.path.join(directory, 'aqitype_intervals.sdb'),
+                                               user.aqitype.SQLExecutor.get_database_key(self.db_manager))
+
+            aqi_type = user.aqitype.AQIType(self.mock_logger, user.aqitype.SQLExecutor(self.mock_logger), configobj.ConfigObj(config_dict))
+            aqi_type.interval_cache.store = store
+            expected_series = aqi_type.get_series(calculated_field, timespan, self.db_manager, 'max', 3600)
+
+            # After a restart
+            SUT = user.aqitype.AQIType(self.mock_logger, user.aqitype.SQLExecutor(self.mock_logger), configobj.ConfigObj(config_dict))
+            SUT.interval_cache.store = store
+            compiled_config_dict = setup_config(calculated_field, self.input_field, 'EPAAQI', 'pm2_5')
+            compiled_config_dict[calculated_field]['compiled'] = True
+            compiled_aqi_type = user.aqitype.AQIType(self.mock_logger,
+                                                     user.aqitype.SQLExecutor(self.mock_logger),
+                                                     configobj.ConfigObj(compiled_config_dict))
+            compiled_aqi_type.interval_cache.store = store
+
+            with mock.patch.object(user.aqitype.AQIType,
+                                   '_get_aggregated_series_epaaqi',
+                                   wraps=SUT._get_aggregated_series_epaaqi) as mock_get_aggregated_series_epaaqi:
+                self.assertEqual(SUT.get_series(calculated_field, timespan, self.db_manager, 'max', 3600), expected_series)
+                # All of the intervals are closed, and read from the store.
+                self.assertEqual(mock_get_aggregated_series_epaaqi.call_args.args[1], [])
+
+                # A different calculation does not use them.
+                compiled_aqi_type.get_series(calculated_field, timespan, self.db_manager, 'max', 3600)
+                self.assertEqual(len(mock_get_aggregated_series_epaaqi.call_args.args[1]), len(expected_series[0][0]))
+
+            store.close()
+
+class TestEPAMetrics(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.input_field = utils.database.PM2_5_INPUT_FIELD
+        cls.db_manager = utils.database.get_db_manager(cls.input_field)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.db_manager.close()
+        cls.db_manager = None
+
+    def test_get_series(self):
+        mock_logger = mock.Mock(spec=user.aqitype.Logger)
+        calculated_field = random_string()
+        config = configobj.ConfigObj(setup_config(calculated_field, self.input_field, 'EPAAQI', 'pm2_5'))
+        metrics = user.aqitype.Metrics()
+
+        SUT = user.aqitype.AQIType(mock_logger, user.aqitype.SQLExecutor(mock_logger, metrics=metrics), config, metrics=metrics)
+        _start_vec, _stop_vec, data_vec = SUT.get_series(calculated_field, utils.database.timespan, self.db_manager)
+        SUT.get_series(calculated_field, utils.database.timespan, self.db_manager)
+
+        summary = metrics.get_summary()
+        self.assertEqual(len(summary), 1)
+        self.assertEqual((summary[0].obs_type, summary[0].method, summary[0].count), (calculated_field, 'get_series', 2))
+        # The second call is remembered, so the records are only fetched once.
+        self.assertEqual(summary[0].rows, len(data_vec[0]))
+        self.assertGreater(summary[0].sql_time, 0)
+        self.assertLessEqual(summary[0].sql_time, summary[0].time)
+
+class TestEPATracing(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.input_field = utils.database.PM2_5_INPUT_FIELD
+        cls.db_manager = utils.database.get_db_manager(cls.input_field)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.db_manager.close()
+        cls.db_manager = None
+
+    def test_get_series(self):
+        mock_logger = mock.Mock(spec=user.aqitype.Logger)
+        calculated_field = random_string()
+        config = configobj.ConfigObj(setup_config(calculated_field, self.input_field, 'EPAAQI', 'pm2_5'))
+
+        with tempfile.TemporaryDirectory() as directory:
+            tracer = user.aqitype.Tracer(mock_logger, os.path.join(directory, 'trace.jsonl'))
+            SUT = user.aqitype.AQIType(mock_logger, user.aqitype.SQLExecutor(mock_logger, tracer=tracer), config, tracer=tracer)
+            _start_vec, _stop_vec, data_vec = SUT.get_series(calculated_field, utils.database.timespan, self.db_manager)
+            SUT.get_series(calculated_field, utils.database.timespan, self.db_manager)
+
+            with open(tracer.path, encoding='utf-8') as trace_file:
+                spans = [json.loads(line) for line in trace_file]
+
+        self.assertEqual([span['name'] for span in spans], ['AQIType.get_series', 'sql', 'calculate', 'AQIType.get_series'])
+        root, sql, calculate, remembered = spans
+        self.assertEqual(root['attributes']['obs_type'], calculated_field)
+        self.assertEqual(root['attributes']['timespan'], list(utils.database.timespan))
+        self.assertEqual(root['attributes']['memo.series'], 'miss')
+        self.assertEqual(remembered['attributes']['memo.series'], 'hit')
+        self.assertNotEqual(remembered['trace_id'], root['trace_id'])
+        for span in (sql, calculate):
+            self.assertEqual((span['trace_id'], span['parent_id']), (root['trace_id'], root['span_id']))
+            self.assertLessEqual(span['duration'], root['duration'])
+        self.assertEqual(sql['attributes']['rows'], len(data_vec[0]))
+        self.assertEqual(calculate['attributes']['records'], len(data_vec[0]))
+
+class TestMultiSensor(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        # A second sensor, stored in its own column
+        cls.input_fields = [utils.database.PM2_5_INPUT_FIELD, f'{utils.database.PM2_5_INPUT_FIELD}1']
+        cls.db_manager = utils.database.get_db_manager(cls.input_fields[0], other_pm2_5_columns=cls.input_fields[1:])
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.db_manager.close()
+        cls.db_manager = None
+
+    def setUp(self):
+        self.mock_logger = mock.Mock(spec=user.aqitype.Logger)
+
+    def test_inputs_fetched_together(self):
+        config_dict = {}
+        for input_field in self.input_fields:
+            config_dict.update(setup_config(f'{input_field}_aqi', input_field, 'EPAAQI', 'pm2_5'))
+            config_dict.update(setup_config(f'{input_field}_aqi_nowcast', input_field, 'NowCast', 'pm2_5'))
+
+        expected_aqi_type = user.aqitype.AQIType(self.mock_logger,
+                                                 user.aqitype.SQLExecutor(self.mock_logger),
+                                                 configobj.ConfigObj(config_dict))
+        query_coalescer = user.aqitype.QueryCoalescer()
+        SUT = user.aqitype.AQIType(self.mock_logger,
+                                   user.aqitype.SQLExecutor(self.mock_logger, query_coalescer),
+                                   configobj.ConfigObj(config_dict))
+
+        requests = [
+            lambda aqi_type, calculated_field: aqi_type.get_series(calculated_field, utils.database.timespan, TestMultiSensor.db_manager),
+            lambda aqi_type, calculated_field: aqi_type.get_series(calculated_field, utils.database.timespan, TestMultiSensor.db_manager,
+                                                                   aggregate_type='avg', aggregate_interval=10800),
+            lambda aqi_type, calculated_field: aqi_type.get_aggregate(calculated_field, utils.database.timespan, 'avg',
+                                                                      TestMultiSensor.db_manager),
+        ]
+        for request in requests:
+            for calculated_field in config_dict:
+                with self.subTest(calculated_field=calculated_field):
+                    self.assertEqual(request(SUT, calculated_field), request(expected_aqi_type, calculated_field))
+
+        # One scan each for the records, the records with a concentration, and the hourly concentrations, of both inputs.
+        self.assertEqual(query_coalescer.stats, {'queries': 3, 'shared': 9})
+
 if __name__ == '__main__':
     #test_suite = unittest.TestSuite()
     #test_suite.addTest(TestNowCastDevelopment('test_get_series_prototype02'))
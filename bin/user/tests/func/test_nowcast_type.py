@@ -16,6 +16,8 @@ import random
 import string
 import sys
 
+import weeutil.weeutil
+
 import user.aqitype
 
 sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
@@ -79,6 +81,70 @@ class TestNowCastGetScalar(unittest.TestCase):
         self.assertEqual(value_tuple[1], None)
         self.assertEqual(value_tuple[2], None)
 
+    def test_get_scalar_hourly_buffer(self):
+        algorithm = 'NowCast'
+        aqi_type = 'pm2_5'
+
+        calculated_field = random_string()
+        input_field = utils.database.PM2_5_INPUT_FIELD
+
+        config_dict = setup_config(calculated_field, input_field, algorithm, aqi_type)
+        config = configobj.ConfigObj(config_dict)
+
+        sql_executor = user.aqitype.SQLExecutor(self.mock_logger)
+        db_manager = TestNowCastGetScalar.db_manager
+        last_timestamp = db_manager.lastGoodStamp()
+        start = user.aqitype.HourlyBuffer.get_hour(last_timestamp) - 11 * 3600
+        hourly_buffer = user.aqitype.HourlyBuffer()
+        hourly_buffer.seed(sql_executor.get_database_key(db_manager),
+                           start,
+                           last_timestamp,
+                           {input_field: sql_executor.get_hourly_sums(db_manager, input_field, start)})
+
+        record = db_manager.getRecord(last_timestamp)
+        expected_value_tuple = user.aqitype.AQIType(self.mock_logger, sql_executor, configobj.ConfigObj(config_dict)) \
+                                   .get_scalar(calculated_field, record, db_manager)
+
+        SUT = user.aqitype.AQIType(self.mock_logger, sql_executor, config, hourly_buffer)
+
+        with mock.patch.object(user.aqitype.SQLExecutor, 'get_concentration_data_nowcast') as mock_get_concentration_data_nowcast:
+            value_tuple = SUT.get_scalar(calculated_field, record, db_manager)
+
+            mock_get_concentration_data_nowcast.assert_not_called()
+            self.assertEqual(value_tuple, expected_value_tuple)
+
+    def test_get_scalar_memoized(self):
+        calculated_field = random_string()
+        input_field = utils.database.PM2_5_INPUT_FIELD
+
+        config = configobj.ConfigObj(setup_config(calculated_field, input_field, 'NowCast', 'pm2_5'))
+        sql_executor = user.aqitype.SQLExecutor(self.mock_logger)
+        db_manager = TestNowCastGetScalar.db_manager
+        record = db_manager.getRecord(db_manager.lastGoodStamp())
+
+        SUT = user.aqitype.AQIType(self.mock_logger, sql_executor, config)
+
+        with mock.patch.object(user.aqitype.SQLExecutor,
+                               'get_concentration_data_nowcast',
+                               wraps=sql_executor.get_concentration_data_nowcast) as mock_get_concentration_data_nowcast:
+            # For example, $current.pm2_5_aqi_nowcast.has_data, .raw and then the formatted value
+            value_tuples = [SUT.get_scalar(calculated_field, record, db_manager) for _i in range(3)]
+
+            mock_get_concentration_data_nowcast.assert_called_once()
+            self.assertEqual(value_tuples[1:], value_tuples[:1] * 2)
+            self.assertEqual(SUT.result_memo.stats, {'hits': 2, 'misses': 1})
+
+            # A loop packet is not remembered
+            packet = {key: value for key, value in record.items() if key != 'interval'}
+            SUT.get_scalar(calculated_field, packet, db_manager)
+            SUT.get_scalar(calculated_field, packet, db_manager)
+            self.assertEqual(mock_get_concentration_data_nowcast.call_count, 3)
+
+            # A new archive record clears the results
+            SUT.result_memo.clear()
+            self.assertEqual(SUT.get_scalar(calculated_field, record, db_manager), value_tuples[0])
+            self.assertEqual(mock_get_concentration_data_nowcast.call_count, 4)
+
 class TestNowCastGetSeries(unittest.TestCase):
     @classmethod
     def setUpClass(cls):
@@ -123,9 +189,135 @@ class TestNowCastGetSeries(unittest.TestCase):
                            1740182400, 1740186000, 1740189600, 1740193200, 1740196800, 1740200400],
                           'unix_epoch', 'group_time'))                           
         self.assertEqual(aqi_vec,
-                         ([9, 8, 7, 8, 7, 7,7, 7, 8, 8, 8, 8, 8, 8, 8, 8, 8, 7, 7, 7, 7, 7, 7, 8],
+                         ([8, 8, 8, 8, 7, 7,7, 7, 8, 8, 8, 8, 8, 8, 8, 8, 8, 7, 7, 7, 7, 7, 7, 8],
                           None, None))
 
+    def test_get_series_stored_results(self):
+        algorithm = 'NowCast'
+        aqi_type = 'pm2_5'
+
+        calculated_field = random_string()
+        input_field = utils.database.PM2_5_INPUT_FIELD
+
+        config_dict = setup_config(calculated_field, input_field, algorithm, aqi_type)
+        config_dict['store_nowcast'] = True
+        # Otherwise the later calls are the remembered results.
+        config_dict['memoized_results'] = 0
+        config = configobj.ConfigObj(config_dict)
+
+        sql_executor = user.aqitype.SQLExecutor(self.mock_logger)
+        SUT = user.aqitype.AQIType(self.mock_logger, sql_executor, config)
+        expected_vectors = SUT.get_series(calculated_field, utils.database.timespan, TestNowCastGetSeries.db_manager)
+
+        get_concentration_data_nowcast = sql_executor.get_concentration_data_nowcast
+        with mock.patch.object(user.aqitype.SQLExecutor, 'save_nowcast_results') as mock_save_nowcast_results, \
+             mock.patch.object(sql_executor, 'get_concentration_data_nowcast',
+                               side_effect=get_concentration_data_nowcast) as mock_get_concentration_data_nowcast:
+            start_vec, stop_vec, aqi_vec = SUT.get_series(calculated_field, utils.database.timespan, TestNowCastGetSeries.db_manager)
+
+            mock_save_nowcast_results.assert_not_called()
+            self.assertEqual(mock_get_concentration_data_nowcast.call_count, 2)
+            # Only the first 12 hours, and the last hour and the 12 hours before it, are read from the archive.
+            for call in mock_get_concentration_data_nowcast.call_args_list:
+                _db_manager, _dependent_field, stop, start = call.args
+                self.assertLessEqual(stop - start, 43200 + 3600)
+            self.assertEqual((start_vec, stop_vec, aqi_vec), expected_vectors)
+            self.assertEqual(aqi_vec,
+                             ([8, 8, 8, 8, 7, 7,7, 7, 8, 8, 8, 8, 8, 8, 8, 8, 8, 7, 7, 7, 7, 7, 7, 8],
+                              None, None))
+
+    def test_get_series_stored_results_backfill(self):
+        algorithm = 'NowCast'
+        aqi_type = 'pm2_5'
+
+        calculated_field = random_string()
+        input_field = utils.database.PM2_5_INPUT_FIELD
+        db_manager = utils.database.get_db_manager(input_field)
+
+        config_dict = setup_config(calculated_field, input_field, algorithm, aqi_type)
+        config_dict['store_nowcast'] = True
+        # Otherwise the later calls are the remembered results.
+        config_dict['memoized_results'] = 0
+        config = configobj.ConfigObj(config_dict)
+
+        sql_executor = user.aqitype.SQLExecutor(self.mock_logger)
+        SUT = user.aqitype.AQIType(self.mock_logger, sql_executor, config)
+
+        # The records of 2 hours are back-filled, after the values have been stored.
+        backfill_start = utils.database.timespan.start + 6 * 3600
+        records = [db_manager.getRecord(timestamp)
+                   for timestamp in range(backfill_start + 300, backfill_start + 7200 + 1, 300)]
+        db_manager.connection.execute(f"DELETE FROM {db_manager.table_name} WHERE dateTime > ? AND dateTime <= ?",
+                                      (backfill_start, backfill_start + 7200))
+        SUT.get_series(calculated_field, utils.database.timespan, db_manager)
+        for record in records:
+            db_manager.addRecord(dict(record, **{input_field: record[input_field] * 10}))
+            sql_executor.invalidate_nowcast_results(db_manager, record['dateTime'])
+
+        expected_vectors = user.aqitype.AQIType(self.mock_logger, user.aqitype.SQLExecutor(self.mock_logger),
+                                                configobj.ConfigObj(setup_config(calculated_field, input_field, algorithm, aqi_type))
+                                                ).get_series(calculated_field, utils.database.timespan, db_manager)
+        self.assertEqual(SUT.get_series(calculated_field, utils.database.timespan, db_manager), expected_vectors)
+
+        db_manager.close()
+
+    def test_get_series_stored_results_changed_archive(self):
+        calculated_field = random_string()
+        input_field = utils.database.PM2_5_INPUT_FIELD
+        db_manager = utils.database.get_db_manager(input_field)
+
+        config_dict = setup_config(calculated_field, input_field, 'NowCast', 'pm2_5')
+        config_dict['store_nowcast'] = True
+        config_dict['memoized_results'] = 0
+        SUT = user.aqitype.AQIType(self.mock_logger, user.aqitype.SQLExecutor(self.mock_logger), configobj.ConfigObj(config_dict))
+        SUT.get_series(calculated_field, utils.database.timespan, db_manager)
+
+        # The records of 2 hours are changed outside of WeeWX, for example by 'weectl import'.
+        changed_start = utils.database.timespan.start + 6 * 3600
+        db_manager.connection.execute(f"UPDATE {db_manager.table_name} SET {input_field} = {input_field} * 10 "
+                                      "WHERE dateTime > ? AND dateTime <= ?",
+                                      (changed_start, changed_start + 7200))
+
+        expected_vectors = user.aqitype.AQIType(self.mock_logger, user.aqitype.SQLExecutor(self.mock_logger),
+                                                configobj.ConfigObj(setup_config(calculated_field, input_field, 'NowCast', 'pm2_5'))
+                                                ).get_series(calculated_field, utils.database.timespan, db_manager)
+        self.assertEqual(SUT.get_series(calculated_field, utils.database.timespan, db_manager), expected_vectors)
+        # And the values calculated again are stored.
+        self.assertEqual(SUT.get_series(calculated_field, utils.database.timespan, db_manager), expected_vectors)
+
+        db_manager.close()
+
+    def test_get_series_stored_results_backfill_while_calculating(self):
+        calculated_field = random_string()
+        input_field = utils.database.PM2_5_INPUT_FIELD
+        db_manager = utils.database.get_db_manager(input_field)
+
+        config_dict = setup_config(calculated_field, input_field, 'NowCast', 'pm2_5')
+        config_dict['store_nowcast'] = True
+        config_dict['memoized_results'] = 0
+        sql_executor = user.aqitype.SQLExecutor(self.mock_logger)
+        SUT = user.aqitype.AQIType(self.mock_logger, sql_executor, configobj.ConfigObj(config_dict))
+        timespan = weeutil.weeutil.TimeSpan(utils.database.timespan.start, utils.database.timespan.stop - 6 * 3600)
+        SUT.get_series(calculated_field, timespan, db_manager)
+        stored_coverage = sql_executor.get_nowcast_coverage(db_manager, calculated_field)
+
+        # The WeeWX engine removes the stored values of a back-fill after they were read for a report.
+        backfill_timestamp = utils.database.timespan.start + 6 * 3600 + 600
+        get_nowcast_coverage = sql_executor.get_nowcast_coverage
+        def get_nowcast_coverage_then_backfill(*args):
+            coverage = get_nowcast_coverage(*args)
+            sql_executor.invalidate_nowcast_results(db_manager, backfill_timestamp)
+            return coverage
+
+        with mock.patch.object(sql_executor, 'get_nowcast_coverage', side_effect=get_nowcast_coverage_then_backfill):
+            SUT.get_series(calculated_field, utils.database.timespan, db_manager)
+
+        # The values calculated before the back-fill are not stored.
+        coverage = sql_executor.get_nowcast_coverage(db_manager, calculated_field)
+        self.assertEqual(coverage, (stored_coverage[0], (backfill_timestamp - 300) // 3600 * 3600, None, None))
+
+        db_manager.close()
+
     def test_get_series_aggregation_valid_inputs(self):
         algorithm = 'NowCast'
         aqi_type = 'pm2_5'
@@ -189,6 +381,72 @@ class TestNowCastGetAggregate(unittest.TestCase):
 
         self.assertEqual(aggregate_value, (True, 'boolean', 'group_boolean'))
 
+    def test_get_aggregate_interval_cache(self):
+        calculated_field = random_string()
+        config_dict = setup_config(calculated_field, self.input_field, 'NowCast', 'pm2_5')
+        config_dict['memoized_results'] = 0
+        db_manager = utils.database.get_db_manager(self.input_field)
+        stop = db_manager.last_timestamp
+        timespan = weeutil.weeutil.TimeSpan(stop - 86400, stop)
+
+        SUT = user.aqitype.AQIType(self.mock_logger, user.aqitype.SQLExecutor(self.mock_logger), configobj.ConfigObj(config_dict))
+        expected_aqi_type = user.aqitype.AQIType(self.mock_logger,
+                                                 user.aqitype.SQLExecutor(self.mock_logger),
+                                                 configobj.ConfigObj(dict(config_dict, cached_intervals=0)))
+
+        # The last hour of the interval also has the records up to 'offset' seconds after its end.
+        aggregate_value = SUT.get_aggregate(calculated_field, timespan, 'max', db_manager)
+        self.assertEqual(SUT.interval_cache.get_stats()['entries'], 0)
+        db_manager.addRecord({'dateTime': stop + 60, 'usUnits': 1, 'interval': 1, self.input_field: 500.0})
+        expected_value = expected_aqi_type.get_aggregate(calculated_field, timespan, 'max', db_manager)
+        self.assertNotEqual(expected_value, aggregate_value)
+        self.assertEqual(SUT.get_aggregate(calculated_field, timespan, 'max', db_manager), expected_value)
+
+        # After the last hour's records, the interval is closed.
+        db_manager.addRecord({'dateTime': stop + 300, 'usUnits': 1, 'interval': 5, self.input_field: 5.0})
+        SUT.get_aggregate(calculated_field, timespan, 'max', db_manager)
+        self.assertEqual(SUT.interval_cache.get_stats()['entries'], 1)
+
+        # Until the current hour has ended, its records are not read, so the key is the interval, but it is not kept.
+        with mock.patch('user.aqitype.time.time', return_value=stop - 1800):
+            SUT.get_aggregate(calculated_field, weeutil.weeutil.TimeSpan(stop - 86400, stop - 900), 'max', db_manager)
+        self.assertEqual(SUT.interval_cache.get_stats()['entries'], 1)
+
+        db_manager.close()
+
+class TestNowCastGappedData(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.input_field = utils.database.PM2_5_INPUT_FIELD
+        # Some days of the data have gaps of up to 12 hours.
+        cls.db_manager = utils.database.get_scaled_db_manager(cls.input_field, 40)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.db_manager.close()
+        cls.db_manager = None
+
+    def setUp(self):
+        self.mock_logger = mock.Mock(spec=user.aqitype.Logger)
+
+    def test_get_aggregate_matches_series(self):
+        calculated_field = random_string()
+        config_dict = setup_config(calculated_field, self.input_field, 'NowCast', 'pm2_5')
+        config_dict['memoized_results'] = 0
+        config_dict['cached_intervals'] = 0
+        SUT = user.aqitype.AQIType(self.mock_logger, user.aqitype.SQLExecutor(self.mock_logger), configobj.ConfigObj(config_dict))
+
+        stop = utils.database.timespan.stop
+        for aggregate_interval, days in ((3600, 40), (86400, 40), (7 * 86400, 35)):
+            timespan = weeutil.weeutil.TimeSpan(stop - days * 86400, stop)
+            for aggregate_type in ['avg', 'count', 'max', 'maxtime', 'first', 'lasttime']:
+                start_vec, stop_vec, data_vec = SUT.get_series(calculated_field, timespan, self.db_manager,
+                                                               aggregate_type, aggregate_interval)
+                for start, stop_timestamp, value in zip(start_vec[0], stop_vec[0], data_vec[0]):
+                    with self.subTest(aggregate_interval=aggregate_interval, aggregate_type=aggregate_type, start=start):
+                        interval = weeutil.weeutil.TimeSpan(start, stop_timestamp)
+                        self.assertEqual(SUT.get_aggregate(calculated_field, interval, aggregate_type, self.db_manager)[0], value)
+
 if __name__ == '__main__':
     #test_suite = unittest.TestSuite()
     #test_suite.addTest(TestNowCastDevelopment('test_get_series_prototype02'))
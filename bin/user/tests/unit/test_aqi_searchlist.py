@@ -4,6 +4,7 @@
 # pylint: disable=missing-docstring
 
 import unittest
+import mock
 
 import user.aqitype
 
@@ -33,5 +34,13 @@ class TestAQISearchList(unittest.TestCase):
         self.assertEqual(searchlist.get_aqi_description(450.0, 'EPAAQI'), 'aqi_EPAAQI_description6')
         self.assertEqual(searchlist.get_aqi_description(6050.0, 'EPAAQI'), 'aqi_EPAAQI_description6')
 
+    def test_aqi_metrics(self):
+        searchlist = user.aqitype.AQISearchList({})
+        self.assertEqual(searchlist.get_extension_list(None, None)[0]['AQIMetrics'].get_summary(), [])
+
+        metrics = user.aqitype.Metrics()
+        with mock.patch.object(user.aqitype.Metrics, 'instance', metrics):
+            self.assertIs(searchlist.get_extension_list(None, None)[0]['AQIMetrics'], metrics)
+
 if __name__ == '__main__':
     unittest.main(exit=False)
@@ -77,6 +77,31 @@ class TestGetScalar(unittest.TestCase):
                 self.assertEqual(value_tuple[1], unit)
                 self.assertEqual(value_tuple[2], unit_group)
 
+    def test_get_scalar_compiled(self):
+        mock_logger = mock.Mock(spec=user.aqitype.Logger)
+        mock_sql_executor = mock.Mock()
+
+        calculated_field = random_string()
+        input_field = random_string()
+
+        config_dict = setup_config(calculated_field, input_field, 'EPAAQI', 'pm2_5')
+        config_dict[calculated_field]['compiled'] = 'true'
+        config = configobj.ConfigObj(config_dict)
+
+        SUT = user.aqitype.AQIType(mock_logger, mock_sql_executor, config)
+
+        record = {
+            'usUnits': utils.database.US_UNITS,
+            'interval': utils.database.ARCHIVE_INTERVAL_MINUTES,
+            'dateTime': time.time(),
+            input_field: 9.09,
+        }
+
+        self.assertIn('pm2_5', SUT.aqi_fields[calculated_field]['calculator'].lookup_tables)
+        # The concentration is truncated to 9.0 before the AQI is looked up.
+        self.assertEqual(SUT.get_scalar(calculated_field, record)[0],
+                         user.aqitype.EPAAQI(mock_logger, 0, None, None).calculate('pm2_5', 9.0))
+
 class TestGetSeries(unittest.TestCase):
     def test_get_series_valid_inputs(self):
         mock_logger = mock.Mock(spec=user.aqitype.Logger)
@@ -95,7 +120,7 @@ class TestGetSeries(unittest.TestCase):
 
         aqi = [random.randint(11, 100),
                random.randint(11, 100)]
-        with mock.patch.object(calculator, 'calculate', side_effect=aqi):
+        with mock.patch.object(calculator, 'calculate_many', return_value=aqi):
 
             SUT = user.aqitype.AQIType(mock_logger, mock_sql_executor, config)
 
@@ -132,6 +157,7 @@ class TestGetAggregate(unittest.TestCase):
     def test_get_aggregation_avg_valid_inputs(self):
         mock_logger = mock.Mock(spec=user.aqitype.Logger)
         mock_sql_executor = mock.Mock()
+        mock_sql_executor.aqi_daily_summaries = {}
         mock_db_manager = mock.Mock()
 
         calculator = user.aqitype.EPAAQI
@@ -146,22 +172,24 @@ class TestGetAggregate(unittest.TestCase):
 
         aqi = [random.randint(11, 100),
                random.randint(11, 100)]
-        with mock.patch.object(calculator, 'calculate', side_effect=aqi):
+        with mock.patch.object(calculator, 'calculate_many', return_value=aqi):
             SUT = user.aqitype.AQIType(mock_logger, mock_sql_executor, config)
 
             unit = random_string()
             unit_group = random_string()
             now = int(time.time() + 0.5)
             end_timestamp = (int(now / utils.database.ARCHIVE_INTERVAL_SECONDS) + 1) * utils.database.ARCHIVE_INTERVAL_SECONDS
+            mock_db_manager.last_timestamp = now
 
-            mock_data  = 'aggregate', [[random.randint(11, 100)], [random.randint(11, 100)]]
-            mock_sql_executor.get_aggregate_concentation_data.return_value = mock_data
+            timespan = weeutil.weeutil.TimeSpan(end_timestamp-3600, end_timestamp)
+            mock_data  = [(end_timestamp - 300, random.randint(11, 100)), (end_timestamp, random.randint(11, 100))]
+            mock_sql_executor.get_concentration_data_not_null.return_value = iter(mock_data)
 
             with mock.patch('weewx.units.getStandardUnitType', return_value=[unit, unit_group]):
 
-                value_tuple  = \
-                    SUT.get_aggregate(calculated_field, weeutil.weeutil.TimeSpan(end_timestamp-3600, end_timestamp), 'avg', mock_db_manager)
+                value_tuple  = SUT.get_aggregate(calculated_field, timespan, 'avg', mock_db_manager)
 
+                mock_sql_executor.get_concentration_data_not_null.assert_called_once_with(input_field, timespan, mock_db_manager)
                 self.assertEqual(value_tuple[0], round(sum(aqi) / len(aqi)))
                 self.assertEqual(value_tuple[1], unit)
                 self.assertEqual(value_tuple[2], unit_group)
@@ -189,15 +217,18 @@ class TestGetAggregate(unittest.TestCase):
             unit_group = random_string()
             now = int(time.time() + 0.5)
             end_timestamp = (int(now / utils.database.ARCHIVE_INTERVAL_SECONDS) + 1) * utils.database.ARCHIVE_INTERVAL_SECONDS
+            mock_db_manager.last_timestamp = now
 
+            timespan = weeutil.weeutil.TimeSpan(end_timestamp-3600, end_timestamp)
             mock_data  = random_string(), [[random.random()],]
             mock_sql_executor.get_aggregate_concentation_data.return_value = mock_data
 
             with mock.patch('weewx.units.getStandardUnitType', return_value=[unit, unit_group]):
 
-                value_tuple  = \
-                    SUT.get_aggregate(calculated_field, weeutil.weeutil.TimeSpan(end_timestamp-3600, end_timestamp), 'min', mock_db_manager)
+                value_tuple  = SUT.get_aggregate(calculated_field, timespan, 'min', mock_db_manager)
 
+                # A lone 'min' is one record, so it is not calculated from all of the records of the timespan.
+                mock_sql_executor.get_concentration_data_not_null.assert_not_called()
                 self.assertEqual(value_tuple[0], aqi)
                 self.assertEqual(value_tuple[1], unit)
                 self.assertEqual(value_tuple[2], unit_group)
@@ -216,7 +247,7 @@ class TestGetAggregate(unittest.TestCase):
         config_dict = setup_config(calculated_field, input_field, algorithm, aqi_type)
         config = configobj.ConfigObj(config_dict)
 
-        SUT = user.aqitype.AQIType(mock_logger, mock_sql_executor (), config)
+        SUT = user.aqitype.AQIType(mock_logger, mock_sql_executor, config)
 
         unit = random_string()
         unit_group = random_string()
@@ -230,16 +261,24 @@ class TestGetAggregate(unittest.TestCase):
         mock_db_manager.first_timestamp = start_timestamp
         mock_db_manager.last_timestamp = end_timestamp
 
-        aqi_tuples = [(random.randint(11, 100), unit, unit_group),
-                      (random.randint(11, 100), unit, unit_group),
-                      (random.randint(11, 100), unit, unit_group)]
-        with mock.patch.object(user.aqitype.AQIType, 'get_aggregate', side_effect=aqi_tuples):
+        # No records in the second interval
+        records = [(start_timestamp + i * utils.database.ARCHIVE_INTERVAL_SECONDS, random.uniform(0, 100))
+                   for i in list(range(1, 5)) + list(range(9, 13))]
+        mock_sql_executor.get_concentration_data_not_null.return_value = iter(records)
+
+        calculator = user.aqitype.EPAAQI(mock_logger, 0, None, None)
+        expected_aqi = [calculator.calculate(aqi_type, max(record[1] for record in records[0:4])),
+                        None,
+                        calculator.calculate(aqi_type, max(record[1] for record in records[4:8]))]
+
+        with mock.patch('weewx.units.getStandardUnitType', return_value=[unit, unit_group]):
             value_tuple  = SUT.get_series(calculated_field,
-                                        timespan,
-                                        mock_db_manager,
-                                        aggregate_type=random_string(),
-                                        aggregate_interval=aggregate_interval)
+                                          timespan,
+                                          mock_db_manager,
+                                          aggregate_type='max',
+                                          aggregate_interval=aggregate_interval)
 
+            mock_sql_executor.get_concentration_data_not_null.assert_called_once_with(input_field, timespan, mock_db_manager)
             self.assertEqual(value_tuple[0], \
                              ([start_timestamp, start_timestamp + aggregate_interval, start_timestamp + 2*aggregate_interval], \
                               'unix_epoch', \
@@ -248,7 +287,46 @@ class TestGetAggregate(unittest.TestCase):
                              ([end_timestamp - 2*aggregate_interval, end_timestamp - aggregate_interval, end_timestamp], \
                               'unix_epoch', \
                               'group_time'))
-            self.assertEqual(value_tuple[2], ([aqi_tuples[0][0], aqi_tuples[1][0], aqi_tuples[2][0]], unit, unit_group))
+            self.assertEqual(value_tuple[2], (expected_aqi, unit, unit_group))
+
+    def test_get_aggregated_series_avg(self):
+        mock_logger = mock.Mock(spec=user.aqitype.Logger)
+        mock_sql_executor = mock.Mock()
+        mock_db_manager = mock.Mock()
+
+        algorithm = 'EPAAQI'
+        aqi_type = 'pm2_5'
+
+        calculated_field = random_string()
+        input_field = random_string()
+
+        config_dict = setup_config(calculated_field, input_field, algorithm, aqi_type)
+        config = configobj.ConfigObj(config_dict)
+
+        SUT = user.aqitype.AQIType(mock_logger, mock_sql_executor, config)
+
+        start_timestamp = utils.database.timespan.start
+        end_timestamp = start_timestamp + 7200
+        aggregate_interval = 3600
+
+        mock_db_manager.first_timestamp = start_timestamp
+        mock_db_manager.last_timestamp = end_timestamp
+        mock_db_manager.std_unit_system = utils.database.US_UNITS
+
+        records = [(start_timestamp + i * utils.database.ARCHIVE_INTERVAL_SECONDS, random.uniform(0, 100)) for i in range(1, 25)]
+        mock_sql_executor.get_concentration_data_not_null.return_value = iter(records)
+
+        calculator = user.aqitype.EPAAQI(mock_logger, 0, None, None)
+        expected_aqi = [round(sum(calculator.calculate(aqi_type, record[1]) for record in records[0:12]) / 12),
+                        round(sum(calculator.calculate(aqi_type, record[1]) for record in records[12:24]) / 12)]
+
+        value_tuple  = SUT.get_series(calculated_field,
+                                      weeutil.weeutil.TimeSpan(start_timestamp, end_timestamp),
+                                      mock_db_manager,
+                                      aggregate_type='avg',
+                                      aggregate_interval=aggregate_interval)
+
+        self.assertEqual(value_tuple[2][0], expected_aqi)
 
 if __name__ == '__main__':
     #test_suite = unittest.TestSuite()
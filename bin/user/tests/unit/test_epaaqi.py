@@ -3,6 +3,7 @@
 
 # pylint: disable=missing-docstring
 
+import math
 import random
 import string
 import unittest
@@ -43,5 +44,59 @@ class TestEPAAQI(unittest.TestCase):
         self.assertEqual(calculator.calculate('pm10', (550.0)), 440)
         self.assertEqual(calculator.calculate('pm10', (700.0)), 607)
 
+class TestEPAAQICalculateMany(unittest.TestCase):
+    def test_matches_calculate(self):
+        mock_logger = mock.Mock(spec=user.aqitype.Logger)
+        calculator = user.aqitype.EPAAQI(mock_logger, 0, None, None)
+
+        for aqi_type in calculator.readings:
+            concentrations = [random.uniform(0, 700) for _ in range(500)]
+            for reading_bp in calculator.readings[aqi_type]['breakpoints']:
+                concentrations.extend([reading_bp['min'], reading_bp['max']])
+
+            self.assertEqual(calculator.calculate_many(aqi_type, concentrations),
+                             [calculator.calculate(aqi_type, concentration) for concentration in concentrations])
+
+    def test_missing_values(self):
+        mock_logger = mock.Mock(spec=user.aqitype.Logger)
+        calculator = user.aqitype.EPAAQI(mock_logger, 0, None, None)
+
+        self.assertEqual(calculator.calculate_many('pm2_5', [5.0, None, math.nan, 23.0]), [28, None, None, 77])
+        self.assertEqual(calculator.calculate_many('pm2_5', []), [])
+
+    def test_without_numpy(self):
+        mock_logger = mock.Mock(spec=user.aqitype.Logger)
+        calculator = user.aqitype.EPAAQI(mock_logger, 0, None, None)
+
+        with mock.patch.object(user.aqitype, 'numpy', None):
+            self.assertEqual(calculator.calculate_many('pm10', [25.0, None, math.nan, 700.0]), [23, None, None, 607])
+
+class TestEPAAQICompiled(unittest.TestCase):
+    def test_compiled_matches_truncated_calculate(self):
+        mock_logger = mock.Mock(spec=user.aqitype.Logger)
+        calculator = user.aqitype.EPAAQI(mock_logger, 0, None, None)
+        compiled_calculator = user.aqitype.EPAAQI(mock_logger, 0, None, None)
+
+        for aqi_type in calculator.readings:
+            compiled_calculator.compile(aqi_type)
+            prep_data = calculator.readings[aqi_type]['prep_data']
+            concentrations = [random.uniform(-1, 800) for _ in range(500)] + [0.3, 9.0, 9.05, 54.9]
+
+            expected_aqi = [calculator.calculate(aqi_type, prep_data(concentration)) for concentration in concentrations]
+
+            self.assertEqual([compiled_calculator.calculate(aqi_type, concentration) for concentration in concentrations],
+                             expected_aqi)
+            self.assertEqual(compiled_calculator.calculate_many(aqi_type, concentrations), expected_aqi)
+            with mock.patch.object(user.aqitype, 'numpy', None):
+                self.assertEqual(compiled_calculator.calculate_many(aqi_type, concentrations), expected_aqi)
+
+    def test_compiled_missing_values(self):
+        mock_logger = mock.Mock(spec=user.aqitype.Logger)
+        calculator = user.aqitype.EPAAQI(mock_logger, 0, None, None)
+        calculator.compile('pm2_5')
+
+        self.assertIsNone(calculator.calculate('pm2_5', None))
+        self.assertEqual(calculator.calculate_many('pm2_5', [None, math.nan, 5.09]), [None, None, 28])
+
 if __name__ == '__main__':
     unittest.main(exit=False)
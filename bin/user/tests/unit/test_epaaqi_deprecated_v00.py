@@ -43,5 +43,14 @@ class TestEPAAQI(unittest.TestCase):
         self.assertEqual(calculator.calculate('pm10', (550.0)), 446)
         self.assertEqual(calculator.calculate('pm10', (700.0)), 596)
 
+    def test_calculate_many(self):
+        mock_logger = mock.Mock(spec=user.aqitype.Logger)
+        calculator = user.aqitype.EPAAQIDeprecatedV0(mock_logger, 0, None, None)
+
+        for aqi_type in calculator.readings:
+            concentrations = [random.uniform(0, 700) for _ in range(500)] + [None]
+            self.assertEqual(calculator.calculate_many(aqi_type, concentrations),
+                             [calculator.calculate(aqi_type, concentration) for concentration in concentrations])
+
 if __name__ == '__main__':
     unittest.main(exit=False)
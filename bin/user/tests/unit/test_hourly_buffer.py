@@ -0,0 +1,122 @@
+#    Copyright (c) 2025 Rich Bell <bellrichm@gmail.com>
+#    See the file LICENSE.txt for your full rights.
+
+# pylint: disable=missing-docstring
+
+import random
+import string
+import unittest
+
+import user.aqitype
+
+def random_string(length=32):
+    return ''.join([random.choice(string.ascii_letters + string.digits) for n in range(length)]) # pylint: disable=unused-variable
+
+class TestHourlyBuffer(unittest.TestCase):
+    def setUp(self):
+        self.input_field = random_string()
+        self.database_key = (random_string(), random_string())
+        self.start = 1740114000
+
+        # 5 minute archive records for the first 12 hours
+        self.records = []
+        for i in range(1, 12 * 12 + 1):
+            self.records.append({'dateTime': self.start + i * 300,
+                                 'interval': 5,
+                                 self.input_field: None if i % 7 == 0 else random.uniform(0, 100)})
+
+    def get_expected_data(self, records, stop, start):
+        hours = {}
+        for record in records:
+            hour = (record['dateTime'] - 300) // 3600 * 3600
+            if start <= hour < stop:
+                hours.setdefault(hour, []).append(record)
+        expected_data = []
+        for hour in sorted(hours, reverse=True):
+            values = [record[self.input_field] for record in hours[hour] if record[self.input_field] is not None]
+            expected_data.append((max(record['dateTime'] for record in hours[hour]) - 3600,
+                                  sum(values) / len(values) if values else None))
+        return expected_data
+
+    def assert_data(self, data, expected_data):
+        self.assertEqual(len(data), len(expected_data))
+        for row, expected_row in zip(data, expected_data):
+            self.assertEqual(row[0], expected_row[0])
+            self.assertAlmostEqual(row[1], expected_row[1])
+
+    def test_add_record(self):
+        SUT = user.aqitype.HourlyBuffer()
+        SUT.seed(self.database_key, -float('inf'), None, {self.input_field: []})
+
+        for record in self.records:
+            SUT.add_record(record)
+        # Records already added are ignored
+        SUT.add_record(self.records[-1])
+
+        self.assertTrue(SUT.covers(self.database_key, self.input_field, self.start))
+        self.assertFalse(SUT.covers(self.database_key, random_string(), self.start))
+        self.assert_data(SUT.get_concentration_data_nowcast(self.input_field, self.start + 43200, self.start),
+                         self.get_expected_data(self.records, self.start + 43200, self.start))
+
+    def test_seed(self):
+        SUT = user.aqitype.HourlyBuffer()
+        hourly_sums = []
+        for hour in range(12):
+            records = self.records[hour * 12:(hour + 1) * 12]
+            values = [record[self.input_field] for record in records if record[self.input_field] is not None]
+            hourly_sums.append((self.start + hour * 3600, records[-1]['dateTime'], sum(values), len(values)))
+
+        SUT.seed(self.database_key, self.start, self.records[-1]['dateTime'], {self.input_field: hourly_sums})
+
+        self.assert_data(SUT.get_concentration_data_nowcast(self.input_field, self.start + 43200, self.start),
+                         self.get_expected_data(self.records, self.start + 43200, self.start))
+
+    def test_rolling(self):
+        SUT = user.aqitype.HourlyBuffer()
+        SUT.seed(self.database_key, -float('inf'), None, {self.input_field: []})
+
+        records = self.records + [{'dateTime': self.start + 43200 + i * 300, 'interval': 5, self.input_field: float(i)}
+                                  for i in range(1, 13)]
+        for record in records:
+            SUT.add_record(record)
+
+        start = self.start + 3600
+        self.assertFalse(SUT.covers(self.database_key, self.input_field, self.start))
+        self.assertTrue(SUT.covers(self.database_key, self.input_field, start))
+        self.assert_data(SUT.get_concentration_data_nowcast(self.input_field, start + 43200, start),
+                         self.get_expected_data(records, start + 43200, start))
+
+    def test_in_flight_record(self):
+        SUT = user.aqitype.HourlyBuffer()
+        SUT.seed(self.database_key, -float('inf'), None, {self.input_field: []})
+        for record in self.records[:-1]:
+            SUT.add_record(record)
+
+        data = SUT.get_concentration_data_nowcast(self.input_field, self.start + 43200, self.start, self.records[-1])
+
+        self.assert_data(data, self.get_expected_data(self.records, self.start + 43200, self.start))
+
+    def test_in_flight_loop_packet(self):
+        SUT = user.aqitype.HourlyBuffer()
+        SUT.seed(self.database_key, -float('inf'), None, {self.input_field: []})
+        for record in self.records:
+            SUT.add_record(record)
+
+        # The loop packets of the first archive record of the next hour
+        SUT.add_loop_packet({'dateTime': self.start + 43200 + 60, self.input_field: 10.0})
+        SUT.add_loop_packet({'dateTime': self.start + 43200 + 120, self.input_field: None})
+        packet = {'dateTime': self.start + 43200 + 180, self.input_field: 20.0}
+
+        data = SUT.get_concentration_data_nowcast(self.input_field, self.start + 46800, self.start + 3600, packet)
+
+        self.assertEqual(data[0], (self.start + 43200 + 300 - 3600, 15.0))
+        self.assert_data(data[1:], self.get_expected_data(self.records, self.start + 43200, self.start + 3600))
+
+        # An archive record resets the loop packets
+        SUT.add_record({'dateTime': self.start + 43200 + 300, 'interval': 5, self.input_field: 15.0})
+        packet = {'dateTime': self.start + 43200 + 360, self.input_field: 30.0}
+        data = SUT.get_concentration_data_nowcast(self.input_field, self.start + 46800, self.start + 3600, packet)
+        self.assertEqual(data[0], (self.start + 43200 + 600 - 3600, 22.5))
+
+if __name__ == '__main__':
+    unittest.main(exit=False)
@@ -0,0 +1,68 @@
+#    Copyright (c) 2025 Rich Bell <bellrichm@gmail.com>
+#    See the file LICENSE.txt for your full rights.
+
+# pylint: disable=wrong-import-order
+# pylint: disable=missing-docstring
+# pylint: disable=invalid-name
+
+import unittest
+import mock
+
+import os
+import sys
+
+import user.aqitype
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+# pylint: disable=import-error, wrong-import-position
+import utils.database
+# pylint: enable=import-error, wrong-import-position
+
+class TestIndexAdvisor(unittest.TestCase):
+    def setUp(self):
+        self.mock_logger = mock.Mock(spec=user.aqitype.Logger)
+        self.input_field = utils.database.PM2_5_INPUT_FIELD
+        self.db_manager = utils.database.get_db_manager(self.input_field)
+
+    def tearDown(self):
+        self.db_manager.close()
+        self.db_manager = None
+
+    def test_advise(self):
+        SUT = user.aqitype.IndexAdvisor(user.aqitype.SQLExecutor(self.mock_logger), repeat=1)
+        index_name = SUT.get_index_name(self.db_manager, self.input_field)
+
+        had_index, results = SUT.advise(self.db_manager, self.input_field, utils.database.timespan)
+
+        self.assertFalse(had_index)
+        self.assertFalse(SUT.has_index(self.db_manager, self.input_field))
+        self.assertIn('max', results)
+        self.assertIn('extreme_min', results)
+        for result in results.values():
+            self.assertTrue(result.plan)
+            self.assertIsNone(result.plan_after)
+            self.assertIsNone(result.time_after)
+
+        had_index, results = SUT.advise(self.db_manager, self.input_field, utils.database.timespan, create=True)
+
+        self.assertFalse(had_index)
+        self.assertTrue(SUT.has_index(self.db_manager, self.input_field))
+        for result in results.values():
+            self.assertTrue(result.same_rows)
+            self.assertIsNotNone(result.time_after)
+        self.assertTrue(any(index_name in step for step in results['avg'].plan_after))
+        self.assertTrue(SUT.format_report(self.db_manager, self.input_field, had_index, results))
+
+    def test_drop_index(self):
+        SUT = user.aqitype.IndexAdvisor(user.aqitype.SQLExecutor(self.mock_logger), repeat=1)
+
+        SUT.create_index(self.db_manager, self.input_field)
+        SUT.create_index(self.db_manager, self.input_field)
+        self.assertTrue(SUT.has_index(self.db_manager, self.input_field))
+
+        SUT.drop_index(self.db_manager, self.input_field)
+        SUT.drop_index(self.db_manager, self.input_field)
+        self.assertFalse(SUT.has_index(self.db_manager, self.input_field))
+
+if __name__ == '__main__':
+    unittest.main(exit=False)
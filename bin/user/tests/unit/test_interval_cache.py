@@ -0,0 +1,99 @@
+#    Copyright (c) 2025 Rich Bell <bellrichm@gmail.com>
+#    See the file LICENSE.txt for your full rights.
+
+# pylint: disable=missing-docstring
+# pylint: disable=invalid-name
+
+import random
+import string
+import unittest
+import mock
+
+import user.aqitype
+
+def random_string(length=32):
+    return ''.join([random.choice(string.ascii_letters + string.digits) for n in range(length)]) # pylint: disable=unused-variable
+
+def get_mock_db_manager(last_timestamp=86400):
+    mock_db_manager = mock.Mock()
+    mock_db_manager.connection.database_name = random_string()
+    mock_db_manager.table_name = 'archive'
+    mock_db_manager.last_timestamp = last_timestamp
+    return mock_db_manager
+
+class TestIntervalCache(unittest.TestCase):
+    def test_is_closed(self):
+        mock_db_manager = get_mock_db_manager()
+
+        self.assertTrue(user.aqitype.IntervalCache.is_closed(mock_db_manager, mock_db_manager.last_timestamp))
+        self.assertFalse(user.aqitype.IntervalCache.is_closed(mock_db_manager, mock_db_manager.last_timestamp + 1))
+        self.assertFalse(user.aqitype.IntervalCache.is_closed(get_mock_db_manager(None), 0))
+        self.assertFalse(user.aqitype.IntervalCache.is_closed(None, 0))
+
+    def test_kept(self):
+        SUT = user.aqitype.IntervalCache()
+        mock_db_manager = get_mock_db_manager()
+        mock_function = mock.Mock(return_value=random.randint(1, 500))
+        key = SUT.get_key(mock_db_manager, 0, 3600, 'aggregate', random_string(), 'avg')
+
+        results = [SUT.get(mock_db_manager, key, mock_function, 1, option=2) for _i in range(3)]
+        # The next report cycle
+        mock_db_manager.last_timestamp += 300
+        results.append(SUT.get(mock_db_manager, key, mock_function, 1, option=2))
+
+        self.assertEqual(results, [mock_function.return_value] * 4)
+        mock_function.assert_called_once_with(1, option=2)
+        stats = SUT.get_stats()
+        self.assertEqual((stats['hits'], stats['misses'], stats['entries']), (3, 1, 1))
+        self.assertEqual(stats['hit_rate'], 0.75)
+
+    def test_max_entries(self):
+        SUT = user.aqitype.IntervalCache(max_entries=2)
+        mock_db_manager = get_mock_db_manager()
+
+        for start in [0, 300, 0, 600, 0, 300]:
+            SUT.get(mock_db_manager, SUT.get_key(mock_db_manager, start, start + 300), mock.Mock())
+
+        # The interval starting at 300 is the least recently used
+        self.assertEqual(len(SUT.results), 2)
+        stats = SUT.get_stats()
+        self.assertEqual((stats['hits'], stats['misses'], stats['evictions']), (2, 4, 2))
+
+    def test_back_fill(self):
+        SUT = user.aqitype.IntervalCache()
+        mock_db_manager = get_mock_db_manager()
+        other_mock_db_manager = get_mock_db_manager(mock_db_manager.last_timestamp - 7200)
+        for start in range(0, mock_db_manager.last_timestamp, 3600):
+            SUT.put(mock_db_manager, SUT.get_key(mock_db_manager, start, start + 3600), start)
+        SUT.put(other_mock_db_manager, SUT.get_key(other_mock_db_manager, 0, 3600), 0)
+
+        # A new record
+        SUT.add_record(mock_db_manager.last_timestamp + 300)
+        self.assertEqual(SUT.get_stats()['invalidations'], 0)
+
+        # A back-fill of the database removes the intervals that end at or after it.
+        SUT.add_record(mock_db_manager.last_timestamp - 3600)
+        self.assertEqual(SUT.get_stats()['invalidations'], 2)
+        self.assertEqual(SUT.lookup(SUT.get_key(mock_db_manager, mock_db_manager.last_timestamp - 7200,
+                                                mock_db_manager.last_timestamp - 3600)), (False, None))
+        self.assertEqual(SUT.lookup(SUT.get_key(mock_db_manager, 0, 3600)), (True, 0))
+        self.assertEqual(SUT.lookup(SUT.get_key(other_mock_db_manager, 0, 3600)), (True, 0))
+
+    def test_not_kept(self):
+        SUT = user.aqitype.IntervalCache()
+        mock_db_manager = get_mock_db_manager()
+        mock_function = mock.Mock(side_effect=[user.aqitype.weewx.CannotCalculate(), 1, 2])
+        key = SUT.get_key(mock_db_manager, 0, 3600)
+
+        # Exceptions are not kept
+        with self.assertRaises(user.aqitype.weewx.CannotCalculate):
+            SUT.get(mock_db_manager, key, mock_function)
+        self.assertEqual(SUT.get(mock_db_manager, key, mock_function), 1)
+
+        # Calls with options that cannot be hashed are not kept
+        self.assertIsNone(SUT.get_key(mock_db_manager, 0, 3600, (('option', []),)))
+        self.assertEqual(SUT.get(mock_db_manager, None, mock_function), 2)
+        self.assertEqual(len(SUT.results), 1)
+
+if __name__ == '__main__':
+    unittest.main(exit=False)
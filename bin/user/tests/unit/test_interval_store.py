@@ -0,0 +1,110 @@
+#    Copyright (c) 2025 Rich Bell <bellrichm@gmail.com>
+#    See the file LICENSE.txt for your full rights.
+
+# pylint: disable=missing-docstring
+# pylint: disable=invalid-name
+
+import os
+import random
+import string
+import tempfile
+import unittest
+import mock
+
+from weewx.units import ValueTuple
+
+import user.aqitype
+
+def random_string(length=32):
+    return ''.join([random.choice(string.ascii_letters + string.digits) for n in range(length)]) # pylint: disable=unused-variable
+
+def get_mock_db_manager(database_name, last_timestamp=86400):
+    mock_db_manager = mock.Mock()
+    mock_db_manager.connection.database_name = database_name
+    mock_db_manager.table_name = 'archive'
+    mock_db_manager.last_timestamp = last_timestamp
+    return mock_db_manager
+
+class TestIntervalStore(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory() # pylint: disable=consider-using-with
+        self.path = os.path.join(self.directory.name, 'aqitype_intervals.sdb')
+        self.database_key = (random_string(), 'archive')
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_restart(self):
+        SUT = user.aqitype.IntervalStore(self.path, self.database_key)
+        results = [
+            ((self.database_key, 0, 3600, 'aggregate', random_string(), 'avg', ()), ValueTuple(42, 'aqi', 'group_aqi')),
+            ((self.database_key, 0, 3600, 'series', random_string(), 'max'), 17),
+            ((self.database_key, 3600, 7200, 'series', random_string(), 'max'), None),
+        ]
+        SUT.put_many(results)
+        SUT.close()
+
+        SUT = user.aqitype.IntervalStore(self.path, self.database_key)
+        for key, result in results:
+            self.assertEqual(SUT.get(key), (True, result))
+        self.assertEqual(SUT.get((self.database_key, 0, 7200, 'series', random_string(), 'max')), (False, None))
+        SUT.close()
+
+    def test_shared(self):
+        SUT = user.aqitype.IntervalStore(self.path, self.database_key)
+        other_store = user.aqitype.IntervalStore(self.path, self.database_key)
+        key = (self.database_key, 0, 3600, 'series', random_string(), 'avg')
+
+        SUT.put_many([(key, 12)])
+
+        self.assertEqual(other_store.get(key), (True, 12))
+        SUT.close()
+        other_store.close()
+
+    def test_not_stored(self):
+        SUT = user.aqitype.IntervalStore(self.path, self.database_key)
+        key = (self.database_key, 0, 3600, 'aggregate', random_string(), 'avg', (('option', object()),))
+
+        SUT.put_many([(key, 12), ((self.database_key, 0, 3600, 'series'), object())])
+
+        self.assertEqual(SUT.get(key), (False, None))
+        self.assertEqual(SUT.get((self.database_key, 0, 3600, 'series')), (False, None))
+        SUT.close()
+
+    def test_invalidate_and_trim(self):
+        SUT = user.aqitype.IntervalStore(self.path, self.database_key, retention_days=1)
+        keys = [(self.database_key, start, start + 3600, 'series') for start in range(0, 3 * 86400, 3600)]
+        SUT.put_many([(key, key[1]) for key in keys])
+
+        SUT.invalidate(2 * 86400)
+        SUT.trim(2 * 86400)
+        # Trimmed at most once a day
+        SUT.trim(2 * 86400 + 43200)
+
+        self.assertEqual([key for key in keys if SUT.get(key)[0]],
+                         [key for key in keys if 86400 <= key[2] < 2 * 86400])
+        SUT.close()
+
+    def test_interval_cache(self):
+        store = user.aqitype.IntervalStore(self.path, self.database_key)
+        mock_db_manager = get_mock_db_manager(self.database_key[0])
+        mock_function = mock.Mock(return_value=random.randint(1, 500))
+        key = user.aqitype.IntervalCache.get_key(mock_db_manager, 0, 3600, 'series', random_string(), 'avg')
+
+        user.aqitype.IntervalCache(store=store).get(mock_db_manager, key, mock_function)
+        # After a restart, the aggregate is read from the store.
+        SUT = user.aqitype.IntervalCache(store=store)
+        self.assertEqual(SUT.get(mock_db_manager, key, mock_function), mock_function.return_value)
+        self.assertEqual(SUT.get(mock_db_manager, key, mock_function), mock_function.return_value)
+
+        mock_function.assert_called_once()
+        stats = SUT.get_stats()
+        self.assertEqual((stats['hits'], stats['stored_hits'], stats['misses']), (1, 1, 0))
+
+        # A back-fill removes it from the store too.
+        SUT.add_record(3600)
+        self.assertEqual(store.get(key), (False, None))
+        store.close()
+
+if __name__ == '__main__':
+    unittest.main(exit=False)
@@ -0,0 +1,91 @@
+#    Copyright (c) 2025 Rich Bell <bellrichm@gmail.com>
+#    See the file LICENSE.txt for your full rights.
+
+# pylint: disable=missing-docstring
+# pylint: disable=invalid-name
+
+import os
+import random
+import string
+import tempfile
+import unittest
+import mock
+
+import user.aqitype
+
+def random_string(length=32):
+    return ''.join([random.choice(string.ascii_letters + string.digits) for n in range(length)]) # pylint: disable=unused-variable
+
+class TestMetrics(unittest.TestCase):
+    def test_measure(self):
+        SUT = user.aqitype.Metrics()
+        obs_type = random_string()
+
+        with mock.patch('time.perf_counter', side_effect=[0.0, 0.002, 10.0, 10.5]):
+            with SUT.measure(obs_type, 'get_aggregate', 'max'):
+                SUT.add_sql(0.0015, 1)
+            with self.assertRaises(user.aqitype.weewx.CannotCalculate):
+                with SUT.measure(obs_type, 'get_aggregate', 'max'):
+                    raise user.aqitype.weewx.CannotCalculate()
+
+        summary = SUT.get_summary()
+        self.assertEqual(len(summary), 1)
+        metric = summary[0]
+        self.assertEqual((metric.obs_type, metric.method, metric.aggregate_type, metric.count, metric.rows),
+                         (obs_type, 'get_aggregate', 'max', 2, 1))
+        self.assertAlmostEqual(metric.time, 0.502)
+        self.assertAlmostEqual(metric.sql_time, 0.0015)
+        self.assertAlmostEqual(metric.calculation_time, 0.5005)
+        self.assertEqual([count for _bound, count in metric.histogram], [0, 1, 0, 0, 0, 1, 0, 0, 0, 0])
+
+    def test_nested(self):
+        SUT = user.aqitype.Metrics()
+
+        # A query outside of a call is not added to any call.
+        SUT.add_sql(1.0, 10)
+        with SUT.measure('outer', 'get_series'):
+            SUT.add_sql(1.0, 10)
+            with SUT.measure('inner', 'get_aggregate', 'avg'):
+                SUT.add_sql(2.0, 20)
+
+        metrics = {metric.obs_type: metric for metric in SUT.get_summary()}
+        self.assertEqual((metrics['outer'].sql_time, metrics['outer'].rows), (1.0, 10))
+        self.assertEqual((metrics['inner'].sql_time, metrics['inner'].rows), (2.0, 20))
+
+    def test_time_rows(self):
+        SUT = user.aqitype.Metrics()
+        rows = [(i,) for i in range(5)]
+
+        with SUT.measure('field', 'get_series'):
+            self.assertEqual(list(SUT.time_rows(iter, rows)), rows)
+            # The query is run when it is called, so that its errors are raised there.
+            with self.assertRaises(user.aqitype.weedb.NoColumnError):
+                SUT.time_rows(mock.Mock(side_effect=user.aqitype.weedb.NoColumnError()))
+
+        self.assertEqual(SUT.get_summary()[0].rows, 5)
+
+    def test_textfile(self):
+        SUT = user.aqitype.Metrics()
+        with SUT.measure('pm2_5_aqi', 'get_aggregate', 'avg'):
+            SUT.add_sql(0.25, 3)
+        with SUT.measure('pm2_5_aqi', 'get_scalar'):
+            pass
+
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'aqitype.prom')
+            SUT.write_textfile(path)
+            self.assertEqual(os.listdir(directory), ['aqitype.prom'])
+            with open(path, encoding='utf-8') as textfile:
+                lines = textfile.read().splitlines()
+
+        labels = 'obs_type="pm2_5_aqi",method="get_aggregate",aggregate_type="avg"'
+        self.assertIn('# TYPE aqitype_call_seconds histogram', lines)
+        self.assertIn(f'aqitype_call_seconds_bucket{{{labels},le="+Inf"}} 1', lines)
+        self.assertIn(f'aqitype_call_seconds_count{{{labels}}} 1', lines)
+        self.assertIn(f'aqitype_sql_seconds_total{{{labels}}} 0.25', lines)
+        self.assertIn(f'aqitype_rows_total{{{labels}}} 3', lines)
+        self.assertIn('aqitype_rows_total{obs_type="pm2_5_aqi",method="get_scalar",aggregate_type=""} 0', lines)
+        self.assertIn('2 calls', SUT.format_summary())
+
+if __name__ == '__main__':
+    unittest.main(exit=False)
@@ -228,6 +228,158 @@ class TestNowCastCalculate(unittest.TestCase):
                     self.assertEqual(stop_vec, list(reversed([x+3600 for x in timestamps[0:vec_len]])))
                     self.assertEqual(aqi_vec, list(reversed(aqi_values)))
 
+class TestNowCastWindow(unittest.TestCase):
+    def test_sliding_min_max(self):
+        concentrations = [random.choice([None, random.uniform(0, 700)]) for _ in range(200)]
+        window = user.aqitype.NowCastWindow()
+
+        first = 0
+        for i, concentration in enumerate(concentrations):
+            window.append(i, concentration)
+            if len(window) > 12:
+                window.popleft()
+                first += 1
+
+            min_value, max_value = min_max(concentrations[first:i + 1])
+            self.assertEqual(list(window.concentrations), concentrations[first:i + 1])
+            self.assertEqual(window.min_concentration, min_value)
+            self.assertEqual(window.max_concentration, max_value)
+
+class TestNowCastCalculateWindow(unittest.TestCase):
+    def test_min_max_per_window(self):
+        mock_logger = mock.Mock(spec=user.aqitype.Logger)
+
+        current_hour =  int(time.time() / 3600) * 3600
+        data = [1.0, 2.0, 1.5, 1.0, 2.0, 1.5, 1.0, 2.0, 1.5, 1.0, 2.0, 1.5,
+                600.0, None, 2.0, 1.5, 1.0, 2.0, 1.5, 1.0, 2.0, 1.5, 1.0, 2.0, 1.5, 1.0]
+        timestamps = populate_time_stamps(current_hour, len(data))
+        records = list(zip(timestamps, data))
+
+        sub_calculator = user.aqitype.EPAAQI(mock_logger, 0, None, None)
+        SUT = user.aqitype.NowCast(mock_logger, 0, sub_calculator, None)
+
+        _stats, start_vec, _stop_vec, aqi_vec = SUT.calculate('pm2_5', iter(records))
+
+        expected_aqi = []
+        for i in range(len(data) - 11):
+            min_value, max_value = min_max(data[i:i + 12])
+            try:
+                concentration = SUT.calculate_concentration(timestamps[i], min_value, max_value, timestamps[i:i + 12], data[i:i + 12])
+                expected_aqi.append(sub_calculator.calculate('pm2_5', concentration))
+            except weewx.CannotCalculate:
+                expected_aqi.append(None)
+
+        self.assertEqual(start_vec, list(reversed(timestamps[0:len(data) - 11])))
+        self.assertEqual(aqi_vec, list(reversed(expected_aqi)))
+
+    def test_window_is_12_hours(self):
+        mock_logger = mock.Mock(spec=user.aqitype.Logger)
+
+        current_hour =  int(time.time() / 3600) * 3600
+        # A 10 hour gap after the first 3 hours
+        timestamps = [current_hour - i * 3600 for i in list(range(3)) + list(range(13, 24))]
+        data = [10.0, 10.0, 10.0] + [500.0] * 11
+
+        with mock.patch.object(user.aqitype.NowCast, 'calculate_concentration', return_value=10.0) as mock_calculate_concentration:
+            sub_calculator = mock.Mock()
+            sub_calculator.calculate.return_value = 42
+            SUT = user.aqitype.NowCast(mock_logger, 0, sub_calculator, None)
+
+            SUT.calculate('pm2_5', iter(zip(timestamps, data)))
+
+            args = mock_calculate_concentration.call_args_list[0][0]
+            self.assertEqual(args[0], current_hour)
+            self.assertEqual(args[3], timestamps[0:3])
+            self.assertEqual(args[1], 10.0)
+            self.assertEqual(args[2], 10.0)
+
+    def test_no_data(self):
+        mock_logger = mock.Mock(spec=user.aqitype.Logger)
+        SUT = user.aqitype.NowCast(mock_logger, 0, None, None)
+
+        stats, start_vec, stop_vec, aqi_vec = SUT.calculate('pm2_5', iter([]))
+
+        self.assertFalse(stats.not_null)
+        self.assertEqual(start_vec, [])
+        self.assertEqual(stop_vec, [])
+        self.assertEqual(aqi_vec, [])
+
+class TestNowCastCalculateSeries(unittest.TestCase):
+    def _generate_records(self, current_hour, count):
+        records = []
+        timestamp = current_hour
+        for _ in range(count):
+            # Include gaps and missing concentrations.
+            timestamp -= 3600 * random.choice([1, 1, 1, 1, 1, 1, 1, 1, 2, 5])
+            records.append((timestamp, random.choice([None, random.uniform(0, 300), random.uniform(0, 300)])))
+        return records
+
+    def test_vectorized_matches_calculate(self):
+        mock_logger = mock.Mock(spec=user.aqitype.Logger)
+        current_hour =  int(time.time() / 3600) * 3600
+
+        sub_calculator = user.aqitype.EPAAQI(mock_logger, 0, None, None)
+        SUT = user.aqitype.NowCast(mock_logger, 0, sub_calculator, None)
+
+        for count in [SUT.vectorize_min_records, 100, 1000]:
+            records = self._generate_records(current_hour, count)
+
+            expected_stats, expected_start_vec, expected_stop_vec, expected_aqi_vec = SUT.calculate('pm2_5', iter(records))
+            stats, start_vec, stop_vec, aqi_vec = SUT.calculate_series('pm2_5', iter(records))
+
+            self.assertEqual(vars(stats), vars(expected_stats))
+            self.assertEqual(start_vec, expected_start_vec)
+            self.assertEqual(stop_vec, expected_stop_vec)
+            self.assertEqual(aqi_vec, expected_aqi_vec)
+
+    def test_short_series_not_vectorized(self):
+        mock_logger = mock.Mock(spec=user.aqitype.Logger)
+        current_hour =  int(time.time() / 3600) * 3600
+
+        SUT = user.aqitype.NowCast(mock_logger, 0, None, None)
+        records = self._generate_records(current_hour, SUT.vectorize_min_records - 1)
+        mock_value = (random_string(), [], [], [])
+
+        with mock.patch.object(user.aqitype.NowCast, 'calculate', return_value=mock_value) as mock_calculate:
+            self.assertEqual(SUT.calculate_series('pm2_5', iter(records)), mock_value)
+            mock_calculate.assert_called_once_with('pm2_5', records)
+
+    def test_without_numpy(self):
+        mock_logger = mock.Mock(spec=user.aqitype.Logger)
+        current_hour =  int(time.time() / 3600) * 3600
+
+        SUT = user.aqitype.NowCast(mock_logger, 0, None, None)
+        records = self._generate_records(current_hour, 100)
+        mock_value = (random_string(), [], [], [])
+
+        with mock.patch.object(user.aqitype, 'numpy', None):
+            with mock.patch.object(user.aqitype.NowCast, 'calculate', return_value=mock_value) as mock_calculate:
+                self.assertEqual(SUT.calculate_series('pm2_5', iter(records)), mock_value)
+                mock_calculate.assert_called_once_with('pm2_5', records)
+
+class TestNowCastCalculateStats(unittest.TestCase):
+    def test_matches_calculate(self):
+        mock_logger = mock.Mock(spec=user.aqitype.Logger)
+        current_hour =  int(time.time() / 3600) * 3600
+        records = TestNowCastCalculateSeries()._generate_records(current_hour, 100)
+
+        sub_calculator = user.aqitype.EPAAQI(mock_logger, 0, None, None)
+        SUT = user.aqitype.NowCast(mock_logger, 0, sub_calculator, None)
+
+        expected_stats, start_vec, _stop_vec, aqi_vec = SUT.calculate('pm2_5', iter(records))
+
+        self.assertEqual(vars(SUT.calculate_stats(start_vec, aqi_vec)), vars(expected_stats))
+
+    def test_no_values(self):
+        mock_logger = mock.Mock(spec=user.aqitype.Logger)
+        SUT = user.aqitype.NowCast(mock_logger, 0, None, None)
+
+        stats = SUT.calculate_stats([1740114000], [None])
+
+        self.assertFalse(stats.not_null)
+        self.assertEqual(stats.count, 0)
+        self.assertIsNone(stats.max)
+
 class TestNowCastCalculateConcentration(unittest.TestCase):
     def test_incomplete_data(self):
         mock_logger = mock.Mock(spec=user.aqitype.Logger)
@@ -16,7 +16,6 @@ import random
 import string
 import sys
 import time
-import types
 
 import weeutil
 
@@ -94,16 +93,13 @@ class TestNowCastGetSeries(unittest.TestCase):
         config_dict = setup_config(calculated_field, input_field, algorithm, aqi_type)
         config = configobj.ConfigObj(config_dict)
 
-        mock_start_vec = []
-        mock_stop_vec = []
-        mock_aqi_vec = []
-        for _ in range(random.randint(2, 11)):
-            mock_has_data = random_string()
-            mock_start_vec.append(random.randint(101,200))
-            mock_start_vec.append(random.randint(201,300))
-            mock_aqi_vec.append(random.randint(1,100))
+        mock_db_manager.first_timestamp = utils.database.timespan.start - 86400
 
-        with mock.patch.object(calculator, 'calculate', return_value=(mock_has_data, mock_start_vec, mock_stop_vec, mock_aqi_vec)):
+        # The hourly values, starting with the hour before the timespan.
+        mock_start_vec = [utils.database.timespan.start - 3600 + i * 3600 for i in range(random.randint(3, 12))]
+        mock_aqi_vec = [random.randint(1, 100) for _ in mock_start_vec]
+
+        with mock.patch.object(calculator, 'calculate_series', return_value=(random_string(), mock_start_vec, [], mock_aqi_vec)):
             SUT = user.aqitype.AQIType(mock_logger, mock_sql_executor, config)
 
             unit = random_string()
@@ -112,9 +108,10 @@ class TestNowCastGetSeries(unittest.TestCase):
             with mock.patch('weewx.units.getStandardUnitType', return_value=[unit, unit_group]):
                 start_vec, stop_vec, aqi_vec = SUT.get_series(calculated_field, utils.database.timespan, mock_db_manager)
 
-                self.assertEqual(start_vec, (mock_start_vec, 'unix_epoch', 'group_time'))
-                self.assertEqual(stop_vec, (mock_stop_vec, 'unix_epoch', 'group_time'))
-                self.assertEqual(aqi_vec, (mock_aqi_vec, unit, unit_group))
+                # Only the hours of the timespan
+                self.assertEqual(start_vec, (mock_start_vec[1:], 'unix_epoch', 'group_time'))
+                self.assertEqual(stop_vec, (mock_start_vec[2:] + [mock_start_vec[-1] + 3600], 'unix_epoch', 'group_time'))
+                self.assertEqual(aqi_vec, (mock_aqi_vec[1:], unit, unit_group))
 
         print("done")
 
@@ -151,6 +148,7 @@ class TestNowCastGetSeries(unittest.TestCase):
         mock_sql_executor = mock.Mock()
         mock_db_manager = mock.Mock()
 
+        calculator = user.aqitype.NowCast
         algorithm = 'NowCast'
         aqi_type = 'pm2_5'
 
@@ -160,16 +158,13 @@ class TestNowCastGetSeries(unittest.TestCase):
         config_dict = setup_config(calculated_field, input_field, algorithm, aqi_type)
         config = configobj.ConfigObj(config_dict)
 
-        SUT = user.aqitype.AQIType(mock_logger, mock_sql_executor, config)
-
         unit = random_string()
         unit_group = random_string()
 
-        aggregate_interval = 3600
+        aggregate_interval = 7200
 
-        now = int(time.time() + 0.5)
-        end_timestamp = (int(now / utils.database.ARCHIVE_INTERVAL_SECONDS) + 1) * utils.database.ARCHIVE_INTERVAL_SECONDS
-        start_timestamp = end_timestamp - 10800
+        end_timestamp = int(time.time() / 3600) * 3600 - 3600
+        start_timestamp = end_timestamp - 3 * aggregate_interval
 
         timespan = weeutil.weeutil.TimeSpan(start_timestamp, end_timestamp)
 
@@ -182,18 +177,24 @@ class TestNowCastGetSeries(unittest.TestCase):
         mock_db_manager.first_timestamp = start_timestamp
         mock_db_manager.last_timestamp = end_timestamp
 
-        aqi_tuples = [(random.randint(11, 100), unit, unit_group),
-                      (random.randint(11, 100), unit, unit_group),
-                      (random.randint(11, 100), unit, unit_group)]
+        # The hourly values, including the hour missing its last record.
+        hour_start_vec = [start_timestamp, start_timestamp + 3600 - 300, start_timestamp + 7200, start_timestamp + 10800,
+                          start_timestamp + 14400, start_timestamp + 18000]
+        hour_aqi_vec = [random.randint(11, 100), random.randint(11, 100), None, None, random.randint(11, 100), random.randint(11, 100)]
+        mock_value = (random_string(), hour_start_vec, [], hour_aqi_vec)
 
-        with mock.patch('weewx.units.getStandardUnitType', return_value=[unit, unit_group]):
-            with mock.patch('weeutil.weeutil.intervalgen', return_value=timespans):
-                with mock.patch.object(user.aqitype.AQIType, 'get_aggregate', side_effect=aqi_tuples):
+        with mock.patch.object(calculator, 'calculate_series', return_value=mock_value):
+            SUT = user.aqitype.AQIType(mock_logger, mock_sql_executor, config)
+
+            with mock.patch('weewx.units.getStandardUnitType', return_value=[unit, unit_group]):
+                with mock.patch('weeutil.weeutil.intervalgen', return_value=timespans):
                     value_tuple = SUT.get_series(calculated_field,
-                                                timespan,
-                                                mock_db_manager,
-                                                aggregate_type=random_string(),
-                                                aggregate_interval='hour') # ToDo: temp until mocking done
+                                                 timespan,
+                                                 mock_db_manager,
+                                                 aggregate_type='max',
+                                                 aggregate_interval=aggregate_interval)
+
+                    mock_sql_executor.get_concentration_data_nowcast.assert_called_once()
 
                 self.assertEqual(value_tuple[0], \
                                 ([start_timestamp, start_timestamp + aggregate_interval, start_timestamp + 2*aggregate_interval], \
@@ -203,13 +204,16 @@ class TestNowCastGetSeries(unittest.TestCase):
                                 ([end_timestamp - 2*aggregate_interval, end_timestamp - aggregate_interval, end_timestamp], \
                                 'unix_epoch', \
                                 'group_time'))
-                self.assertEqual(value_tuple[2], ([aqi_tuples[0][0], aqi_tuples[1][0], aqi_tuples[2][0]], unit, unit_group))
+                self.assertEqual(value_tuple[2], ([max(hour_aqi_vec[0:2]), None, max(hour_aqi_vec[4:6])], unit, unit_group))
 
 class TestNowCastGetAggregate(unittest.TestCase):
     def test_get_aggregate_type_not_null(self):
         mock_logger = mock.Mock(spec=user.aqitype.Logger)
         mock_sql_executor = mock.Mock()
+        mock_sql_executor.aqi_daily_summaries = {}
         mock_db_manager = mock.Mock()
+        mock_db_manager.first_timestamp = utils.database.timespan.start - 86400
+        mock_db_manager.last_timestamp = utils.database.timespan.stop
 
         calculator = user.aqitype.NowCast
         algorithm = 'NowCast'
@@ -221,14 +225,11 @@ class TestNowCastGetAggregate(unittest.TestCase):
         config_dict = setup_config(calculated_field, input_field, algorithm, aqi_type)
         config = configobj.ConfigObj(config_dict)
 
-        mock_value = (
-            types.SimpleNamespace(not_null=True),
-            random_string(),
-            random_string(),
-            random_string()
-        )
+        # The hourly values, starting with the hour before the timespan.
+        mock_start_vec = [utils.database.timespan.start - 3600, utils.database.timespan.start + 3600]
+        mock_value = (random_string(), mock_start_vec, [], [random.randint(1, 100), random.randint(1, 100)])
 
-        with mock.patch.object(calculator, 'calculate', return_value=mock_value):
+        with mock.patch.object(calculator, 'calculate_series', return_value=mock_value):
             SUT = user.aqitype.AQIType(mock_logger, mock_sql_executor, config)
 
             unit = random_string()
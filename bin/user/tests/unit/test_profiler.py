@@ -0,0 +1,78 @@
+#    Copyright (c) 2025 Rich Bell <bellrichm@gmail.com>
+#    See the file LICENSE.txt for your full rights.
+
+# pylint: disable=missing-docstring
+# pylint: disable=invalid-name
+
+import json
+import os
+import random
+import string
+import tempfile
+import unittest
+
+import user.aqitype
+
+def random_string(length=32):
+    return ''.join([random.choice(string.ascii_letters + string.digits) for n in range(length)]) # pylint: disable=unused-variable
+
+def read_index(directory):
+    with open(os.path.join(directory, user.aqitype.Profiler.index_name), encoding='utf-8') as index_file:
+        return [json.loads(line) for line in index_file]
+
+class TestProfiler(unittest.TestCase):
+    def test_profile_cycles(self):
+        obs_type = random_string()
+        with tempfile.TemporaryDirectory() as directory:
+            SUT = user.aqitype.Profiler(directory, cycles=1)
+
+            with SUT.profile(obs_type, 'get_aggregate', 'max'):
+                # A nested call is part of the outer call's profile
+                with SUT.profile(obs_type, 'get_series'):
+                    sum(range(1000))
+            with SUT.profile(obs_type, 'get_series'):
+                pass
+            SUT.end_cycle()
+
+            # The cycles have been profiled
+            with SUT.profile(obs_type, 'get_scalar'):
+                pass
+            SUT.end_cycle()
+
+            calls = read_index(directory)
+            self.assertEqual([(call['obs_type'], call['method'], call['aggregate_type']) for call in calls],
+                             [(obs_type, 'get_aggregate', 'max'), (obs_type, 'get_series', '')])
+            self.assertEqual(len({call['file'] for call in calls}), 1)
+            self.assertEqual(len([file_name for file_name in os.listdir(directory) if file_name.endswith('.prof')]), 1)
+
+            lines = user.aqitype.Profiler.summarize(directory, top=5)
+            self.assertEqual(len(lines), 4)
+            self.assertIn('cumulative', lines[-1])
+
+    def test_profile_threshold(self):
+        obs_type = random_string()
+        with tempfile.TemporaryDirectory() as directory:
+            SUT = user.aqitype.Profiler(directory, cycles=0, threshold=0.0)
+
+            with self.assertRaises(user.aqitype.weewx.CannotCalculate):
+                with SUT.profile(obs_type, 'get_aggregate', 'avg'):
+                    raise user.aqitype.weewx.CannotCalculate()
+            with SUT.profile(obs_type, 'get_aggregate', 'avg'):
+                pass
+            SUT.end_cycle()
+
+            calls = read_index(directory)
+            self.assertEqual(len(calls), 2)
+            for call in calls:
+                self.assertTrue(os.path.exists(os.path.join(directory, call['file'])))
+                self.assertIn(f'{obs_type}-get_aggregate-avg', call['file'])
+            self.assertFalse(SUT.active)
+
+            # A threshold that no call reaches keeps no profile
+            SUT.threshold = 3600
+            with SUT.profile(obs_type, 'get_aggregate', 'avg'):
+                pass
+            self.assertEqual(len(read_index(directory)), 2)
+
+if __name__ == '__main__':
+    unittest.main(exit=False)
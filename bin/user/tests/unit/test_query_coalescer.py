@@ -0,0 +1,109 @@
+#    Copyright (c) 2025 Rich Bell <bellrichm@gmail.com>
+#    See the file LICENSE.txt for your full rights.
+
+# pylint: disable=missing-docstring
+# pylint: disable=invalid-name
+
+import random
+import string
+import threading
+import time
+import unittest
+import mock
+
+import user.aqitype
+
+def random_string(length=32):
+    return ''.join([random.choice(string.ascii_letters + string.digits) for n in range(length)]) # pylint: disable=unused-variable
+
+def get_mock_db_manager(database_name=None, last_timestamp=None):
+    mock_db_manager = mock.Mock()
+    mock_db_manager.connection.database_name = database_name or random_string()
+    mock_db_manager.table_name = 'archive'
+    mock_db_manager.last_timestamp = last_timestamp or random.randint(1, 1000)
+    mock_db_manager.genSql.side_effect = lambda sql_stmt, parameters: iter([(sql_stmt, *parameters)])
+    return mock_db_manager
+
+class TestQueryCoalescer(unittest.TestCase):
+    def test_consecutive_queries(self):
+        SUT = user.aqitype.QueryCoalescer()
+        mock_db_manager = get_mock_db_manager()
+        sql_stmt = random_string()
+
+        rows = SUT.get_rows(mock_db_manager, sql_stmt, (1, 2))
+
+        self.assertEqual(SUT.get_rows(mock_db_manager, sql_stmt, (1, 2)), rows)
+        self.assertEqual(SUT.get_rows(get_mock_db_manager(mock_db_manager.connection.database_name,
+                                                             mock_db_manager.last_timestamp),
+                                         sql_stmt,
+                                         [1, 2]), rows)
+        mock_db_manager.genSql.assert_called_once_with(sql_stmt, (1, 2))
+        self.assertEqual(SUT.stats, {'queries': 1, 'shared': 2})
+
+    def test_different_queries(self):
+        SUT = user.aqitype.QueryCoalescer()
+        mock_db_manager = get_mock_db_manager()
+        sql_stmt = random_string()
+
+        SUT.get_rows(mock_db_manager, sql_stmt, (1, 2))
+        SUT.get_rows(mock_db_manager, sql_stmt, (1, 3))
+        SUT.get_rows(mock_db_manager, random_string(), (1, 2))
+        SUT.get_rows(get_mock_db_manager(), sql_stmt, (1, 2))
+        # A new record
+        mock_db_manager.last_timestamp += 300
+        SUT.get_rows(mock_db_manager, sql_stmt, (1, 2))
+
+        self.assertEqual(SUT.stats, {'queries': 5, 'shared': 0})
+
+    def test_max_entries(self):
+        SUT = user.aqitype.QueryCoalescer(max_entries=2)
+        mock_db_manager = get_mock_db_manager()
+
+        SUT.get_rows(mock_db_manager, 'one', ())
+        SUT.get_rows(mock_db_manager, 'two', ())
+        SUT.get_rows(mock_db_manager, 'one', ())
+        SUT.get_rows(mock_db_manager, 'three', ())
+        # 'two' is the least recently used
+        SUT.get_rows(mock_db_manager, 'one', ())
+        SUT.get_rows(mock_db_manager, 'two', ())
+
+        self.assertEqual(len(SUT.results), 2)
+        self.assertEqual(SUT.stats, {'queries': 4, 'shared': 2})
+
+    def test_concurrent_queries(self):
+        SUT = user.aqitype.QueryCoalescer()
+        mock_db_manager = get_mock_db_manager()
+        started = threading.Event()
+
+        def slow_query(sql_stmt, parameters):
+            started.set()
+            time.sleep(0.1)
+            return iter([(sql_stmt, *parameters)])
+        mock_db_manager.genSql.side_effect = slow_query
+
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(SUT.get_rows(mock_db_manager, 'query', (1, 2))))
+                   for _i in range(3)]
+        threads[0].start()
+        started.wait()
+        for thread in threads[1:]:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        mock_db_manager.genSql.assert_called_once()
+        self.assertEqual(results, [[('query', 1, 2)]] * 3)
+
+    def test_failed_query(self):
+        SUT = user.aqitype.QueryCoalescer()
+        mock_db_manager = get_mock_db_manager()
+        mock_db_manager.genSql.side_effect = ValueError()
+
+        with self.assertRaises(ValueError):
+            SUT.get_rows(mock_db_manager, 'query', ())
+
+        self.assertEqual(SUT.pending, {})
+        self.assertEqual(len(SUT.results), 0)
+
+if __name__ == '__main__':
+    unittest.main(exit=False)
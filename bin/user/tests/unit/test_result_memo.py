@@ -0,0 +1,106 @@
+#    Copyright (c) 2025 Rich Bell <bellrichm@gmail.com>
+#    See the file LICENSE.txt for your full rights.
+
+# pylint: disable=missing-docstring
+# pylint: disable=invalid-name
+
+import random
+import string
+import unittest
+import mock
+
+import user.aqitype
+
+def random_string(length=32):
+    return ''.join([random.choice(string.ascii_letters + string.digits) for n in range(length)]) # pylint: disable=unused-variable
+
+def get_mock_db_manager():
+    mock_db_manager = mock.Mock()
+    mock_db_manager.connection.database_name = random_string()
+    mock_db_manager.table_name = 'archive'
+    mock_db_manager.last_timestamp = random.randint(1, 1000)
+    return mock_db_manager
+
+class TestResultMemo(unittest.TestCase):
+    def test_remembered(self):
+        SUT = user.aqitype.ResultMemo()
+        mock_db_manager = get_mock_db_manager()
+        mock_function = mock.Mock(return_value=random.randint(1, 500))
+        key = SUT.get_key(mock_db_manager, 'scalar', random_string(), 1740168000)
+
+        results = [SUT.get(key, mock_function, 1, option=2) for _i in range(3)]
+
+        self.assertEqual(results, [mock_function.return_value] * 3)
+        mock_function.assert_called_once_with(1, option=2)
+        self.assertEqual(SUT.stats, {'hits': 2, 'misses': 1})
+
+    def test_new_record(self):
+        SUT = user.aqitype.ResultMemo()
+        mock_db_manager = get_mock_db_manager()
+        mock_function = mock.Mock(return_value=random.randint(1, 500))
+
+        SUT.get(SUT.get_key(mock_db_manager, 'scalar'), mock_function)
+        mock_db_manager.last_timestamp += 300
+        SUT.get(SUT.get_key(mock_db_manager, 'scalar'), mock_function)
+        SUT.get(SUT.get_key(get_mock_db_manager(), 'scalar'), mock_function)
+
+        self.assertEqual(mock_function.call_count, 3)
+        self.assertEqual(SUT.stats, {'hits': 0, 'misses': 3})
+
+    def test_clear(self):
+        SUT = user.aqitype.ResultMemo()
+        mock_function = mock.Mock(return_value=random.randint(1, 500))
+        key = SUT.get_key(None, 'scalar')
+
+        SUT.get(key, mock_function)
+        SUT.get(key, mock_function)
+        stats = SUT.clear()
+        SUT.get(key, mock_function)
+
+        self.assertEqual(stats, {'hits': 1, 'misses': 1})
+        self.assertEqual(SUT.stats, {'hits': 0, 'misses': 1})
+        self.assertEqual(mock_function.call_count, 2)
+
+    def test_max_entries(self):
+        SUT = user.aqitype.ResultMemo(max_entries=2)
+        mock_function = mock.Mock(return_value=random.randint(1, 500))
+
+        for name in ['one', 'two', 'one', 'three', 'one', 'two']:
+            SUT.get(SUT.get_key(None, name), mock_function)
+
+        # 'two' is the least recently used
+        self.assertEqual(len(SUT.results), 2)
+        self.assertEqual(SUT.stats, {'hits': 2, 'misses': 4})
+
+    def test_is_repeated(self):
+        SUT = user.aqitype.ResultMemo()
+        mock_function = mock.Mock(return_value=random.randint(1, 500))
+        key = SUT.get_key(None, 'stats')
+        remembered_key = SUT.get_key(None, 'scalar')
+        SUT.get(remembered_key, mock_function)
+
+        self.assertFalse(SUT.is_repeated(key))
+        self.assertTrue(SUT.is_repeated(key))
+        self.assertTrue(SUT.is_repeated(remembered_key))
+        self.assertFalse(SUT.is_repeated(None))
+
+        SUT.clear()
+        self.assertFalse(SUT.is_repeated(key))
+
+    def test_not_remembered(self):
+        SUT = user.aqitype.ResultMemo()
+        mock_function = mock.Mock(side_effect=[user.aqitype.weewx.CannotCalculate(), 1, 2, 3])
+
+        # Exceptions are not remembered
+        with self.assertRaises(user.aqitype.weewx.CannotCalculate):
+            SUT.get(SUT.get_key(None, 'scalar'), mock_function)
+        self.assertEqual(SUT.get(SUT.get_key(None, 'scalar'), mock_function), 1)
+
+        # Calls with options that cannot be hashed are not remembered
+        key = SUT.get_key(None, 'series', (('option', []),))
+        self.assertIsNone(key)
+        self.assertEqual(SUT.get(key, mock_function), 2)
+        self.assertEqual(SUT.get(key, mock_function), 3)
+
+if __name__ == '__main__':
+    unittest.main(exit=False)
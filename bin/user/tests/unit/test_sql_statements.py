@@ -126,6 +126,16 @@ class TestSQL(unittest.TestCase):
                               utils.data.db_20250221_pm2_5_values[i]))
             i += 1
 
+    def test_get_concentration_data_not_null(self):
+        SUT = user.aqitype.SQLExecutor(self.mock_logger)
+
+        records_iter = SUT.get_concentration_data_not_null(TestSQL.input_field, utils.database.timespan, TestSQL.db_manager)
+
+        self.assertEqual(list(records_iter),
+                         [(timestamp, value)
+                          for timestamp, value in zip(utils.data.db_20250221_timestamps, utils.data.db_20250221_pm2_5_values)
+                          if value is not None])
+
     def test_get_aggregate_avg_data(self):
         SUT = user.aqitype.SQLExecutor(self.mock_logger)
 
@@ -164,6 +174,206 @@ class TestSQL(unittest.TestCase):
         concentration = list(records_iter)[0][0]
         self.assertEqual(concentration, max(data.db_20250221_pm2_5_values))
 
+    def test_sql_stmts_reused(self):
+        SUT = user.aqitype.SQLExecutor(self.mock_logger)
+
+        expected_records = list(SUT.get_concentration_data_not_null(TestSQL.input_field, utils.database.timespan, TestSQL.db_manager))
+        timespans = [weeutil.weeutil.TimeSpan(start, start + 3600)
+                     for start in range(utils.database.timespan.start, utils.database.timespan.stop, 3600)]
+        records = []
+        for timespan in timespans:
+            records.extend(SUT.get_concentration_data_not_null(TestSQL.input_field, timespan, TestSQL.db_manager))
+
+        self.assertEqual(records, expected_records)
+        # The statement is compiled once, with the time range as parameters.
+        self.assertEqual(len(SUT.sql_stmts), 1)
+        stats = SUT.get_sql_stmt_stats()
+        self.assertEqual(stats['compiled'], 1)
+        self.assertEqual(stats['reused'], len(timespans))
+
+class TestUpsert(unittest.TestCase):
+    def test_get_upsert(self):
+        for dbtype, expected_upsert in (('sqlite', 'INSERT OR REPLACE INTO'), ('mysql', 'REPLACE INTO')):
+            with self.subTest(dbtype=dbtype):
+                db_manager = mock.Mock()
+                db_manager.connection.dbtype = dbtype
+
+                self.assertEqual(user.aqitype.SQLExecutor.get_upsert(db_manager), expected_upsert)
+
+class TestMySQLStatements(unittest.TestCase):
+    ''' The MySQL cursor of weedb replaces '?' with '%s' and formats the statement with its parameters, as MySQLdb does. '''
+    def setUp(self):
+        self.mock_logger = mock.Mock(spec=user.aqitype.Logger)
+        self.db_manager = mock.Mock()
+        self.db_manager.connection.dbtype = 'mysql'
+        self.db_manager.table_name = 'archive'
+
+    def assert_formats(self, sql_stmt, parameters):
+        formatted_stmt = sql_stmt.replace('?', '%s') % tuple(parameters)
+        self.assertNotIn('%', formatted_stmt)
+
+    def test_aqi_statements(self):
+        input_field = random_string()
+        timespan = weeutil.weeutil.TimeSpan(1740168000, 1740254400)
+        truncate = user.aqitype.SQLExecutor.sql_truncate_strs['mysql']
+        remainder = user.aqitype.SQLExecutor.sql_remainder_strs['mysql']
+
+        for compiled in [False, True]:
+            calculator = user.aqitype.EPAAQI(self.mock_logger, 20, None, None)
+            if compiled:
+                calculator.compile('pm2_5')
+            aqi_expression = calculator.get_sql_expression('pm2_5', input_field, truncate, remainder)
+            SUT = user.aqitype.SQLExecutor(self.mock_logger)
+
+            with self.subTest(compiled=compiled, statement='aggregate'):
+                SUT.get_aqi_aggregate_data(self.db_manager, input_field, aqi_expression, timespan)
+                self.assert_formats(*self.db_manager.getSql.call_args.args)
+
+            with self.subTest(compiled=compiled, statement='aggregated_series'):
+                SUT.get_aqi_aggregated_series_data(self.db_manager, input_field, aqi_expression, timespan, 3600)
+                self.assert_formats(*self.db_manager.genSql.call_args.args)
+
+class TestHourlyConcentrations(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.input_field = utils.database.PM2_5_INPUT_FIELD
+
+        cls.db_manager = utils.database.get_db_manager(cls.input_field)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.db_manager.close()
+        cls.db_manager = None
+
+    def setUp(self):
+        self.mock_logger = mock.Mock(spec=user.aqitype.Logger)
+        self.db_manager.connection.execute(f"DROP TABLE IF EXISTS {user.aqitype.SQLExecutor.hourly_table_name}")
+
+    def get_records(self, SUT):
+        stop = min(weeutil.weeutil.startOfInterval(time.time(), 3600), utils.database.timespan.stop)
+        records_iter = SUT.get_concentration_data_nowcast(self.db_manager,
+                                                          TestHourlyConcentrations.input_field,
+                                                          stop,
+                                                          utils.database.timespan.start - 43200)
+        return [record[:2] for record in records_iter]
+
+    def assert_records(self, records, expected_records):
+        self.assertEqual(len(records), len(expected_records))
+        for record, expected_record in zip(records, expected_records):
+            self.assertEqual(record[0], expected_record[0])
+            self.assertAlmostEqual(record[1], expected_record[1])
+
+    def test_get_concentration_data_nowcast(self):
+        expected_records = self.get_records(user.aqitype.SQLExecutor(self.mock_logger))
+
+        SUT = user.aqitype.SQLExecutor(self.mock_logger)
+        SUT.create_hourly_table(self.db_manager)
+        SUT.backfill_hourly_concentrations(self.db_manager, TestHourlyConcentrations.input_field)
+
+        self.assert_records(self.get_records(SUT), expected_records)
+
+    def test_update_hourly_concentration(self):
+        SUT = user.aqitype.SQLExecutor(self.mock_logger)
+        SUT.create_hourly_table(self.db_manager)
+        SUT.backfill_hourly_concentrations(self.db_manager, TestHourlyConcentrations.input_field)
+        expected_records = self.get_records(SUT)
+
+        # Remove the last day and add it back one record at a time
+        self.db_manager.connection.execute(f"DELETE FROM {user.aqitype.SQLExecutor.hourly_table_name} WHERE hour >= ?",
+                                           (utils.database.timespan.start,))
+        for i, date_time in enumerate(data.db_20250221_timestamps):
+            record = {'dateTime': date_time, TestHourlyConcentrations.input_field: data.db_20250221_pm2_5_values[i]}
+            SUT.update_hourly_concentration(self.db_manager, TestHourlyConcentrations.input_field, record)
+            # A record already included is ignored
+            SUT.update_hourly_concentration(self.db_manager, TestHourlyConcentrations.input_field, record)
+
+        self.assert_records(self.get_records(SUT), expected_records)
+
+class TestNowCastResults(unittest.TestCase):
+    def setUp(self):
+        self.mock_logger = mock.Mock(spec=user.aqitype.Logger)
+        self.db_manager = utils.database.get_db_manager(utils.database.PM2_5_INPUT_FIELD)
+        self.start = utils.database.timespan.start
+
+    def tearDown(self):
+        self.db_manager.close()
+
+    def test_save_nowcast_results(self):
+        obs_type = random_string()
+        other_obs_type = random_string()
+        results = [(self.start, 51), (self.start + 3600, None), (self.start + 7200, 101)]
+        coverage = (self.start, self.start + 10800, 180, 1234567.0)
+
+        SUT = user.aqitype.SQLExecutor(self.mock_logger)
+        self.assertEqual(SUT.get_nowcast_results(self.db_manager, obs_type, 0, utils.database.timespan.stop), [])
+        self.assertIsNone(SUT.get_nowcast_coverage(self.db_manager, obs_type))
+
+        self.assertTrue(SUT.save_nowcast_results(self.db_manager, obs_type, results, coverage, None))
+        self.assertTrue(SUT.save_nowcast_results(self.db_manager, other_obs_type, [(self.start, 4)],
+                                                 (self.start, self.start + 3600, 12, 123.0), None))
+
+        self.assertEqual(SUT.get_nowcast_results(self.db_manager, obs_type, 0, utils.database.timespan.stop), results)
+        self.assertEqual(SUT.get_nowcast_results(self.db_manager, obs_type, self.start, self.start + 3600),
+                         [(self.start + 3600, None)])
+        self.assertEqual(SUT.get_nowcast_coverage(self.db_manager, obs_type), coverage)
+
+    def test_save_nowcast_results_changed(self):
+        obs_type = random_string()
+        coverage = (self.start, self.start + 10800, 180, 1234567.0)
+
+        SUT = user.aqitype.SQLExecutor(self.mock_logger)
+        SUT.save_nowcast_results(self.db_manager, obs_type, [(self.start, 51)], coverage, None)
+
+        # The coverage was changed after it was read, for example by a back-fill.
+        self.assertFalse(SUT.save_nowcast_results(self.db_manager, obs_type, [(self.start + 10800, 52)],
+                                                  (self.start, self.start + 14400, 240, 2345678.0), None))
+        self.assertEqual(SUT.get_nowcast_results(self.db_manager, obs_type, 0, utils.database.timespan.stop), [(self.start, 51)])
+        self.assertEqual(SUT.get_nowcast_coverage(self.db_manager, obs_type), coverage)
+
+    def test_get_nowcast_check(self):
+        SUT = user.aqitype.SQLExecutor(self.mock_logger)
+        records = list(self.db_manager.genSql(f"SELECT {utils.database.PM2_5_INPUT_FIELD} FROM {self.db_manager.table_name} "
+                                              "WHERE dateTime > ? AND dateTime <= ?",
+                                              (self.start, self.start + 10800)))
+        expected_check = (len(records), sum(round(record[0] * 1000) for record in records if record[0] is not None))
+        self.assertEqual(SUT.get_nowcast_check(self.db_manager, utils.database.PM2_5_INPUT_FIELD, self.start, self.start + 10800),
+                         expected_check)
+
+    def test_nowcast_coverage_table_upgraded(self):
+        # The table of an earlier version, without the archive count and total.
+        self.db_manager.connection.execute(f"CREATE TABLE {user.aqitype.SQLExecutor.nowcast_coverage_table_name} "
+                                           "(obs_type VARCHAR(64) NOT NULL, start INTEGER NOT NULL, stop INTEGER NOT NULL, "
+                                           "PRIMARY KEY (obs_type))")
+        obs_type = random_string()
+        self.db_manager.connection.execute(f"INSERT INTO {user.aqitype.SQLExecutor.nowcast_coverage_table_name} "
+                                           "VALUES (?, ?, ?)", (obs_type, self.start, self.start + 3600))
+
+        SUT = user.aqitype.SQLExecutor(self.mock_logger)
+        self.assertIsNone(SUT.get_nowcast_coverage(self.db_manager, obs_type))
+
+    def test_backfill_removes_results(self):
+        obs_type = random_string()
+        results = [(self.start + i * 3600, i) for i in range(6)]
+
+        SUT = user.aqitype.SQLExecutor(self.mock_logger)
+        SUT.save_nowcast_results(self.db_manager, obs_type, results, (self.start + 3600, self.start + 6 * 3600, 72, 123456.0), None)
+
+        # A record after the stored hours is not a back-fill.
+        SUT.invalidate_nowcast_results(self.db_manager, self.start + 6 * 3600 + 300)
+        self.assertEqual(SUT.get_nowcast_results(self.db_manager, obs_type, 0, utils.database.timespan.stop), results)
+
+        # The record is in the hour ending at start + 4 hours, whose value is keyed by start + 3 hours.
+        SUT.invalidate_nowcast_results(self.db_manager, self.start + 3 * 3600 + 600)
+        self.assertEqual(SUT.get_nowcast_results(self.db_manager, obs_type, 0, utils.database.timespan.stop), results[:3])
+        # WeeWX added the record, so the stored hours that are left are not checked against the archive.
+        self.assertEqual(SUT.get_nowcast_coverage(self.db_manager, obs_type), (self.start + 3600, self.start + 3 * 3600, None, None))
+
+        # The watermark is kept in the database.
+        SUT = user.aqitype.SQLExecutor(self.mock_logger)
+        SUT.invalidate_nowcast_results(self.db_manager, self.start + 600)
+        self.assertEqual(SUT.get_nowcast_results(self.db_manager, obs_type, 0, utils.database.timespan.stop), [])
+        self.assertIsNone(SUT.get_nowcast_coverage(self.db_manager, obs_type))
+
 if __name__ == '__main__':
     #test_suite = unittest.TestSuite()
     #test_suite.addTest(TestSQL('test_get_concentration_data_nowcast'))
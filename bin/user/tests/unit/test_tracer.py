@@ -0,0 +1,74 @@
+#    Copyright (c) 2025 Rich Bell <bellrichm@gmail.com>
+#    See the file LICENSE.txt for your full rights.
+
+# pylint: disable=missing-docstring
+# pylint: disable=invalid-name
+
+import json
+import os
+import random
+import string
+import tempfile
+import unittest
+import mock
+
+import user.aqitype
+
+def random_string(length=32):
+    return ''.join([random.choice(string.ascii_letters + string.digits) for n in range(length)]) # pylint: disable=unused-variable
+
+def read_spans(path):
+    with open(path, encoding='utf-8') as trace_file:
+        return [json.loads(line) for line in trace_file]
+
+class TestTracer(unittest.TestCase):
+    def setUp(self):
+        self.mock_logger = mock.Mock(spec=user.aqitype.Logger)
+
+    def test_span(self):
+        obs_type = random_string()
+        with tempfile.TemporaryDirectory() as directory:
+            SUT = user.aqitype.Tracer(self.mock_logger, os.path.join(directory, 'trace.jsonl'))
+
+            with SUT.span('AQIType.get_aggregate', obs_type=obs_type):
+                SUT.set_attribute('interval_cache', 'miss')
+                rows = list(SUT.trace_rows('SELECT 1', (1, 2), lambda: [(1,), (2,), (3,)]))
+                with self.assertRaises(user.aqitype.weewx.CannotCalculate):
+                    with SUT.span('calculate'):
+                        raise user.aqitype.weewx.CannotCalculate()
+
+            spans = read_spans(SUT.path)
+
+        self.assertEqual(rows, [(1,), (2,), (3,)])
+        self.assertEqual([span['name'] for span in spans], ['AQIType.get_aggregate', 'sql', 'calculate'])
+        root, sql, calculate = spans
+        self.assertEqual(root['attributes'], {'obs_type': obs_type, 'interval_cache': 'miss'})
+        self.assertIsNone(root['parent_id'])
+        self.assertEqual(sql['attributes'], {'statement': 'SELECT 1', 'parameters': [1, 2], 'rows': 3})
+        self.assertEqual(calculate['error'], 'CannotCalculate')
+        for span in (sql, calculate):
+            self.assertEqual((span['trace_id'], span['parent_id']), (root['trace_id'], root['span_id']))
+
+    def test_not_tracing(self):
+        with tempfile.TemporaryDirectory() as directory:
+            SUT = user.aqitype.Tracer(self.mock_logger, os.path.join(directory, 'trace.jsonl'))
+
+            # Outside of a span, nothing is traced.
+            self.assertIsNone(SUT.add_span('sql'))
+            SUT.set_attribute('rows', 1)
+            self.assertEqual(SUT.trace_rows('SELECT 1', (), lambda: [(1,)]), [(1,)])
+
+            self.assertFalse(os.path.exists(SUT.path))
+
+    def test_write_error(self):
+        with tempfile.TemporaryDirectory() as directory:
+            SUT = user.aqitype.Tracer(self.mock_logger, os.path.join(directory, 'missing', 'trace.jsonl'))
+
+            for _i in range(2):
+                with SUT.span('AQIType.get_scalar'):
+                    pass
+
+        self.mock_logger.logerr.assert_called_once()
+
+if __name__ == '__main__':
+    unittest.main(exit=False)
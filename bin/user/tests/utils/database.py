@@ -8,6 +8,8 @@
 Necessary functions to initialize a WeeWX database to be used for testing SQL statements.
 '''
 
+import random
+
 import weewx.manager
 import weeutil.weeutil
 
@@ -25,21 +27,28 @@ ARCHIVE_INTERVAL_SECONDS = ARCHIVE_INTERVAL_MINUTES * 60
 timespan = weeutil.weeutil.TimeSpan(
     data.db_20250221_timestamps[0] - ARCHIVE_INTERVAL_SECONDS, data.db_20250221_timestamps[-1])
 
-def _generate_records(pm2_5_column):
+def _generate_records(pm2_5_column, other_pm2_5_columns):
     ''' Generate records to be inserted into a WeeWX database. '''
     pm2_5_values = data.db_20250219_pm2_5_values +  data.db_20250220_pm2_5_values + data.db_20250221_pm2_5_values
     timestamps = data.db_20250219_timestamps + data.db_20250220_timestamps + data.db_20250221_timestamps
     i = 0
     for date_time in timestamps:
-        yield {
+        record = {
             'dateTime': date_time,
             'usUnits': US_UNITS,
             'interval': ARCHIVE_INTERVAL_MINUTES,
             pm2_5_column: pm2_5_values[i],
         }
+        # The other sensors read higher, and miss different records.
+        for sensor, column in enumerate(other_pm2_5_columns, start=1):
+            if pm2_5_values[i] is not None and (i + sensor) % 11:
+                record[column] = pm2_5_values[i] * (1 + sensor / 2)
+            else:
+                record[column] = None
+        yield record
         i += 1
 
-def get_db_manager(pm2_5_column):
+def get_db_manager(pm2_5_column, manager_class=weewx.manager.Manager, other_pm2_5_columns=()):
     ''' Create a WeeWX database and initialize its db manager. '''
 
     table = [('dateTime', 'INTEGER NOT NULL UNIQUE PRIMARY KEY'),
@@ -47,6 +56,7 @@ def get_db_manager(pm2_5_column):
              ('interval', 'INTEGER NOT NULL'),
              (pm2_5_column, 'REAL'),
              ]
+    table.extend((column, 'REAL') for column in other_pm2_5_columns)
 
     day_summaries = [(e[0], 'scalar') for e in table
                      if e[0] not in ('dateTime', 'usUnits', 'interval')]
@@ -56,7 +66,7 @@ def get_db_manager(pm2_5_column):
         'day_summaries': day_summaries
     }
 
-    db_manager = weewx.manager.Manager.open_with_create(
+    db_manager = manager_class.open_with_create(
         {
             'database_name': ':memory:',
             'driver': 'weedb.sqlite'
@@ -78,11 +88,69 @@ def get_db_manager(pm2_5_column):
     db_manager.first_timestamp = float('inf')
     db_manager.last_timestamp = -float('inf')
 
-    for record in _generate_records(pm2_5_column):
+    for record in _generate_records(pm2_5_column, other_pm2_5_columns):
         db_manager.addRecord(record)
 
     return db_manager
 
+def _generate_scaled_records(pm2_5_column, start, days, interval_minutes, seed):
+    '''
+    Generate days of records from the days of data, with each day scaled so that the AQIs cover all of the categories.
+    Some records have no concentration and some hours have no records (gaps).
+    '''
+    rng = random.Random(seed)
+    days_values = [data.db_20250219_pm2_5_values, data.db_20250220_pm2_5_values, data.db_20250221_pm2_5_values]
+    interval_seconds = interval_minutes * 60
+    for day in range(days):
+        day_start = start + day * 86400
+        day_values = days_values[day % len(days_values)]
+        factor = rng.choice((1, 1, 2, 5, 10, 20, 50, 100))
+        gap_start = gap_stop = None
+        if rng.random() < 0.1:
+            gap_start = day_start + rng.randrange(0, 86400, 3600)
+            gap_stop = gap_start + rng.randint(1, 12) * 3600
+
+        for date_time in range(day_start + interval_seconds, day_start + 86400 + 1, interval_seconds):
+            if gap_start is not None and gap_start < date_time <= gap_stop:
+                continue
+            # The data is 5 minute data, a 1 minute record has the value of the 5 minutes it is in.
+            pm2_5 = day_values[min((date_time - day_start - 1) // ARCHIVE_INTERVAL_SECONDS, len(day_values) - 1)] * factor
+            if rng.random() < 0.02:
+                pm2_5 = None
+            yield {
+                'dateTime': date_time,
+                'usUnits': US_UNITS,
+                'interval': interval_minutes,
+                pm2_5_column: pm2_5,
+            }
+
+def get_scaled_db_manager(pm2_5_column, days, interval_minutes=ARCHIVE_INTERVAL_MINUTES, database_name=':memory:', seed=0):
+    '''
+    Create a WeeWX database, with daily summaries, of 'days' of data ending with the test data, and initialize its db manager.
+    A database file that already has the data is opened, not populated again.
+    '''
+    table = [('dateTime', 'INTEGER NOT NULL UNIQUE PRIMARY KEY'),
+             ('usUnits', 'INTEGER NOT NULL'),
+             ('interval', 'INTEGER NOT NULL'),
+             (pm2_5_column, 'REAL'),
+             ]
+
+    db_manager = weewx.manager.DaySummaryManager.open_with_create(
+        {
+            'database_name': database_name,
+            'driver': 'weedb.sqlite'
+        },
+        schema={'table': table, 'day_summaries': [(pm2_5_column, 'scalar')]})
+
+    if db_manager.last_timestamp is None:
+        # See get_db_manager
+        db_manager.first_timestamp = float('inf')
+        db_manager.last_timestamp = -float('inf')
+        start = timespan.stop - days * 86400
+        db_manager.addRecord(_generate_scaled_records(pm2_5_column, start, days, interval_minutes, seed))
+
+    return db_manager
+
 def backup(db_manager, filename):
     ''' Create a backup of the database being managed by db_manager to the file named filename. '''
     import sqlite3  # want to ensure that sqlite3 use is limited, pylint: disable=import-outside-toplevel
@@ -0,0 +1,14 @@
+#! /bin/bash
+#
+#    Copyright (c) 2025 Rich Bell <bellrichm@gmail.com>
+#
+#    See the file LICENSE.txt for your full rights.
+#
+# Additional options are passed to the benchmarks, for example: ./devtools/benchmarks.sh --days 1 365 1826 --compare results/benchmarks/<file>.json
+source ./devtools/python_versions.sh
+
+export PYENV_VERSION=$weewx_default_python_version
+mkdir -p results/benchmarks
+PYTHONPATH=bin:../weewx/src python bin/user/tests/bench/bench_aqitype.py \
+    --database-directory results/benchmarks/databases \
+    --output results/benchmarks/$(date +%Y%m%d%H%M%S).json "$@"
@@ -0,0 +1,14 @@
+#! /bin/bash
+#
+#    Copyright (c) 2025 Rich Bell <bellrichm@gmail.com>
+#
+#    See the file LICENSE.txt for your full rights.
+#
+# Additional options are passed to the benchmark, for example: ./devtools/report_benchmark.sh --days 1826 --aqitype-option daily_summaries=true
+source ./devtools/python_versions.sh
+
+export PYENV_VERSION=$weewx_default_python_version
+mkdir -p results/benchmarks
+PYTHONPATH=bin:../weewx/src python bin/user/tests/bench/bench_report.py \
+    --database-directory results/benchmarks/databases \
+    --output results/benchmarks/report-$(date +%Y%m%d%H%M%S).json "$@"
@@ -3,9 +3,13 @@
 
 """ Installer for the AQI XType. """
 
+import importlib.util
+import os
 from io import StringIO
 
 import configobj
+import weeutil.weeutil
+import weewx.manager
 from weecfg.extension import ExtensionInstaller
 
 VERSION = "2.0.0-rc05"
@@ -68,3 +72,61 @@ class AQITypeInstaller(ExtensionInstaller):
             files=[('bin/user', ['bin/user/aqitype.py']),
                    ]
         )
+
+    def configure(self, engine):
+        """ Report how the database runs the AQI statements, and offer to create the indexes of the AQI inputs. """
+        try:
+            self._advise_indexes(engine)
+        except Exception as exception: # The install should not fail because of this. pylint: disable=broad-except
+            engine.printer.out(f"Unable to check the indexes of the AQI inputs: {exception}")
+
+        return False
+
+    def _advise_indexes(self, engine):
+        # The report is the reason to create the indexes, so without it the database is not measured.
+        if engine.printer.verbosity < 1:
+            return
+
+        # The files of the extension are not installed yet, so load it from here.
+        spec = importlib.util.spec_from_file_location('aqitype', os.path.join(os.path.dirname(__file__), 'bin', 'user', 'aqitype.py'))
+        aqitype = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(aqitype)
+
+        aqitype_dict = engine.config_dict.get('aqitype', EXTENSION_DICT['aqitype'])
+        binding = aqitype_dict.get('data_binding', 'wx_binding')
+        dependent_fields = sorted({aqitype_dict[field]['input'] for field in aqitype_dict.sections})
+
+        advisor = aqitype.IndexAdvisor(aqitype.SQLExecutor(aqitype.Logger()), repeat=1)
+        with weewx.manager.open_manager_with_config(engine.config_dict, binding) as db_manager:
+            if db_manager.last_timestamp is None:
+                return
+            timespan = weeutil.weeutil.TimeSpan(db_manager.last_timestamp - 365 * 86400, db_manager.last_timestamp)
+
+            missing_indexes = []
+            for dependent_field in dependent_fields:
+                had_index, results = advisor.advise(db_manager, dependent_field, timespan)
+                engine.printer.out('\n'.join(advisor.format_report(db_manager, dependent_field, had_index, results)), level=1)
+                if not had_index:
+                    missing_indexes.append(dependent_field)
+
+            if not missing_indexes or engine.dry_run:
+                return
+            # Whether the install is unattended, 'weectl extension install --yes', is only known when the engine keeps it.
+            # Otherwise the install does not ask, it only tells how to create the indexes.
+            if getattr(engine, 'no_confirm', None) is None:
+                engine.printer.out(f"The (dateTime, input) indexes of {', '.join(missing_indexes)} can be created with:\n"
+                                   f"    python3 bin/user/aqitype.py --config={engine.config_path} --create-indexes", level=1)
+                return
+            try:
+                # With --yes, the answer is the default, so an unattended install does not change the database.
+                answer = weeutil.weeutil.y_or_n(f"Create the (dateTime, input) indexes of {', '.join(missing_indexes)} (y/n)? ",
+                                                noprompt=engine.no_confirm, default='n')
+            except EOFError:
+                answer = 'n'
+            if answer != 'y':
+                return
+
+            for dependent_field in missing_indexes:
+                advisor.create_index(db_manager, dependent_field)
+                had_index, results = advisor.advise(db_manager, dependent_field, timespan)
+                engine.printer.out('\n'.join(advisor.format_report(db_manager, dependent_field, had_index, results)), level=1)